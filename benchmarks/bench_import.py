@@ -0,0 +1,47 @@
+"""
+Startup time: importing PyOCR and looking for the available OCR tools, each
+in a new Python interpreter (like short-lived command line tools do).
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+import pyocr
+
+
+# name under which the package is installed
+PACKAGE = pyocr.__name__
+
+ROUNDS = 20
+
+SCRIPTS = {
+    "import": "import {package}",
+    "import_backends": (
+        "import {package}.tesseract, {package}.libtesseract,"
+        " {package}.cuneiform"
+    ),
+    "get_available_tools": "import {package}; {package}.get_available_tools()",
+}
+
+
+@pytest.mark.parametrize("script", list(SCRIPTS))
+def test_startup(benchmark, script):
+    command = [
+        sys.executable, "-c", SCRIPTS[script].format(package=PACKAGE)
+    ]
+    benchmark.group = "startup"
+    benchmark.pedantic(subprocess.run, args=(command,),
+                       kwargs={"check": True}, rounds=ROUNDS,
+                       warmup_rounds=1)
+
+
+def test_python_baseline(benchmark):
+    """
+    Startup time of the interpreter alone, for reference.
+    """
+    benchmark.group = "startup"
+    benchmark.pedantic(subprocess.run, args=([sys.executable, "-c", ""],),
+                       kwargs={"check": True}, rounds=ROUNDS,
+                       warmup_rounds=1)
@@ -0,0 +1,94 @@
+"""
+Latency and throughput of image_to_string() for each backend, builder, page
+resolution and concurrency level.
+
+Each round OCRs `concurrency` copies of the page at the same time:
+through asyncio.gather() for the shell backends (their image_to_string()
+is a coroutine), through a thread pool for libtesseract. The throughput (pages
+per second) is `concurrency` times the number of rounds per second.
+"""
+
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from pyocr import builders
+from pyocr import cuneiform
+from pyocr import libtesseract
+from pyocr import tesseract
+
+
+BACKENDS = {
+    "tesseract": tesseract,
+    "libtesseract": libtesseract,
+    "cuneiform": cuneiform,
+}
+
+BUILDERS = {
+    "text": builders.TextBuilder,
+    "words": builders.WordBoxBuilder,
+    "lines": builders.LineBoxBuilder,
+    "chars": tesseract.CharBoxBuilder,
+}
+
+CONCURRENCY = [1, 4]
+
+ROUNDS = 5
+
+
+def _ocr_async(module, images, builder_list):
+    async def run():
+        return await asyncio.gather(*[
+            module.image_to_string(image, lang="eng", builder=builder)
+            for (image, builder) in zip(images, builder_list)
+        ])
+    return asyncio.run(run())
+
+
+def _ocr_threads(executor, module, images, builder_list):
+    futures = [
+        executor.submit(module.image_to_string, image, lang="eng",
+                        builder=builder)
+        for (image, builder) in zip(images, builder_list)
+    ]
+    return [future.result() for future in futures]
+
+
+@pytest.mark.parametrize("concurrency", CONCURRENCY,
+                         ids=lambda nb: "x%d" % nb)
+@pytest.mark.parametrize("builder_name", list(BUILDERS))
+@pytest.mark.parametrize("backend_name", list(BACKENDS))
+def test_image_to_string(benchmark, stubs, page, backend_name,
+                         builder_name, concurrency):
+    module = BACKENDS[backend_name]
+    builder_cls = BUILDERS[builder_name]
+    if builder_cls not in module.get_available_builders():
+        pytest.skip("{} does not support {}".format(
+            backend_name, builder_cls.__name__
+        ))
+
+    benchmark.group = "{}-{}".format(backend_name, builder_name)
+    benchmark.extra_info["stubbed"] = backend_name in stubs
+    benchmark.extra_info["pages_per_round"] = concurrency
+    benchmark.extra_info["page_size"] = page.size
+
+    images = [page] * concurrency
+
+    def setup():
+        # builders accumulate their output: a new one for each call
+        builder_list = [builder_cls() for _ in range(concurrency)]
+        return ((images, builder_list), {})
+
+    if asyncio.iscoroutinefunction(module.image_to_string):
+        def run(images, builder_list):
+            return _ocr_async(module, images, builder_list)
+        results = benchmark.pedantic(run, setup=setup, rounds=ROUNDS,
+                                     warmup_rounds=1)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            def run(images, builder_list):
+                return _ocr_threads(executor, module, images, builder_list)
+            results = benchmark.pedantic(run, setup=setup, rounds=ROUNDS,
+                                         warmup_rounds=1)
+    assert len(results) == concurrency
@@ -0,0 +1,70 @@
+"""
+Recognition of a single page: whole page on one handle
+(libtesseract.image_to_string()) versus text blocks recognized in parallel
+(libtesseract.parallel.image_to_string()), and the layout analysis alone
+(libtesseract.analyse_layout()).
+
+When libtesseract is stubbed, the page is split in blocks of
+LINES_PER_BLOCK lines and each recognition sleeps for a time proportional
+to the area recognized (at least STUB_LATENCY for the whole page), so the
+benchmark measures the overhead of the layout analysis and of the merge.
+The blocks are recognized by WORKERS threads, whatever the number of CPUs:
+with a real Tesseract, more threads than CPUs bring nothing.
+"""
+
+import contextlib
+
+import pytest
+
+from pyocr import builders
+from pyocr import libtesseract
+from pyocr import stub
+from pyocr.libtesseract import parallel
+
+from .conftest import STUB_LATENCY
+from .conftest import get_page
+
+
+DPI = 300
+
+LINES_PER_BLOCK = 10
+
+WORKERS = 4
+
+# time of the stubbed recognition of a whole page
+MIN_STUB_LATENCY = 0.2
+
+
+@pytest.fixture(scope="module")
+def handles(stubs):
+    with contextlib.ExitStack() as stack:
+        if "libtesseract" in stubs:
+            stack.enter_context(stub.StubLibTesseract(
+                latency=max(STUB_LATENCY, MIN_STUB_LATENCY),
+                lines_per_block=LINES_PER_BLOCK
+            ))
+        yield stack.enter_context(parallel.HandlePool())
+
+
+@pytest.mark.parametrize("mode", ["page", "blocks", "layout"])
+def test_single_page(benchmark, stubs, handles, mode):
+    image = get_page(DPI)
+    benchmark.group = "parallel-blocks"
+    benchmark.extra_info["stubbed"] = "libtesseract" in stubs
+
+    if mode == "page":
+        def run():
+            return libtesseract.image_to_string(
+                image, lang="eng", builder=builders.WordBoxBuilder()
+            )
+    elif mode == "layout":
+        def run():
+            return libtesseract.analyse_layout(image, handles=handles)
+    else:
+        def run():
+            return parallel.image_to_string(
+                image, lang="eng", builder=builders.WordBoxBuilder(),
+                max_workers=WORKERS, handles=handles
+            )
+    result = benchmark.pedantic(run, rounds=3, warmup_rounds=1)
+    assert len(result) > 0
@@ -0,0 +1,94 @@
+"""
+Pure-Python benchmarks of the output parsers and writers of the builders,
+on the fixtures of tests/data/.
+"""
+
+import io
+import re
+
+import pytest
+
+from pyocr import builders
+from pyocr import tesseract
+
+from .conftest import get_data
+
+
+READ_CASES = [
+    (builders.TextBuilder, "text"),
+    (builders.WordBoxBuilder, "words"),
+    (builders.WordBoxBuilder, "words_bbox"),
+    (builders.WordBoxBuilder, "cuneiform.words"),
+    (builders.LineBoxBuilder, "tesseract.lines"),
+    (builders.LineBoxBuilder, "cuneiform.lines"),
+    (builders.LineBoxBuilder, "digits.lines"),
+    (tesseract.CharBoxBuilder, "boxes"),
+]
+
+# cuneiform.words with lines `factor` times longer
+CUNEIFORM_LINE_RE = re.compile(
+    r"(<span class='ocr_line'[^>]*>)(.*?)"
+    r"(<span class='ocr_cinfo' title=\"x_bboxes )([^\"]*)(\">)"
+)
+
+CUNEIFORM_SCALES = [1, 10, 100]
+
+WRITE_CASES = [
+    (builders.WordBoxBuilder, "words"),
+    (builders.LineBoxBuilder, "tesseract.lines"),
+    (tesseract.CharBoxBuilder, "boxes"),
+]
+
+
+def _case_id(case):
+    return "{}-{}".format(case[0].__name__, case[1])
+
+
+@pytest.mark.parametrize("case", READ_CASES, ids=_case_id)
+def test_read_file(benchmark, stubs, case):
+    (builder_cls, filename) = case
+    builder = builder_cls()
+    content = get_data(filename)
+    benchmark.group = "read_file"
+    benchmark.extra_info["input_bytes"] = len(content.encode("utf-8"))
+
+    output = benchmark(lambda: builder.read_file(io.StringIO(content)))
+    assert len(output) > 0
+
+
+def _scale_cuneiform_lines(content, factor):
+    def scale(match):
+        (line, text, cinfo, positions, end) = match.groups()
+        return line + text * factor + cinfo + positions * factor + end
+    return CUNEIFORM_LINE_RE.sub(scale, content)
+
+
+@pytest.mark.parametrize("factor", CUNEIFORM_SCALES,
+                         ids=lambda factor: "x%d" % factor)
+def test_read_cuneiform_long_lines(benchmark, stubs, factor):
+    builder = builders.WordBoxBuilder()
+    content = _scale_cuneiform_lines(get_data("cuneiform.words"), factor)
+    nb_words = len(builder.read_file(io.StringIO(content)))
+    benchmark.group = "read_file-cuneiform-long-lines"
+    benchmark.extra_info["input_bytes"] = len(content.encode("utf-8"))
+    benchmark.extra_info["nb_words"] = nb_words
+
+    output = benchmark(lambda: builder.read_file(io.StringIO(content)))
+    assert len(output) == nb_words
+
+
+@pytest.mark.parametrize("case", WRITE_CASES, ids=_case_id)
+def test_write_file(benchmark, stubs, case):
+    (builder_cls, filename) = case
+    builder = builder_cls()
+    boxes = builder.read_file(io.StringIO(get_data(filename)))
+    benchmark.group = "write_file"
+    benchmark.extra_info["nb_boxes"] = len(boxes)
+
+    def write():
+        output = io.StringIO()
+        builder.write_file(output, boxes)
+        return output
+
+    output = benchmark(write)
+    assert output.tell() > 0
@@ -0,0 +1,73 @@
+"""
+Throughput of the speed presets (see pyocr.presets) on the pages of the
+test corpus, for the Tesseract backends.
+
+Each round OCRs CONCURRENCY copies of a 300 dpi page at the same time, so
+the presets limiting the threads of each process are measured in the
+situation they are made for. The stubbed engines (see conftest.py) ignore
+the engine settings: meaningful numbers require a real Tesseract.
+"""
+
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from pyocr import builders
+from pyocr import libtesseract
+from pyocr import presets
+from pyocr import tesseract
+
+from .conftest import get_page
+
+
+BACKENDS = {
+    "tesseract": tesseract,
+    "libtesseract": libtesseract,
+}
+
+CONCURRENCY = 4
+
+DPI = 300
+
+ROUNDS = 5
+
+
+@pytest.mark.parametrize("preset", sorted(presets.PRESETS))
+@pytest.mark.parametrize("backend_name", list(BACKENDS))
+def test_preset(benchmark, stubs, backend_name, preset):
+    module = BACKENDS[backend_name]
+    images = [get_page(DPI)] * CONCURRENCY
+
+    benchmark.group = "presets-{}".format(backend_name)
+    benchmark.extra_info["stubbed"] = backend_name in stubs
+    benchmark.extra_info["pages_per_round"] = CONCURRENCY
+
+    def setup():
+        builder_list = [builders.TextBuilder() for _ in range(CONCURRENCY)]
+        return ((builder_list,), {})
+
+    if asyncio.iscoroutinefunction(module.image_to_string):
+        def run(builder_list):
+            async def gather():
+                return await asyncio.gather(*[
+                    module.image_to_string(image, lang="eng",
+                                           builder=builder, preset=preset)
+                    for (image, builder) in zip(images, builder_list)
+                ])
+            return asyncio.run(gather())
+        results = benchmark.pedantic(run, setup=setup, rounds=ROUNDS,
+                                     warmup_rounds=1)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(CONCURRENCY) as executor:
+            def run(builder_list):
+                futures = [
+                    executor.submit(module.image_to_string, image,
+                                    lang="eng", builder=builder,
+                                    preset=preset)
+                    for (image, builder) in zip(images, builder_list)
+                ]
+                return [future.result() for future in futures]
+            results = benchmark.pedantic(run, setup=setup, rounds=ROUNDS,
+                                         warmup_rounds=1)
+    assert len(results) == CONCURRENCY
@@ -0,0 +1,91 @@
+"""
+Fixtures shared by the benchmarks.
+
+When an OCR engine is not installed (or when PYOCR_BENCHMARK_STUBS=1), it is
+replaced by a stub returning canned outputs (see pyocr.stub). The Python
+layers (image encoding, temporary files, process spawning, output parsing,
+builders) still run, so the benchmarks remain meaningful for them.
+
+Environment variables:
+    PYOCR_BENCHMARK_STUBS --- "1": always use the stubbed engines
+    PYOCR_BENCHMARK_LATENCY --- time (in seconds) taken by each recognition
+        of the stubbed engines (default: 0)
+"""
+
+import contextlib
+import functools
+import os
+import shutil
+
+import pytest
+
+from PIL import Image
+from PIL import ImageDraw
+
+from pyocr import cuneiform
+from pyocr import libtesseract
+from pyocr import stub
+from pyocr import tesseract
+
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "tests", "data"
+)
+
+FORCE_STUBS = (os.getenv("PYOCR_BENCHMARK_STUBS", "0") == "1")
+STUB_LATENCY = float(os.getenv("PYOCR_BENCHMARK_LATENCY", "0"))
+
+# A4 page
+PAGE_SIZE_INCHES = (8.27, 11.69)
+
+
+@functools.lru_cache(maxsize=None)
+def get_data(filename):
+    with open(os.path.join(DATA_DIR, filename), encoding="utf-8") as fd:
+        return fd.read()
+
+
+@functools.lru_cache(maxsize=None)
+def get_page(dpi):
+    """
+    Returns an A4 page, scanned at `dpi`, containing the text of
+    tests/data/text.
+    """
+    size = (int(PAGE_SIZE_INCHES[0] * dpi), int(PAGE_SIZE_INCHES[1] * dpi))
+    image = Image.new("RGB", size, color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    margin = dpi // 2
+    line_height = dpi // 5
+    for (idx, line) in enumerate(get_data("text").splitlines()):
+        draw.text((margin, margin + (idx * line_height)), line,
+                  fill=(0, 0, 0))
+    image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+@pytest.fixture(scope="session")
+def stubs():
+    """
+    Replace the engines that are not available by stubs (see pyocr.stub).
+
+    Returns:
+        The set of the names of the stubbed engines
+    """
+    stubbed = set()
+    with contextlib.ExitStack() as stack:
+        if FORCE_STUBS or shutil.which(tesseract.TESSERACT_CMD) is None:
+            stubbed.add("tesseract")
+            stack.enter_context(stub.StubTesseract(latency=STUB_LATENCY))
+        if FORCE_STUBS or not libtesseract.is_available():
+            stubbed.add("libtesseract")
+            stack.enter_context(stub.StubLibTesseract(latency=STUB_LATENCY))
+        if FORCE_STUBS or not cuneiform.is_available():
+            stubbed.add("cuneiform")
+            stack.enter_context(stub.StubCuneiform(latency=STUB_LATENCY))
+        yield stubbed
+
+
+@pytest.fixture(params=[75, 150, 300], ids=lambda dpi: "%ddpi" % dpi)
+def page(request):
+    return get_page(request.param)
@@ -54,6 +54,9 @@ setup(
     install_requires=[
         "Pillow",
     ],
+    extras_require={
+        "preprocessing": ["numpy"],
+    },
     setup_requires=[
         'setuptools_scm',
         'setuptools_scm_git_archive',
@@ -13,12 +13,33 @@ See PyOCR `README.markdown` file for more information:
 
 """)
 
-from .pyocr import *  # noqa
-from .error import PyocrException
+import importlib  # noqa: E402
+
+from .pyocr import (  # noqa: E402
+    aget_available_tools,
+    get_available_tools,
+    TOOL_NAMES,
+    VERSION,
+)
+from .error import PyocrException  # noqa: E402
 
 __all__ = [
+    'aget_available_tools',
     'get_available_tools',
     'PyocrException',
     'TOOLS',
     'VERSION',
 ]
+
+
+def __getattr__(name):
+    # PEP 562: the modules of the OCR tools (and TOOLS) are imported on
+    # first access, so that importing pyocr remains fast.
+    if name == 'TOOLS':
+        from . import pyocr
+        return pyocr.TOOLS
+    if name in TOOL_NAMES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
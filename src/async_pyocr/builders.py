@@ -4,20 +4,28 @@ Builders: Each builder specifies the expected output format
 raw text : TextBuilder
 words + boxes : WordBoxBuilder
 lines + words + boxes : LineBoxBuilder
+blocks + paragraphs + lines + words + boxes : PageBuilder
 """
 
+import array
 from html.parser import HTMLParser
 import logging
 import xml.dom.minidom
 
+from . import instrumentation
+
 logger = logging.getLogger(__name__)
 
 __all__ = [
+    'Block',
     'Box',
     'TextBuilder',
     'WordBoxBuilder',
     'LineBox',
     'LineBoxBuilder',
+    'PageBuilder',
+    'Paragraph',
+    'SymbolChoices',
     'DigitBuilder',
     'DigitLineBoxBuilder',
 ]
@@ -31,6 +39,76 @@ _XHTML_HEADER = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.1//EN"
 </head>
 """
 
+# number of boxes converted to hOCR before each write to the output file
+_HOCR_WRITE_CHUNK = 256
+
+
+def _xml_escape(data):
+    """
+    Escape `data` the same way xml.dom.minidom does when serializing.
+    """
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+        replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _parse_hocr_confidence(title):
+    for piece in title.split("; "):
+        piece = piece.strip()
+        if not piece.startswith("x_wconf"):
+            continue
+        confidence = piece.split(" ")[1]
+        return int(confidence)
+    logger.debug("OCR confidence measure not found. Assuming 0.")
+    return 0
+
+
+def _parse_hocr_position(title):
+    for piece in title.split("; "):
+        piece = piece.strip()
+        if not piece.startswith("bbox"):
+            continue
+        piece = piece.split(" ")
+        position = ((int(piece[1]), int(piece[2])),
+                    (int(piece[3]), int(piece[4])))
+        return position
+    raise Exception("Invalid hocr position: %s" % title)
+
+
+def _mean_confidence(word_boxes):
+    if not word_boxes:
+        return 0
+    return sum([box.confidence for box in word_boxes]) / len(word_boxes)
+
+
+def _union_position(positions):
+    positions = list(positions)
+    if not positions:
+        return ((0, 0), (0, 0))
+    return (
+        (min([position[0][0] for position in positions]),
+         min([position[0][1] for position in positions])),
+        (max([position[1][0] for position in positions]),
+         max([position[1][1] for position in positions])),
+    )
+
+
+def _write_hocr(file_descriptor, boxes):
+    """
+    Write boxes (Box or LineBox) in a *very* *simplified* version of hOCR.
+    Boxes are converted to strings and written by chunks.
+    """
+    file_descriptor.write(_XHTML_HEADER)
+    file_descriptor.write("<body>\n")
+    chunk = []
+    for box in boxes:
+        chunk.append("<p>" + box.get_hocr() + "</p>\n")
+        if len(chunk) >= _HOCR_WRITE_CHUNK:
+            file_descriptor.write("".join(chunk))
+            chunk = []
+    if chunk:
+        file_descriptor.write("".join(chunk))
+    file_descriptor.write("</body>\n</html>\n")
+
 
 class Box(object):
     """
@@ -39,17 +117,25 @@ class Box(object):
     was used.
     """
 
-    def __init__(self, content, position, confidence=0):
+    def __init__(self, content, position, confidence=0, char_boxes=None,
+                 choices=None):
         """
         Arguments:
             content --- a single string
             position --- the position of the box on the image. Given as a
                 tuple of tuple:
                 ((box_pt_min_x, box_pt_min_y), (box_pt_max_x, box_pt_max_y))
+            confidence --- confidence score given by the OCR tool
+            char_boxes --- for a word, list of the Box of its characters
+                (None if the builder doesn't collect them)
+            choices --- for a word, SymbolChoices of its characters (None
+                if the builder doesn't collect them)
         """
         self.content = content
         self.position = position
         self.confidence = confidence
+        self.char_boxes = char_boxes
+        self.choices = choices
 
     def get_xml_tag(self, parent_doc):
         span_tag = parent_doc.createElement("span")
@@ -63,6 +149,20 @@ class Box(object):
         span_tag.appendChild(txt)
         return span_tag
 
+    def get_hocr(self):
+        """
+        Return the hOCR of this box as a string (same output as
+        `get_xml_tag(doc).toxml()`, without going through a DOM).
+        """
+        return (
+            '<span class="ocrx_word" title="bbox %d %d %d %d; x_wconf %d">'
+            '%s</span>' % (
+                self.position[0][0], self.position[0][1],
+                self.position[1][0], self.position[1][1],
+                self.confidence, _xml_escape(self.content)
+            )
+        )
+
     def __str__(self):
         return "{} {} {} {} {}".format(
             self.content,
@@ -115,6 +215,54 @@ class Box(object):
         return (position_hash ^ hash(self.content) ^ hash(self.content))
 
 
+class SymbolChoices(object):
+    """
+    Alternatives proposed by the OCR tool for the characters of a word,
+    best first. They are kept in parallel arrays, one entry per
+    alternative:
+        symbols --- index of the character in the word
+        texts --- text of the alternative
+        confidences --- confidence of the alternative
+    """
+
+    def __init__(self):
+        self.symbols = array.array("I")
+        self.texts = []
+        self.confidences = array.array("f")
+
+    def append(self, symbol, text, confidence):
+        self.symbols.append(symbol)
+        self.texts.append(text)
+        self.confidences.append(confidence)
+
+    def get(self, symbol):
+        """
+        Returns the alternatives of the character `symbol` of the word, as
+        a list of (text, confidence).
+        """
+        return [
+            (text, confidence)
+            for (idx, text, confidence) in zip(self.symbols, self.texts,
+                                               self.confidences)
+            if idx == symbol
+        ]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __eq__(self, other):
+        if not isinstance(other, SymbolChoices):
+            return NotImplemented
+        return (self.symbols == other.symbols and
+                self.texts == other.texts and
+                self.confidences == other.confidences)
+
+    def __repr__(self):
+        return "SymbolChoices({})".format(
+            list(zip(self.symbols, self.texts, self.confidences))
+        )
+
+
 class LineBox(object):
     """
     Boxes are rectangles around each individual element recognized in the
@@ -140,6 +288,13 @@ class LineBox(object):
         txt = txt.strip()
         return txt
 
+    @property
+    def confidence(self):
+        """
+        Mean confidence of the words of the line (0 if it has no word)
+        """
+        return _mean_confidence(self.word_boxes)
+
     def get_xml_tag(self, parent_doc):
         span_tag = parent_doc.createElement("span")
         span_tag.setAttribute("class", "ocr_line")
@@ -155,6 +310,21 @@ class LineBox(object):
             span_tag.appendChild(box_xml)
         return span_tag
 
+    def get_hocr(self):
+        """
+        Return the hOCR of this line as a string (same output as
+        `get_xml_tag(doc).toxml()`, without going through a DOM).
+        """
+        span_tag = '<span class="ocr_line" title="bbox %d %d %d %d"' % (
+            self.position[0][0], self.position[0][1],
+            self.position[1][0], self.position[1][1]
+        )
+        if not self.word_boxes:
+            return span_tag + "/>"
+        return "{}>{}</span>".format(
+            span_tag, " ".join([box.get_hocr() for box in self.word_boxes])
+        )
+
     def __str__(self):
         txt = "[\n"
         for box in self.word_boxes:
@@ -217,6 +387,182 @@ class LineBox(object):
         return (position_hash ^ hash(content))
 
 
+class Paragraph(object):
+    """
+    Paragraph of a text block. Contains LineBox.
+    """
+
+    def __init__(self, line_boxes, position):
+        """
+        Arguments:
+            line_boxes --- a list of LineBox objects
+            position --- the position of the paragraph on the image. Given
+                as a tuple of tuple:
+                ((box_pt_min_x, box_pt_min_y), (box_pt_max_x, box_pt_max_y))
+        """
+        self.line_boxes = line_boxes
+        self.position = position
+
+    @property
+    def word_boxes(self):
+        return [box for line in self.line_boxes for box in line.word_boxes]
+
+    @property
+    def content(self):
+        return u"\n".join([line.content for line in self.line_boxes])
+
+    @property
+    def confidence(self):
+        """
+        Mean confidence of the words of the paragraph (0 if it has no word)
+        """
+        return _mean_confidence(self.word_boxes)
+
+    def get_hocr(self, line_class="ocr_line"):
+        """
+        Return the hOCR of this paragraph as a string.
+        """
+        lines = [line.get_hocr() for line in self.line_boxes]
+        if line_class != "ocr_line":
+            lines = [
+                line.replace('"ocr_line"', '"%s"' % line_class, 1)
+                for line in lines
+            ]
+        return '<p class="ocr_par" title="bbox %d %d %d %d">%s</p>' % (
+            self.position[0][0], self.position[0][1],
+            self.position[1][0], self.position[1][1],
+            "\n".join(lines)
+        )
+
+    def __str__(self):
+        return "Paragraph({} lines) {} {} {} {}".format(
+            len(self.line_boxes),
+            self.position[0][0],
+            self.position[0][1],
+            self.position[1][0],
+            self.position[1][1],
+        )
+
+
+class Block(object):
+    """
+    Region of a page found by the layout analysis: a column of text, a
+    heading, an image, a table, a separator, ... Only the text blocks
+    contain paragraphs.
+    """
+
+    def __init__(self, block_type, paragraphs, position):
+        """
+        Arguments:
+            block_type --- type of the block
+                (libtesseract.tesseract_raw.PolyBlockType)
+            paragraphs --- a list of Paragraph objects
+            position --- the position of the block on the image. Given as a
+                tuple of tuple:
+                ((box_pt_min_x, box_pt_min_y), (box_pt_max_x, box_pt_max_y))
+        """
+        self.block_type = block_type
+        self.paragraphs = paragraphs
+        self.position = position
+
+    @property
+    def line_boxes(self):
+        return [
+            line
+            for paragraph in self.paragraphs
+            for line in paragraph.line_boxes
+        ]
+
+    @property
+    def word_boxes(self):
+        return [
+            box
+            for paragraph in self.paragraphs
+            for line in paragraph.line_boxes
+            for box in line.word_boxes
+        ]
+
+    @property
+    def content(self):
+        return u"\n\n".join([
+            paragraph.content for paragraph in self.paragraphs
+        ])
+
+    @property
+    def confidence(self):
+        """
+        Mean confidence of the words of the block (0 if it has no word)
+        """
+        return _mean_confidence(self.word_boxes)
+
+    def get_hocr(self):
+        """
+        Return the hOCR of this block as a string. The block type is
+        given by the class of the block (images and separators) or by the
+        class of its lines (headings, captions and pull-out texts).
+        """
+        (block_class, line_class) = _get_hocr_classes(self.block_type)
+        return '<div class="%s" title="bbox %d %d %d %d">%s</div>' % (
+            block_class,
+            self.position[0][0], self.position[0][1],
+            self.position[1][0], self.position[1][1],
+            "\n".join([
+                paragraph.get_hocr(line_class)
+                for paragraph in self.paragraphs
+            ])
+        )
+
+    def __str__(self):
+        return "Block(type {}, {} paragraphs) {} {} {} {}".format(
+            self.block_type,
+            len(self.paragraphs),
+            self.position[0][0],
+            self.position[0][1],
+            self.position[1][0],
+            self.position[1][1],
+        )
+
+
+def _get_hocr_block_types():
+    """
+    Returns:
+        (hOCR class of the blocks --> block type,
+        hOCR class of the lines --> type of their block)
+    """
+    # imported here to avoid a circular import
+    from .libtesseract.tesseract_raw import PolyBlockType
+    return (
+        {
+            "ocr_carea": PolyBlockType.FLOWING_TEXT,
+            "ocr_photo": PolyBlockType.FLOWING_IMAGE,
+            "ocr_separator": PolyBlockType.HORZ_LINE,
+        },
+        {
+            "ocr_line": PolyBlockType.FLOWING_TEXT,
+            "ocr_header": PolyBlockType.HEADING_TEXT,
+            "ocr_caption": PolyBlockType.CAPTION_TEXT,
+            "ocr_textfloat": PolyBlockType.PULLOUT_TEXT,
+        },
+    )
+
+
+def _get_hocr_classes(block_type):
+    """
+    Returns:
+        (hOCR class of the block, hOCR class of its lines)
+    """
+    (block_types, line_types) = _get_hocr_block_types()
+    block_class = "ocr_carea"
+    line_class = "ocr_line"
+    for (hocr_class, hocr_type) in block_types.items():
+        if hocr_type == block_type:
+            block_class = hocr_class
+    for (hocr_class, hocr_type) in line_types.items():
+        if hocr_type == block_type:
+            line_class = hocr_class
+    return (block_class, line_class)
+
+
 class BaseBuilder(object):
     """
     Builders format the output of the OCR tools,
@@ -226,8 +572,23 @@ class BaseBuilder(object):
         file_extensions : File extensions of the output.
         tesseract_configs : Arguments passed to the Tesseract command line.
         cuneiform_args : Arguments passed to the Cuneiform command line.
+        needs_layout : If True, Libtesseract calls start_block() and
+            start_paragraph() before the first line of each block and
+            paragraph.
+        needs_symbols : If True, Libtesseract calls add_symbol() for each
+            character of a word, after add_word().
+        max_choices : If > 0, Libtesseract calls add_choices() after
+            add_word() with at most this number of alternatives for each
+            character of the word.
+        skip_reason : Reason why the recognition was skipped by the
+            triage (see module triage), or None.
     """
 
+    needs_layout = False
+    needs_symbols = False
+    max_choices = 0
+    skip_reason = None
+
     def __init__(self, file_extensions, tesseract_flags, tesseract_configs,
                  cuneiform_args):
         self.file_extensions = file_extensions
@@ -268,6 +629,32 @@ class BaseBuilder(object):
         """
         raise NotImplementedError("Implement in subclasses")
 
+    def start_block(self, box, block_type):
+        """
+        Start a new block of output (only if needs_layout is True).
+        """
+        pass
+
+    def start_paragraph(self, box):
+        """
+        Start a new paragraph of output (only if needs_layout is True).
+        """
+        pass
+
+    def add_symbol(self, symbol, box, confidence=0):
+        """
+        Add a character of the last word to output (only if needs_symbols
+        is True).
+        """
+        pass
+
+    def add_choices(self, choices):
+        """
+        Add the SymbolChoices of the last word to output (only if
+        max_choices > 0).
+        """
+        pass
+
     def get_output(self):  # pragma: no cover
         """
         Return the output that has been built so far.
@@ -306,7 +693,8 @@ class TextBuilder(BaseBuilder):
         """
         Read a file and extract the content as a string.
         """
-        return file_descriptor.read().strip()
+        with instrumentation.span("builder.read_file"):
+            return file_descriptor.read().strip()
 
     @staticmethod
     def write_file(file_descriptor, text):
@@ -375,29 +763,6 @@ class _WordHTMLParser(HTMLParser):
         self.__current_line_content = []
         self.lines = []
 
-    @staticmethod
-    def __parse_confidence(title):
-        for piece in title.split("; "):
-            piece = piece.strip()
-            if not piece.startswith("x_wconf"):
-                continue
-            confidence = piece.split(" ")[1]
-            return int(confidence)
-        logger.debug("OCR confidence measure not found. Assuming 0.")
-        return 0
-
-    @staticmethod
-    def __parse_position(title):
-        for piece in title.split("; "):
-            piece = piece.strip()
-            if not piece.startswith("bbox"):
-                continue
-            piece = piece.split(" ")
-            position = ((int(piece[1]), int(piece[2])),
-                        (int(piece[3]), int(piece[4])))
-            return position
-        raise Exception("Invalid hocr position: %s" % title)
-
     def handle_starttag(self, tag, attrs):
         if (tag != "span"):
             return
@@ -412,8 +777,8 @@ class _WordHTMLParser(HTMLParser):
             return
         if tag_type == 'ocr_word' or tag_type == 'ocrx_word':
             try:
-                confidence = self.__parse_confidence(position)
-                position = self.__parse_position(position)
+                confidence = _parse_hocr_confidence(position)
+                position = _parse_hocr_position(position)
                 self.__current_box_confidence = confidence
                 self.__current_box_position = position
             except Exception:
@@ -422,7 +787,7 @@ class _WordHTMLParser(HTMLParser):
                 return
             self.__current_box_text = ""
         elif tag_type == 'ocr_line':
-            self.__current_line_position = self.__parse_position(position)
+            self.__current_line_position = _parse_hocr_position(position)
             self.__current_line_content = []
         self.__tag_types.append(tag_type)
 
@@ -483,63 +848,187 @@ class _LineHTMLParser(HTMLParser):
                     tag_type = self.TAG_TYPE_POSITIONS
 
         if tag_type == self.TAG_TYPE_CONTENT:
-            self.__line_text = ""
+            self.__line_text = []
             self.__char_positions = []
             return
         elif tag_type == self.TAG_TYPE_POSITIONS:
+            positions = self.__char_positions
             for attr in attrs:
                 if attr[0] == 'title':
-                    self.__char_positions = attr[1].split(" ")
-            # strip x_bboxes
-            self.__char_positions = self.__char_positions[1:]
-            if self.__char_positions[-1] == "":
-                self.__char_positions = self.__char_positions[:-1]
-            try:
-                while True:
-                    self.__char_positions.remove("-1")
-            except ValueError:
-                pass
+                    positions = attr[1].split(" ")[1:]  # strip x_bboxes
+            # spaces have "-1 -1 -1 -1" for position
+            self.__char_positions = [
+                int(position) for position in positions
+                if position != "-1" and position != ""
+            ]
 
     def handle_data(self, data):
         if self.__line_text is None:
             return
-        self.__line_text += data
+        self.__line_text.append(data)
 
     def handle_endtag(self, tag):
         if self.__line_text is None or self.__char_positions == []:
             return
-        words = self.__line_text.split(" ")
-        for word in words:
+        positions = self.__char_positions
+        start = 0
+        for word in "".join(self.__line_text).split(" "):
             if word == "":
                 continue
-            positions = self.__char_positions[0:4 * len(word)]
-            self.__char_positions = self.__char_positions[4 * len(word):]
-
-            left_pos = min([int(positions[x])
-                            for x in range(0, 4 * len(word), 4)])
-            top_pos = min([int(positions[x])
-                           for x in range(1, 4 * len(word), 4)])
-            right_pos = max([int(positions[x])
-                             for x in range(2, 4 * len(word), 4)])
-            bottom_pos = max([int(positions[x])
-                              for x in range(3, 4 * len(word), 4)])
-
-            box_pos = ((left_pos, top_pos), (right_pos, bottom_pos))
-            box = Box(word, box_pos)
-            self.boxes.append(box)
+            end = start + 4 * len(word)
+            # positions are (left, top, right, bottom) for each character
+            box_pos = (
+                (min(positions[start:end:4]),
+                 min(positions[start + 1:end:4])),
+                (max(positions[start + 2:end:4]),
+                 max(positions[start + 3:end:4])),
+            )
+            start = end
+            self.boxes.append(Box(word, box_pos))
         self.__line_text = None
 
     def __str__(self):  # pragma: no cover
         return "LineHTMLParser"
 
 
+class _PageHTMLParser(HTMLParser):
+    """
+    Tesseract style, with the layout: blocks (ocr_carea, ...), paragraphs
+    (ocr_par), lines (ocr_line, ocr_header, ...) and words (ocrx_word).
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        (self.__block_types, self.__line_types) = _get_hocr_block_types()
+        self.__default_type = self.__block_types["ocr_carea"]
+        self.__span_types = []
+        self.__word = None
+        self.blocks = []
+
+    def __current_block(self):
+        if not self.blocks:
+            self.blocks.append(Block(self.__default_type, [], None))
+        return self.blocks[-1]
+
+    def __current_paragraph(self):
+        block = self.__current_block()
+        if not block.paragraphs:
+            block.paragraphs.append(Paragraph([], None))
+        return block.paragraphs[-1]
+
+    def __current_line(self, position):
+        paragraph = self.__current_paragraph()
+        if not paragraph.line_boxes:
+            paragraph.line_boxes.append(LineBox([], position))
+        return paragraph.line_boxes[-1]
+
+    def handle_starttag(self, tag, attrs):
+        hocr_class = None
+        title = None
+        for attr in attrs:
+            if attr[0] == 'class':
+                hocr_class = attr[1]
+            if attr[0] == 'title':
+                title = attr[1]
+        if tag == "span":
+            self.__span_types.append(hocr_class)
+        if hocr_class is None or title is None:
+            return
+        try:
+            position = _parse_hocr_position(title)
+        except Exception:
+            # invalid position --> old format --> we ignore this tag
+            return
+        if hocr_class in self.__block_types:
+            self.blocks.append(Block(self.__block_types[hocr_class], [],
+                                     position))
+        elif hocr_class == 'ocr_par':
+            self.__current_block().paragraphs.append(Paragraph([], position))
+        elif hocr_class in self.__line_types:
+            block = self.__current_block()
+            if block.block_type == self.__default_type:
+                block.block_type = self.__line_types[hocr_class]
+            self.__current_paragraph().line_boxes.append(
+                LineBox([], position)
+            )
+        elif hocr_class == 'ocr_word' or hocr_class == 'ocrx_word':
+            self.__word = ["", position, _parse_hocr_confidence(title)]
+
+    def handle_data(self, data):
+        if self.__word is None:
+            return
+        self.__word[0] += data
+
+    def handle_endtag(self, tag):
+        if tag != 'span' or not self.__span_types:
+            return
+        hocr_class = self.__span_types.pop()
+        if hocr_class != 'ocr_word' and hocr_class != 'ocrx_word':
+            return
+        if self.__word is None:
+            return
+        (content, position, confidence) = self.__word
+        self.__current_line(position).word_boxes.append(
+            Box(content, position, confidence)
+        )
+        self.__word = None
+
+    def get_blocks(self):
+        """
+        Returns:
+            The blocks. The missing positions of the blocks and paragraphs
+            are computed from their content.
+        """
+        for block in self.blocks:
+            for paragraph in block.paragraphs:
+                if paragraph.position is None:
+                    paragraph.position = _union_position(
+                        line.position for line in paragraph.line_boxes
+                    )
+            if block.position is None:
+                block.position = _union_position(
+                    paragraph.position for paragraph in block.paragraphs
+                )
+        return self.blocks
+
+    def __str__(self):  # pragma: no cover
+        return "PageHTMLParser"
+
+
+def _read_line_boxes(html_str):
+    """
+    Extract a list of LineBox from hOCR.
+    """
+    parsers = [
+        (_WordHTMLParser(), lambda parser: parser.lines),
+        (_LineHTMLParser(),
+         lambda parser: [LineBox([box], box.position)
+                         for box in parser.boxes]),
+    ]
+
+    for (parser, convertion) in parsers:
+        parser.feed(html_str)
+        if len(parser.boxes) > 0:
+            last_box = parser.boxes[-1]
+            if last_box.content == "":
+                # some parser leave an empty box at the end
+                parser.boxes.pop(-1)
+            return convertion(parser)
+    return []
+
+
 class WordBoxBuilder(BaseBuilder):
     """
     If passed to image_to_string(), image_to_string() will return an array of
     Box. Each box contains a word recognized in the image.
+
+    With Libtesseract and char_boxes=True, the 'char_boxes' of each word
+    are the boxes of its characters, found by the same recognition. With
+    choices=N, the 'choices' of each word are the SymbolChoices giving at
+    most N alternatives for each of its characters.
     """
 
-    def __init__(self, tesseract_layout=1):
+    def __init__(self, tesseract_layout=1, char_boxes=False, choices=0):
         from .tesseract import psm_parameter
         tess_flags = [psm_parameter(), str(tesseract_layout)]
         file_ext = ["html", "hocr"]
@@ -549,6 +1038,8 @@ class WordBoxBuilder(BaseBuilder):
                                              cun_args)
         self.word_boxes = []
         self.tesseract_layout = tesseract_layout
+        self.needs_symbols = char_boxes
+        self.max_choices = choices
 
     def read_file(self, file_descriptor):
         """
@@ -557,18 +1048,19 @@ class WordBoxBuilder(BaseBuilder):
         Return:
             An array of Box.
         """
-        parsers = [_WordHTMLParser(), _LineHTMLParser()]
-        html_str = file_descriptor.read()
-
-        for p in parsers:
-            p.feed(html_str)
-            if len(p.boxes) > 0:
-                last_box = p.boxes[-1]
-                if last_box.content == "":
-                    # some parser leave an empty box at the end
-                    p.boxes.pop(-1)
-                return p.boxes
-        return []
+        with instrumentation.span("builder.read_file"):
+            parsers = [_WordHTMLParser(), _LineHTMLParser()]
+            html_str = file_descriptor.read()
+
+            for p in parsers:
+                p.feed(html_str)
+                if len(p.boxes) > 0:
+                    last_box = p.boxes[-1]
+                    if last_box.content == "":
+                        # some parser leave an empty box at the end
+                        p.boxes.pop(-1)
+                    return p.boxes
+            return []
 
     @staticmethod
     def write_file(file_descriptor, boxes):
@@ -579,23 +1071,21 @@ class WordBoxBuilder(BaseBuilder):
         Warning:
             The file_descriptor must support UTF-8 ! (see module 'codecs')
         """
-        global _XHTML_HEADER
-
-        impl = xml.dom.minidom.getDOMImplementation()
-        newdoc = impl.createDocument(None, "root", None)
-
-        file_descriptor.write(_XHTML_HEADER)
-        file_descriptor.write("<body>\n")
-        for box in boxes:
-            xml_str = box.get_xml_tag(newdoc).toxml()
-            file_descriptor.write("<p>" + xml_str + "</p>\n")
-        file_descriptor.write("</body>\n</html>\n")
+        _write_hocr(file_descriptor, boxes)
 
     def start_line(self, box):
         pass
 
     def add_word(self, word, box, confidence=0):
-        self.word_boxes.append(Box(word, box, confidence))
+        self.word_boxes.append(Box(
+            word, box, confidence, [] if self.needs_symbols else None
+        ))
+
+    def add_symbol(self, symbol, box, confidence=0):
+        self.word_boxes[-1].char_boxes.append(Box(symbol, box, confidence))
+
+    def add_choices(self, choices):
+        self.word_boxes[-1].choices = choices
 
     def end_line(self):
         pass
@@ -611,9 +1101,14 @@ class LineBoxBuilder(BaseBuilder):
     """
     If passed to image_to_string(), image_to_string() will return an array of
     LineBox. Each LineBox contains a list of word boxes.
+
+    With Libtesseract and char_boxes=True, the 'char_boxes' of each word
+    are the boxes of its characters, found by the same recognition. With
+    choices=N, the 'choices' of each word are the SymbolChoices giving at
+    most N alternatives for each of its characters.
     """
 
-    def __init__(self, tesseract_layout=1):
+    def __init__(self, tesseract_layout=1, char_boxes=False, choices=0):
         from .tesseract import psm_parameter
         tess_flags = [psm_parameter(), str(tesseract_layout)]
         file_ext = ["html", "hocr"]
@@ -623,6 +1118,8 @@ class LineBoxBuilder(BaseBuilder):
                                              cun_args)
         self.lines = []
         self.tesseract_layout = tesseract_layout
+        self.needs_symbols = char_boxes
+        self.max_choices = choices
 
     def read_file(self, file_descriptor):
         """
@@ -631,22 +1128,8 @@ class LineBoxBuilder(BaseBuilder):
         Return:
             An array of LineBox.
         """
-        parsers = [
-            (_WordHTMLParser(), lambda parser: parser.lines),
-            (_LineHTMLParser(), lambda parser: [LineBox([box], box.position)
-                                                for box in parser.boxes]),
-        ]
-        html_str = file_descriptor.read()
-
-        for (parser, convertion) in parsers:
-            parser.feed(html_str)
-            if len(parser.boxes) > 0:
-                last_box = parser.boxes[-1]
-                if last_box.content == "":
-                    # some parser leave an empty box at the end
-                    parser.boxes.pop(-1)
-                return convertion(parser)
-        return []
+        with instrumentation.span("builder.read_file"):
+            return _read_line_boxes(file_descriptor.read())
 
     @staticmethod
     def write_file(file_descriptor, boxes):
@@ -657,17 +1140,7 @@ class LineBoxBuilder(BaseBuilder):
         Warning:
             The file_descriptor must support UTF-8 ! (see module 'codecs')
         """
-        global _XHTML_HEADER
-
-        impl = xml.dom.minidom.getDOMImplementation()
-        newdoc = impl.createDocument(None, "root", None)
-
-        file_descriptor.write(_XHTML_HEADER)
-        file_descriptor.write("<body>\n")
-        for box in boxes:
-            xml_str = box.get_xml_tag(newdoc).toxml()
-            file_descriptor.write("<p>" + xml_str + "</p>\n")
-        file_descriptor.write("</body>\n</html>\n")
+        _write_hocr(file_descriptor, boxes)
 
     def start_line(self, box):
         # no empty line
@@ -676,7 +1149,17 @@ class LineBoxBuilder(BaseBuilder):
         self.lines.append(LineBox([], box))
 
     def add_word(self, word, box, confidence=0):
-        self.lines[-1].word_boxes.append(Box(word, box, confidence))
+        self.lines[-1].word_boxes.append(Box(
+            word, box, confidence, [] if self.needs_symbols else None
+        ))
+
+    def add_symbol(self, symbol, box, confidence=0):
+        self.lines[-1].word_boxes[-1].char_boxes.append(
+            Box(symbol, box, confidence)
+        )
+
+    def add_choices(self, choices):
+        self.lines[-1].word_boxes[-1].choices = choices
 
     def end_line(self):
         pass
@@ -700,6 +1183,128 @@ class DigitLineBoxBuilder(LineBoxBuilder):
     def __str__(self):
         return "Digit line boxes"
 
-    def __init__(self, tesseract_layout=1):
-        super(DigitLineBoxBuilder, self).__init__(tesseract_layout)
+    def __init__(self, tesseract_layout=1, char_boxes=False, choices=0):
+        super(DigitLineBoxBuilder, self).__init__(tesseract_layout,
+                                                  char_boxes, choices)
         self.tesseract_configs.append("digits")
+
+
+class PageBuilder(BaseBuilder):
+    """
+    If passed to image_to_string(), image_to_string() will return an array of
+    Block, in reading order. Each text Block contains a list of Paragraph,
+    each Paragraph a list of LineBox, each LineBox a list of word boxes.
+    Blocks, paragraphs and lines have a 'confidence' (mean confidence of
+    their words).
+
+    Libtesseract reports the blocks and paragraphs while walking the
+    recognized words. With Tesseract, they are read from the hOCR output
+    (ocr_carea, ocr_par). Cuneiform doesn't report them: all its lines are
+    put in a single paragraph of a single block.
+
+    With Libtesseract and char_boxes=True, the 'char_boxes' of each word
+    are the boxes of its characters, found by the same recognition. With
+    choices=N, the 'choices' of each word are the SymbolChoices giving at
+    most N alternatives for each of its characters.
+    """
+
+    needs_layout = True
+
+    def __init__(self, tesseract_layout=3, char_boxes=False, choices=0):
+        from .tesseract import psm_parameter
+        tess_flags = [psm_parameter(), str(tesseract_layout)]
+        file_ext = ["html", "hocr"]
+        tess_conf = ["hocr"]
+        cun_args = ["-f", "hocr"]
+        super(PageBuilder, self).__init__(file_ext, tess_flags, tess_conf,
+                                          cun_args)
+        self.blocks = []
+        self.tesseract_layout = tesseract_layout
+        self.needs_symbols = char_boxes
+        self.max_choices = choices
+
+    def read_file(self, file_descriptor):
+        """
+        Extract the blocks from the hOCR in 'file_descriptor'
+
+        Return:
+            An array of Block.
+        """
+        with instrumentation.span("builder.read_file"):
+            html_str = file_descriptor.read()
+            parser = _PageHTMLParser()
+            parser.feed(html_str)
+            blocks = parser.get_blocks()
+            if any([block.word_boxes for block in blocks]):
+                return blocks
+            # Cuneiform style
+            lines = _read_line_boxes(html_str)
+            if not lines:
+                return []
+            position = _union_position(line.position for line in lines)
+            (block_types, _) = _get_hocr_block_types()
+            return [Block(block_types["ocr_carea"],
+                          [Paragraph(lines, position)], position)]
+
+    @staticmethod
+    def write_file(file_descriptor, blocks):
+        """
+        Write blocks in a *very* *simplified* version of hOCR.
+
+        Warning:
+            The file_descriptor must support UTF-8 ! (see module 'codecs')
+        """
+        file_descriptor.write(_XHTML_HEADER)
+        file_descriptor.write("<body>\n")
+        for block in blocks:
+            file_descriptor.write(block.get_hocr() + "\n")
+        file_descriptor.write("</body>\n</html>\n")
+
+    def start_block(self, box, block_type):
+        self.blocks.append(Block(block_type, [], box))
+
+    def start_paragraph(self, box):
+        if not self.blocks:
+            (block_types, _) = _get_hocr_block_types()
+            self.start_block(box, block_types["ocr_carea"])
+        self.blocks[-1].paragraphs.append(Paragraph([], box))
+
+    def start_line(self, box):
+        if not self.blocks or not self.blocks[-1].paragraphs:
+            self.start_paragraph(box)
+        lines = self.blocks[-1].paragraphs[-1].line_boxes
+        # no empty line
+        if len(lines) > 0 and not lines[-1].word_boxes:
+            lines.pop()
+        lines.append(LineBox([], box))
+
+    def add_word(self, word, box, confidence=0):
+        self.blocks[-1].paragraphs[-1].line_boxes[-1].word_boxes.append(
+            Box(word, box, confidence, [] if self.needs_symbols else None)
+        )
+
+    def add_symbol(self, symbol, box, confidence=0):
+        line = self.blocks[-1].paragraphs[-1].line_boxes[-1]
+        line.word_boxes[-1].char_boxes.append(Box(symbol, box, confidence))
+
+    def add_choices(self, choices):
+        line = self.blocks[-1].paragraphs[-1].line_boxes[-1]
+        line.word_boxes[-1].choices = choices
+
+    def end_line(self):
+        pass
+
+    def get_output(self):
+        for block in self.blocks:
+            for paragraph in block.paragraphs:
+                if paragraph.line_boxes and \
+                        not paragraph.line_boxes[-1].word_boxes:
+                    paragraph.line_boxes.pop()
+            block.paragraphs = [
+                paragraph for paragraph in block.paragraphs
+                if paragraph.line_boxes
+            ]
+        return self.blocks
+
+    def __str__(self):
+        return "Page"
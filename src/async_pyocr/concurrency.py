@@ -0,0 +1,144 @@
+"""
+Limit on the number of OCR processes running at the same time.
+
+The coroutines of the shell tools (tesseract.image_to_string(),
+cuneiform.image_to_string(), ...) take a slot from the governor before
+spawning their process and give it back once the process has exited. When
+all the slots are taken, they wait for one to be released, in the order in
+which they asked for it. It prevents an application gathering many OCR calls
+from starting hundreds of processes competing for the same CPUs.
+
+The governor is shared by all the event loops of the process (thread-safe).
+By default, it allows as many processes as there are CPUs.
+
+USAGE:
+ > from pyocr import concurrency
+ > concurrency.set_max_processes(2)
+ > await asyncio.gather(*[tesseract.image_to_string(i) for i in images])
+"""
+
+import asyncio
+import collections
+import os
+import threading
+
+
+__all__ = [
+    'Governor',
+    'get_max_processes',
+    'set_max_processes',
+]
+
+
+class Governor(object):
+    """
+    Asynchronous counting semaphore usable from several event loops.
+
+    Arguments:
+        limit --- maximum number of slots taken at the same time (None means
+            no limit)
+    """
+
+    def __init__(self, limit=None):
+        if limit is not None and limit < 1:
+            raise ValueError("Invalid limit: {}".format(limit))
+        self._limit = limit
+        self._running = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @limit.setter
+    def limit(self, limit):
+        if limit is not None and limit < 1:
+            raise ValueError("Invalid limit: {}".format(limit))
+        with self._lock:
+            self._limit = limit
+            self._wake_up_waiters()
+
+    @property
+    def running(self):
+        """Number of slots currently taken"""
+        return self._running
+
+    def _has_free_slot(self):
+        return self._limit is None or self._running < self._limit
+
+    def _wake_up_waiters(self):
+        # called with the lock held: hands over the free slots to the
+        # waiters
+        while self._waiters and self._has_free_slot():
+            (loop, future) = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._set_result, future)
+            except RuntimeError:
+                # the event loop of the waiter has been closed
+                continue
+            self._running += 1
+
+    def _set_result(self, future):
+        if future.done():
+            # the waiter has been cancelled in the meantime
+            self.release()
+            return
+        future.set_result(None)
+
+    async def acquire(self):
+        with self._lock:
+            if not self._waiters and self._has_free_slot():
+                self._running += 1
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, future))
+                except ValueError:
+                    pass
+            if future.done() and not future.cancelled():
+                # the slot was handed over before the cancellation
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self._running -= 1
+            self._wake_up_waiters()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+governor = Governor(os.cpu_count())
+
+
+def get_max_processes():
+    """
+    Returns the maximum number of OCR processes allowed to run at the same
+    time (None means no limit).
+    """
+    return governor.limit
+
+
+def set_max_processes(limit):
+    """
+    Changes the maximum number of OCR processes allowed to run at the same
+    time. Calls already waiting for a slot are woken up if the new limit
+    allows it.
+
+    Arguments:
+        limit --- a strictly positive integer, or None for no limit
+    """
+    governor.limit = limit
@@ -4,8 +4,8 @@ cuneiform.py is a wrapper for Cuneiform
 USAGE:
  > from PIL import Image
  > from pyocr.cuneiform import image_to_string
- > print image_to_string(Image.open('test.png'))
- > print image_to_string(Image.open('test-european.jpg'), lang='fra')
+ > print(await image_to_string(Image.open('test.png')))
+ > print(await image_to_string(Image.open('test-european.jpg'), lang='fra'))
 
 COPYRIGHT:
 PyOCR is released under the GPL v3.
@@ -14,15 +14,20 @@ Copyright (c) Jerome Flesch, 2011-2016
 https://gitlab.gnome.org/World/OpenPaperwork/pyocr#readme
 '''
 
-import codecs
+import asyncio
 from io import BytesIO
+from io import StringIO
+import os
 import re
 import shutil
 import subprocess
 import tempfile
 
 from . import builders
+from . import concurrency
+from . import presets
 from .error import CuneiformError
+from .util import to_pil
 
 
 # CHANGE THIS IF CUNEIFORM IS NOT IN YOUR PATH, OR IS NAMED DIFFERENTLY
@@ -37,6 +42,11 @@ LANGUAGES_LINE_PREFIX = "Supported languages: "
 LANGUAGES_SPLIT_RE = re.compile("[^a-z]")
 VERSION_LINE_RE = re.compile(r"Cuneiform for \w+ (\d+).(\d+).(\d+)")
 
+# Cuneiform writes its output in an anonymous file in memory when possible
+g_memfd_supported = (
+    hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+)
+
 __all__ = [
     'can_detect_orientation',
     'get_available_builders',
@@ -62,6 +72,7 @@ def get_available_builders():
         builders.TextBuilder,
         builders.WordBoxBuilder,
         builders.LineBoxBuilder,
+        builders.PageBuilder,
     ]
 
 
@@ -70,41 +81,116 @@ def temp_file(suffix):
     return tempfile.NamedTemporaryFile(prefix='cuneiform_', suffix=suffix)
 
 
-def image_to_string(image, lang=None, builder=None):
+class _MemoryOutput(object):
+    """
+    Output file of Cuneiform kept in memory: an anonymous file (memfd)
+    inherited by Cuneiform and opened through /proc/self/fd/.
+    """
+
+    def __init__(self, suffix):
+        self.fd = os.memfd_create("cuneiform_output" + suffix)
+        self.name = "/proc/self/fd/{}".format(self.fd)
+        self.pass_fds = (self.fd,)
+
+    def read(self):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self.fd, 65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        os.close(self.fd)
+        return False
+
+
+class _FileOutput(object):
+    """
+    Output file of Cuneiform on disk, for the systems without memfd.
+    """
+
+    def __init__(self, suffix):
+        self.file = temp_file(suffix)
+        self.name = self.file.name
+        self.pass_fds = ()
+
+    def read(self):
+        with open(self.name, 'rb') as file_desc:
+            return file_desc.read()
+
+    def __enter__(self):
+        self.file.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.file.__exit__(exc_type, exc_value, traceback)
+
+
+def output_file(suffix):
+    '''
+    Returns the file in which Cuneiform must write its output: a context
+    manager providing `name` (to give to Cuneiform), `pass_fds` (file
+    descriptors Cuneiform must inherit) and `read()`.
+    '''
+    if g_memfd_supported:
+        return _MemoryOutput(suffix)
+    return _FileOutput(suffix)
+
+
+async def image_to_string(image, lang=None, builder=None, preset=None):
+    """
+    Runs Cuneiform on the given image. Coroutine.
+
+    `preset` is accepted for compatibility with the other tools (see module
+    presets), but Cuneiform has no equivalent settings: it is ignored.
+
+    The image is written to the standard input of Cuneiform while its output
+    is read, so large images can't fill the pipes and block both processes.
+    At most concurrency.get_max_processes() OCR processes run at the same
+    time (see tesseract.run_tesseract()).
+    """
     if builder is None:
         builder = builders.TextBuilder()
+    presets.get_preset(preset)  # raises ValueError if unknown
     if "digits" in builder.tesseract_configs:
         raise NotImplementedError(
             "Numerical only : This option is not available with Cuneiform"
         )
-    with temp_file(builder.file_extensions[0]) as output_file:
+    with output_file(builder.file_extensions[0]) as output:
         cmd = [CUNEIFORM_CMD]
         if lang is not None:
             cmd += ["-l", lang]
         cmd += builder.cuneiform_args
-        cmd += ["-o", output_file.name]
+        cmd += ["-o", output.name]
         cmd += ["-"]  # stdin
 
+        image = to_pil(image)
         if image.mode != "RGB":
             image = image.convert("RGB")
 
         img_data = BytesIO()
         image.save(img_data, format="BMP")
 
-        proc = subprocess.Popen(cmd,
-                                stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-        proc.stdin.write(img_data.getvalue())
-        proc.stdin.close()
-        output = proc.stdout.read().decode('utf-8')
-        retcode = proc.wait()
+        async with concurrency.governor:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                pass_fds=output.pass_fds
+            )
+            (output_msg, _) = await proc.communicate(img_data.getvalue())
+        output_msg = output_msg.decode('utf-8')
+        retcode = proc.returncode
         if retcode:
-            raise CuneiformError(retcode, output)
-        with codecs.open(output_file.name, 'r', encoding='utf-8',
-                         errors='replace') as file_desc:
-            results = builder.read_file(file_desc)
-        return results
+            raise CuneiformError(retcode, output_msg)
+        results = output.read().decode('utf-8', errors='replace')
+    return builder.read_file(StringIO(results))
 
 
 def is_available():
@@ -13,6 +13,18 @@ class TesseractError(PyocrException):
         self.args = (status, message)
 
 
+class TesseractTimeoutError(TesseractError):
+    """
+    Tesseract didn't finish within the time allowed: it has been stopped.
+    """
+    def __init__(self, timeout, command):
+        TesseractError.__init__(
+            self, "timeout",
+            "Tesseract didn't finish within {} s: {}".format(timeout, command)
+        )
+        self.timeout = timeout
+
+
 class CuneiformError(PyocrException):
     def __init__(self, status, message):
         PyocrException.__init__(self, message)
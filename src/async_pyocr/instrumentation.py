@@ -0,0 +1,139 @@
+"""
+Per-stage timing of the OCR calls.
+
+The OCR tools report how long each stage of a call took (image encoding,
+process spawning, model loading, recognition, output parsing, ...) to the
+registered observers. An observer is a callable taking 2 arguments: the
+name of the stage (see STAGES) and its duration in seconds. Observers may be
+called from any thread, and must be fast: they run in the OCR call.
+
+When no observer is registered, span() returns a shared no-op context
+manager: the instrumentation costs one function call per stage.
+
+USAGE:
+ > from pyocr import instrumentation
+ > durations = collections.defaultdict(list)
+ > def observer(stage, duration):
+ >     durations[stage].append(duration)
+ > with instrumentation.observe(observer):
+ >     await tesseract.image_to_string(image)
+"""
+
+import contextlib
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'STAGES',
+    'add_observer',
+    'observe',
+    'remove_observer',
+    'span',
+]
+
+STAGES = {
+    "tesseract.image_to_string": "whole call to tesseract.image_to_string()",
+    "tesseract.temp_dir": "creation of the temporary directory",
+    "tesseract.encode_image": "conversion of the image to BMP on disk",
+    "tesseract.spawn": "start of the tesseract process",
+    "tesseract.process": "run of the tesseract process until it exits",
+    "tesseract.read_output": "reading and parsing of the output file",
+    "tesseract.triage": "low resolution recognition deciding to skip a page",
+    "libtesseract.image_to_string":
+        "whole call to libtesseract.image_to_string()",
+    "libtesseract.init": "creation of a Tesseract handle (model loading)",
+    "libtesseract.set_image": "transfer of the pixels to Tesseract",
+    "libtesseract.recognize": "recognition",
+    "libtesseract.analyse_layout":
+        "layout analysis (page segmentation, without recognition)",
+    "libtesseract.triage":
+        "layout analysis or low resolution recognition deciding to skip a "
+        "page",
+    "builder.read_file": "parsing of the output of an OCR tool",
+    "preprocessing.grayscale": "conversion of the image to grayscale",
+    "preprocessing.binarize": "binarization of the image",
+    "preprocessing.normalize_dpi": "rescaling of the image to a resolution",
+    "preprocessing.deskew":
+        "layout analysis finding the skew, and rotation of the image",
+    "scaling.resize": "resampling of the image to the target resolution",
+}
+
+_observers = []
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+        for observer in list(_observers):
+            try:
+                observer(self.stage, duration)
+            except Exception:
+                logger.exception("Instrumentation observer %r failed",
+                                 observer)
+        return False
+
+
+def span(stage):
+    """
+    Returns a context manager measuring the time spent in its block and
+    reporting it to the observers as `stage`.
+    """
+    if not _observers:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+def add_observer(observer):
+    """
+    Register `observer`. It will be called as `observer(stage, duration)`
+    at the end of each stage of each OCR call.
+    """
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    """
+    Unregister `observer`.
+
+    Raises:
+        ValueError --- `observer` was not registered
+    """
+    _observers.remove(observer)
+
+
+@contextlib.contextmanager
+def observe(observer):
+    """
+    Register `observer` for the duration of the block.
+    """
+    add_observer(observer)
+    try:
+        yield observer
+    finally:
+        remove_observer(observer)
@@ -13,23 +13,38 @@ PyOCR is released under the GPL v3.
 Copyright (c) Jerome Flesch, 2011-2016
 https://gitlab.gnome.org/World/OpenPaperwork/pyocr#readme
 '''
+import logging
+
 from os import devnull
+from PIL import Image
 from .. import builders
+from .. import instrumentation
+from .. import presets
+from .. import scaling
+from .. import tesseract
+from .. import transport
 from . import tesseract_raw
 from ..error import TesseractError
 from ..util import digits_only
 
-import logging
+
 logger = logging.getLogger(__name__)
 
+# (library, version): see _get_cached_version()
+g_version = None
 
 __all__ = [
+    'analyse_layout',
+    'analyse_layout_file',
     'can_detect_orientation',
     'detect_orientation',
+    'detect_orientation_file',
     'get_available_builders',
     'get_available_languages',
+    'get_deskew_angle',
     'get_name',
     'get_version',
+    'image_file_to_string',
     'image_to_string',
     'is_available',
     'TesseractError',
@@ -50,7 +65,7 @@ def detect_orientation(image, lang=None):
         tesseract_raw.set_page_seg_mode(
             handle, tesseract_raw.PageSegMode.OSD_ONLY
         )
-        tesseract_raw.set_image(handle, image)
+        _set_image(handle, image)
         os = tesseract_raw.detect_os(handle)
         if os['confidence'] <= 0:
             raise TesseractError(
@@ -70,6 +85,28 @@ def detect_orientation(image, lang=None):
         tesseract_raw.cleanup(handle)
 
 
+def _open_image_file(path):
+    """
+    Returns the content of the image file `path`: its pixels memory-mapped
+    (transport.ImageView) if the file format allows it, or the decoded
+    Pillow image otherwise. The caller must close it.
+    """
+    descriptor = transport.describe_image_file(path)
+    if descriptor is not None:
+        return transport.open_image(descriptor)
+    return Image.open(path)
+
+
+def detect_orientation_file(path, lang=None):
+    """
+    Same as detect_orientation(), but on an image file. Pixels of binary
+    PGM/PPM and uncompressed TIFF files are memory-mapped instead of being
+    decoded.
+    """
+    with _open_image_file(path) as image:
+        return detect_orientation(image, lang=lang)
+
+
 def get_name():
     return "Tesseract (C-API)"
 
@@ -81,6 +118,8 @@ def get_available_builders():
         builders.DigitBuilder,
         builders.LineBoxBuilder,
         builders.DigitLineBoxBuilder,
+        builders.PageBuilder,
+        tesseract.CharBoxBuilder,
     ]
 
 
@@ -91,88 +130,489 @@ def _tess_box_to_pyocr_box(box):
     )
 
 
-def image_to_string(image, lang=None, builder=None):
-    if builder is None:
-        builder = builders.TextBuilder()
-    handle = tesseract_raw.init(lang=lang)
+def _set_image(handle, image):
+    if isinstance(image, Image.Image):
+        tesseract_raw.set_image(handle, image)
+    else:
+        # raw pixels: transport.ImageView or preprocessing.Raster
+        tesseract_raw.set_image_buffer(
+            handle, image.buf, image.width, image.height,
+            image.bytes_per_pixel, image.bytes_per_line, image.dpi
+        )
+
+
+def _set_image_height(builder, image):
+    # tesseract.CharBoxBuilder converts the boxes to the coordinates of the
+    # box files (origin at the bottom left), like the tesseract command
+    if hasattr(builder, "image_height"):
+        builder.image_height = image.height
+
+
+def _check_languages(handle, lang):
+    # XXX(Jflesch): Issue #51:
+    # Tesseract TessBaseAPIRecognize() may segfault when the target
+    # language is not available
+    clang = lang if lang else "eng"
+    for lang_item in clang.split("+"):
+        if lang_item not in tesseract_raw.get_available_languages(handle):
+            raise TesseractError(
+                "no lang",
+                "language {} is not available".format(lang_item)
+            )
 
-    lvl_line = tesseract_raw.PageIteratorLevel.TEXTLINE
-    lvl_word = tesseract_raw.PageIteratorLevel.WORD
 
+def _read_choices(res_iterator, choices, symbol_idx, max_choices):
+    """
+    Append at most `max_choices` alternatives of the current character to
+    `choices` (builders.SymbolChoices).
+    """
+    choice_iterator = tesseract_raw.result_iterator_get_choice_iterator(
+        res_iterator
+    )
+    if choice_iterator is None:
+        return
     try:
-        # XXX(Jflesch): Issue #51:
-        # Tesseract TessBaseAPIRecognize() may segfault when the target
-        # language is not available
-        clang = lang if lang else "eng"
-        for lang_item in clang.split("+"):
-            if lang_item not in tesseract_raw.get_available_languages(handle):
-                raise TesseractError(
-                    "no lang",
-                    "language {} is not available".format(lang_item)
+        for _ in range(max_choices):
+            text = tesseract_raw.choice_iterator_get_utf8_text(
+                choice_iterator
+            )
+            if text is not None:
+                choices.append(
+                    symbol_idx, text,
+                    tesseract_raw.choice_iterator_get_confidence(
+                        choice_iterator
+                    )
                 )
+            if not tesseract_raw.choice_iterator_next(choice_iterator):
+                break
+    finally:
+        tesseract_raw.choice_iterator_delete(choice_iterator)
 
-        tesseract_raw.set_page_seg_mode(
-            handle, builder.tesseract_layout
-        )
-        tesseract_raw.set_debug_file(handle, devnull)
 
-        tesseract_raw.set_image(handle, image)
-        if "digits" in builder.tesseract_configs:
-            tesseract_raw.set_is_numeric(handle, True)
-        # XXX(JFlesch): PageIterator and ResultIterator are actually the
-        # very same thing. If it changes, we are screwed.
-        tesseract_raw.recognize(handle)
-        res_iterator = tesseract_raw.get_iterator(handle)
-        if res_iterator is None:
-            raise TesseractError(
-                "no script", "no script detected"
+def _read_symbols(res_iterator, page_iterator, builder):
+    """
+    Feed the characters of the current word, and their alternatives, to
+    `builder`. Leaves the iterator on the last character of the word: the
+    next call to page_iterator_next(WORD) goes to the next word.
+    """
+    lvl_word = tesseract_raw.PageIteratorLevel.WORD
+    lvl_symbol = tesseract_raw.PageIteratorLevel.SYMBOL
+    symbols = getattr(builder, "needs_symbols", False)
+    max_choices = getattr(builder, "max_choices", 0)
+    choices = builders.SymbolChoices() if max_choices > 0 else None
+    symbol_idx = 0
+
+    while True:
+        symbol = tesseract_raw.result_iterator_get_utf8_text(
+            res_iterator, lvl_symbol
+        )
+        confidence = tesseract_raw.result_iterator_get_confidence(
+            res_iterator, lvl_symbol
+        )
+        if symbol is not None and confidence is not None and symbol != "":
+            (r, box) = tesseract_raw.page_iterator_bounding_box(
+                page_iterator, lvl_symbol
             )
-        page_iterator = tesseract_raw.result_iterator_get_page_iterator(
-            res_iterator
+            if symbols and r:
+                builder.add_symbol(symbol, _tess_box_to_pyocr_box(box),
+                                   confidence)
+            if choices is not None:
+                _read_choices(res_iterator, choices, symbol_idx,
+                              max_choices)
+            symbol_idx += 1
+        if tesseract_raw.page_iterator_is_at_final_element(
+                page_iterator, lvl_word, lvl_symbol):
+            break
+        if not tesseract_raw.page_iterator_next(page_iterator, lvl_symbol):
+            break
+    if choices is not None:
+        builder.add_choices(choices)
+
+
+def _read_results(handle, builder):
+    """
+    Feed the results of the last recognition run on `handle` to `builder`.
+    """
+    lvl_block = tesseract_raw.PageIteratorLevel.BLOCK
+    lvl_para = tesseract_raw.PageIteratorLevel.PARA
+    lvl_line = tesseract_raw.PageIteratorLevel.TEXTLINE
+    lvl_word = tesseract_raw.PageIteratorLevel.WORD
+    layout = getattr(builder, "needs_layout", False)
+    symbols = (getattr(builder, "needs_symbols", False) or
+               getattr(builder, "max_choices", 0) > 0)
+
+    # XXX(JFlesch): PageIterator and ResultIterator are actually the
+    # very same thing. If it changes, we are screwed.
+    res_iterator = tesseract_raw.get_iterator(handle)
+    if res_iterator is None:
+        raise TesseractError(
+            "no script", "no script detected"
         )
+    page_iterator = tesseract_raw.result_iterator_get_page_iterator(
+        res_iterator
+    )
 
-        while True:
-            if tesseract_raw.page_iterator_is_at_beginning_of(
-                    page_iterator, lvl_line):
+    while True:
+        if tesseract_raw.page_iterator_is_at_beginning_of(
+                page_iterator, lvl_line):
+            # blocks and paragraphs always start with a line
+            if layout and tesseract_raw.page_iterator_is_at_beginning_of(
+                    page_iterator, lvl_block):
                 (r, box) = tesseract_raw.page_iterator_bounding_box(
-                    page_iterator, lvl_line
+                    page_iterator, lvl_block
                 )
                 assert(r)
-                box = _tess_box_to_pyocr_box(box)
-                builder.start_line(box)
-
-            last_word_in_line = (
-                tesseract_raw.page_iterator_is_at_final_element(
-                    page_iterator, lvl_line, lvl_word
+                builder.start_block(
+                    _tess_box_to_pyocr_box(box),
+                    tesseract_raw.page_iterator_block_type(page_iterator)
+                )
+            if layout and tesseract_raw.page_iterator_is_at_beginning_of(
+                    page_iterator, lvl_para):
+                (r, box) = tesseract_raw.page_iterator_bounding_box(
+                    page_iterator, lvl_para
                 )
+                assert(r)
+                builder.start_paragraph(_tess_box_to_pyocr_box(box))
+            (r, box) = tesseract_raw.page_iterator_bounding_box(
+                page_iterator, lvl_line
             )
+            assert(r)
+            box = _tess_box_to_pyocr_box(box)
+            builder.start_line(box)
 
-            word = tesseract_raw.result_iterator_get_utf8_text(
-                res_iterator, lvl_word
+        last_word_in_line = (
+            tesseract_raw.page_iterator_is_at_final_element(
+                page_iterator, lvl_line, lvl_word
             )
+        )
 
-            confidence = tesseract_raw.result_iterator_get_confidence(
-                res_iterator, lvl_word
+        word = tesseract_raw.result_iterator_get_utf8_text(
+            res_iterator, lvl_word
+        )
+
+        confidence = tesseract_raw.result_iterator_get_confidence(
+            res_iterator, lvl_word
+        )
+
+        if word is not None and confidence is not None and word != "":
+            (r, box) = tesseract_raw.page_iterator_bounding_box(
+                page_iterator, lvl_word
             )
+            assert(r)
+            box = _tess_box_to_pyocr_box(box)
+            builder.add_word(word, box, confidence)
+            if symbols:
+                _read_symbols(res_iterator, page_iterator, builder)
+
+            if last_word_in_line:
+                builder.end_line()
+
+        if not tesseract_raw.page_iterator_next(page_iterator, lvl_word):
+            break
+
+
+def _image_to_string(handle, image, lang, builder):
+    """
+    Run the recognition of `image` on an already initialized `handle` and
+    feed the results to `builder`.
+    """
+    _check_languages(handle, lang)
 
-            if word is not None and confidence is not None and word != "":
+    tesseract_raw.set_page_seg_mode(
+        handle, builder.tesseract_layout
+    )
+    tesseract_raw.set_debug_file(handle, devnull)
+
+    _set_image(handle, image)
+    _set_image_height(builder, image)
+    if "digits" in builder.tesseract_configs:
+        tesseract_raw.set_is_numeric(handle, True)
+    tesseract_raw.recognize(handle)
+    _read_results(handle, builder)
+
+
+class _WordBoxes(object):
+    """
+    Keeps the word boxes given by _read_results() (unlike
+    builders.WordBoxBuilder, creating it doesn't run Tesseract).
+    """
+
+    def __init__(self):
+        self.word_boxes = []
+
+    def start_line(self, box):
+        pass
+
+    def add_word(self, word, box, confidence=0):
+        self.word_boxes.append(builders.Box(word, box, confidence))
+
+    def end_line(self):
+        pass
+
+
+def _triage_layout(blocks, triage):
+    """
+    Returns the reason to skip the recognition of an image according to
+    its layout (`blocks`), or None.
+    """
+    if not triage.layout:
+        return None
+    with instrumentation.span("libtesseract.triage"):
+        return triage.check_blocks(blocks)
+
+
+def _rescale(image, rescale, blocks):
+    """
+    Returns `image` resized according to `rescale` (scaling.Rescale), or
+    `image` itself.
+    """
+    scale = rescale.get_scale(image, blocks)
+    if scale == 1.0:
+        return image
+    return rescale.resize(image, scale)
+
+
+def _triage_words(handle, image, lang, triage):
+    """
+    Returns the reason to skip the recognition of `image` according to the
+    words found on a low resolution copy, or None.
+    """
+    if triage.min_confidence is None:
+        return None
+    with instrumentation.span("libtesseract.triage"):
+        _check_languages(handle, lang)
+        tesseract_raw.set_page_seg_mode(handle,
+                                        tesseract_raw.PageSegMode.AUTO)
+        tesseract_raw.set_debug_file(handle, devnull)
+        _set_image(handle, triage.get_image(image))
+        tesseract_raw.recognize(handle)
+        word_boxes = _WordBoxes()
+        try:
+            _read_results(handle, word_boxes)
+        except TesseractError as exc:
+            if exc.status != "no script":
+                raise
+        return triage.check_words(word_boxes.word_boxes)
+
+
+def _engine_config(oem, variables, preset):
+    """
+    Returns the keyword arguments of tesseract_raw.init() selecting the
+    engine mode, variables and models.
+    """
+    preset = presets.get_preset(preset)
+    datapath = None
+    if preset is not None:
+        (oem, variables) = preset.get_engine_config(_get_cached_version(),
+                                                    oem, variables)
+        datapath = preset.tessdata_dir
+    return {"oem": oem, "variables": variables, "datapath": datapath}
+
+
+def image_to_string(image, lang=None, builder=None, oem=None,
+                    variables=None, preset=None, triage=None, rescale=None):
+    """
+    Arguments:
+        image --- Pillow image, transport.ImageView (pixels shared by
+            another process) or preprocessing.Raster. The pixels of
+            ImageView and Raster are given to Tesseract without copy
+        lang --- Tesseract language to use
+        builder --- builder used to format the output (default: TextBuilder)
+        oem --- OCR engine mode (see tesseract_raw.OcrEngineMode). None
+            means the Tesseract default
+        variables --- dict of Tesseract variables (name --> value) set on
+            the handle, for instance {"load_system_dawg": False}
+        preset --- name of a speed / accuracy preset ("fast", "balanced",
+            "accurate"; see module presets). `oem` and `variables` override
+            the settings of the preset.
+        triage --- triage.Triage: cheap first pass skipping the
+            recognition of pages without text (see module triage). The
+            reason of a skip is stored in builder.skip_reason
+        rescale --- scaling.Rescale: resampling of the image to the
+            resolution (or the height of lines) Tesseract works best at.
+            The positions of the boxes are mapped back to `image`
+    """
+    if builder is None:
+        builder = builders.TextBuilder()
+    engine_config = _engine_config(oem, variables, preset)
+    with instrumentation.span("libtesseract.image_to_string"):
+        blocks = None
+        if ((triage is not None and triage.layout) or
+                (rescale is not None and rescale.line_height is not None)):
+            # before loading the models: blank pages cost nothing more
+            blocks = analyse_layout(image)
+        if triage is not None:
+            builder.skip_reason = _triage_layout(blocks, triage)
+            if builder.skip_reason is not None:
+                return builder.get_output()
+        original_size = image.size
+        if rescale is not None:
+            image = _rescale(image, rescale, blocks)
+        handle = tesseract_raw.init(lang=lang, **engine_config)
+        try:
+            if triage is not None:
+                builder.skip_reason = _triage_words(handle, image, lang,
+                                                    triage)
+                if builder.skip_reason is not None:
+                    return builder.get_output()
+            _image_to_string(handle, image, lang, builder)
+        finally:
+            tesseract_raw.cleanup(handle)
+
+        return scaling.map_output(builder.get_output(), original_size,
+                                  image.size)
+
+
+def image_file_to_string(path, lang=None, builder=None, oem=None,
+                         variables=None, preset=None, triage=None,
+                         rescale=None):
+    """
+    Same as image_to_string(), but on an image file. Pixels of binary
+    PGM/PPM and uncompressed TIFF files are memory-mapped and given as-is
+    to Tesseract instead of being decoded. Other formats are decoded with
+    Pillow.
+    """
+    with _open_image_file(path) as image:
+        return image_to_string(image, lang=lang, builder=builder, oem=oem,
+                               variables=variables, preset=preset,
+                               triage=triage, rescale=rescale)
+
+
+def _analyse_layout(handle, image):
+    lvl_block = tesseract_raw.PageIteratorLevel.BLOCK
+    lvl_para = tesseract_raw.PageIteratorLevel.PARA
+    lvl_line = tesseract_raw.PageIteratorLevel.TEXTLINE
+
+    tesseract_raw.set_page_seg_mode(
+        handle, tesseract_raw.PageSegMode.AUTO_ONLY
+    )
+    _set_image(handle, image)
+    iterator = tesseract_raw.analyse_layout(handle)
+    if iterator is None:
+        return []
+
+    blocks = []
+    block = None
+    try:
+        while True:
+            if tesseract_raw.page_iterator_is_at_beginning_of(
+                    iterator, lvl_block):
                 (r, box) = tesseract_raw.page_iterator_bounding_box(
-                    page_iterator, lvl_word
+                    iterator, lvl_block
                 )
                 assert(r)
-                box = _tess_box_to_pyocr_box(box)
-                builder.add_word(word, box, confidence)
-
-                if last_word_in_line:
-                    builder.end_line()
-
-            if not tesseract_raw.page_iterator_next(page_iterator, lvl_word):
+                block = builders.Block(
+                    tesseract_raw.page_iterator_block_type(iterator), [],
+                    _tess_box_to_pyocr_box(box)
+                )
+                blocks.append(block)
+            elif block is None:
+                # empty page
                 break
+            if block.block_type in tesseract_raw.TEXT_BLOCK_TYPES:
+                if tesseract_raw.page_iterator_is_at_beginning_of(
+                        iterator, lvl_para):
+                    (r, box) = tesseract_raw.page_iterator_bounding_box(
+                        iterator, lvl_para
+                    )
+                    assert(r)
+                    block.paragraphs.append(
+                        builders.Paragraph([], _tess_box_to_pyocr_box(box))
+                    )
+                (r, box) = tesseract_raw.page_iterator_bounding_box(
+                    iterator, lvl_line
+                )
+                if r:
+                    block.paragraphs[-1].line_boxes.append(
+                        builders.LineBox([], _tess_box_to_pyocr_box(box))
+                    )
+            if not tesseract_raw.page_iterator_next(iterator, lvl_line):
+                break
+    finally:
+        tesseract_raw.page_iterator_delete(iterator)
+    return blocks
+
+
+def analyse_layout(image, handles=None):
+    """
+    Analyses the layout of `image` without recognizing its text: finds its
+    blocks (columns of text, headings, images, tables, separators, ...) and
+    the paragraphs and lines of its text blocks. No language model is
+    loaded, so it is much faster than image_to_string().
+
+    Arguments:
+        image --- Pillow image, transport.ImageView or
+            preprocessing.Raster
+        handles --- parallel.HandlePool providing the Tesseract handle
+            (default: a handle created and deleted by this call)
+
+    Returns:
+        The list of the blocks (builders.Block) in reading order. The
+        lines (builders.LineBox) have no words.
+    """
+    if handles is not None:
+        with handles.layout_handle() as handle:
+            return _analyse_layout(handle, image)
+    handle = tesseract_raw.init_for_layout()
+    try:
+        return _analyse_layout(handle, image)
+    finally:
+        tesseract_raw.cleanup(handle)
 
+
+def _get_deskew_angle(handle, image):
+    tesseract_raw.set_page_seg_mode(
+        handle, tesseract_raw.PageSegMode.AUTO_ONLY
+    )
+    _set_image(handle, image)
+    iterator = tesseract_raw.analyse_layout(handle)
+    if iterator is None:
+        return 0.0
+    try:
+        if not tesseract_raw.page_iterator_is_at_beginning_of(
+                iterator, tesseract_raw.PageIteratorLevel.BLOCK):
+            # empty page
+            return 0.0
+        return tesseract_raw.page_iterator_orientation(
+            iterator
+        )["deskew_angle"]
+    finally:
+        tesseract_raw.page_iterator_delete(iterator)
+
+
+def get_deskew_angle(image, handles=None):
+    """
+    Finds the skew of the text of `image` with the layout analysis (no
+    language model is loaded).
+
+    Arguments:
+        image --- Pillow image, transport.ImageView or
+            preprocessing.Raster
+        handles --- parallel.HandlePool providing the Tesseract handle
+            (default: a handle created and deleted by this call)
+
+    Returns:
+        The angle (in radians, between -pi/4 and pi/4) by which the image
+        must be rotated anti-clockwise to make its lines of text
+        horizontal (0.0 if no text block is found).
+    """
+    if handles is not None:
+        with handles.layout_handle() as handle:
+            return _get_deskew_angle(handle, image)
+    handle = tesseract_raw.init_for_layout()
+    try:
+        return _get_deskew_angle(handle, image)
     finally:
         tesseract_raw.cleanup(handle)
 
-    return builder.get_output()
+
+def analyse_layout_file(path, handles=None):
+    """
+    Same as analyse_layout(), but on an image file (see
+    image_file_to_string()).
+    """
+    with _open_image_file(path) as image:
+        return analyse_layout(image, handles=handles)
 
 
 def image_to_pdf(image, output_file, lang=None, input_file="stdin",
@@ -245,6 +685,24 @@ def get_available_languages():
         tesseract_raw.cleanup(handle)
 
 
+def _get_cached_version():
+    """
+    Same as get_version(), but the version is cached until another library
+    is loaded or the tools are looked for again
+    (pyocr.get_available_tools(refresh=True)).
+    """
+    global g_version
+    if g_version is None or g_version[0] is not tesseract_raw.g_libtesseract:
+        version = get_version()
+        g_version = (tesseract_raw.g_libtesseract, version)
+    return g_version[1]
+
+
+def _clear_version_cache():
+    global g_version
+    g_version = None
+
+
 def get_version():
     version = tesseract_raw.get_version()
     version = version.split(" ", 1)[0]
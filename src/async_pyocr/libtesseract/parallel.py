@@ -0,0 +1,311 @@
+'''
+Recognizes the text blocks of a page in parallel.
+
+libtesseract.image_to_string() recognizes a page on a single CPU core. The
+functions of this module split the page instead:
+
+- the layout of the page is analysed once (libtesseract.analyse_layout(),
+  no recognition), giving its text blocks in reading order;
+- each block is recognized in a thread, on its own Tesseract handle, by
+  restricting the recognition to the block (TessBaseAPISetRectangle()).
+  ctypes releases the GIL while Tesseract runs, so the blocks are
+  recognized on several cores at the same time. A Pillow image is
+  converted to raw pixels once, and these pixels are given to each handle;
+- the results are given to the builder block by block, in the order of the
+  layout analysis. Tesseract reports the boxes of the words and lines in
+  the coordinates of the whole image, so they need no translation.
+
+Only the builders working on lines and words (TextBuilder, WordBoxBuilder,
+LineBoxBuilder, ...) are supported. Pages with a single text block are
+recognized as usual.
+
+The handles are kept in a HandlePool. Give the same HandlePool to
+successive calls to load the models only once.
+
+USAGE:
+ > from PIL import Image
+ > from pyocr.libtesseract import parallel
+ > with parallel.HandlePool() as handles:
+ >     for path in paths:
+ >         print(parallel.image_to_string(Image.open(path), lang='fra',
+ >                                        handles=handles))
+'''
+
+import concurrent.futures
+import contextlib
+import logging
+import os
+import threading
+
+from PIL import Image
+
+from .. import builders
+from .. import instrumentation
+from .. import transport
+from ..error import TesseractError
+from . import _check_languages
+from . import _engine_config
+from . import analyse_layout
+from . import _image_to_string
+from . import _read_results
+from . import _set_image
+from . import _set_image_height
+from . import tesseract_raw
+from .pool import _handle_key
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'HandlePool',
+    'image_to_string',
+]
+
+
+class HandlePool(object):
+    """
+    Thread-safe pool of initialized Tesseract handles, one set of handles
+    per language and engine configuration. Handles are created on demand
+    and kept until the pool is closed.
+    """
+
+    # key of the handles initialized for the layout analysis only
+    _LAYOUT_KEY = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._closed = False
+
+    def handle(self, lang=None, engine_config=None):
+        """
+        Context manager giving a handle initialized for `lang` and
+        `engine_config` (keyword arguments of tesseract_raw.init()) to the
+        caller only. The handle goes back to the pool at the end of the
+        block, or is deleted if the block raised an exception.
+        """
+        if engine_config is None:
+            engine_config = {"oem": None, "variables": None,
+                             "datapath": None}
+        return self._handle(
+            _handle_key(lang, engine_config),
+            lambda: tesseract_raw.init(lang=lang, **engine_config)
+        )
+
+    def layout_handle(self):
+        """
+        Same as handle(), but the handle is only usable for the layout
+        analysis (see tesseract_raw.init_for_layout()).
+        """
+        return self._handle(self._LAYOUT_KEY, tesseract_raw.init_for_layout)
+
+    @contextlib.contextmanager
+    def _handle(self, key, init):
+        with self._lock:
+            if self._closed:
+                raise ValueError("HandlePool is closed")
+            idle = self._idle.get(key)
+            handle = idle.pop() if idle else None
+        if handle is None:
+            handle = init()
+        try:
+            yield handle
+        except BaseException:
+            # the state of the handle is unknown
+            tesseract_raw.cleanup(handle)
+            raise
+        with self._lock:
+            if not self._closed:
+                self._idle.setdefault(key, []).append(handle)
+                return
+        tesseract_raw.cleanup(handle)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            handles = [
+                handle for idle in self._idle.values() for handle in idle
+            ]
+            self._idle = {}
+        for handle in handles:
+            tesseract_raw.cleanup(handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _PagePixels(object):
+    """
+    Pixels of a Pillow image, converted once and given as-is to each handle
+    (same interface as transport.ImageView: see
+    tesseract_raw.set_image_buffer()). The buffer is a bytearray so that
+    ctypes doesn't copy it; nothing writes to it (Tesseract makes its own
+    copy).
+    """
+
+    def __init__(self, image):
+        (image, self.dpi) = transport._prepare_image(image)
+        self.mode = image.mode
+        self.size = image.size
+        self.buf = bytearray(image.tobytes())
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def bytes_per_pixel(self):
+        return transport.MODES[self.mode]
+
+    @property
+    def bytes_per_line(self):
+        return self.width * self.bytes_per_pixel
+
+
+def _page_pixels(image):
+    if isinstance(image, Image.Image):
+        return _PagePixels(image)
+    # transport.ImageView or preprocessing.Raster: already raw pixels
+    return image
+
+
+class _Recorder(object):
+    """
+    Keeps the calls of _read_results() to a builder, to replay them later
+    on the real builder.
+    """
+
+    def __init__(self, needs_layout, needs_symbols, max_choices):
+        self.needs_layout = needs_layout
+        self.needs_symbols = needs_symbols
+        self.max_choices = max_choices
+        self.calls = []
+
+    def start_block(self, box, block_type):
+        self.calls.append(("start_block", (box, block_type)))
+
+    def start_paragraph(self, box):
+        self.calls.append(("start_paragraph", (box,)))
+
+    def start_line(self, box):
+        self.calls.append(("start_line", (box,)))
+
+    def add_word(self, word, box, confidence=None):
+        self.calls.append(("add_word", (word, box, confidence)))
+
+    def add_symbol(self, symbol, box, confidence=None):
+        self.calls.append(("add_symbol", (symbol, box, confidence)))
+
+    def add_choices(self, choices):
+        self.calls.append(("add_choices", (choices,)))
+
+    def end_line(self):
+        self.calls.append(("end_line", ()))
+
+    def replay(self, builder):
+        for (method, args) in self.calls:
+            getattr(builder, method)(*args)
+
+
+def _recognize_block(handles, image, lang, engine_config, builder, block):
+    """
+    Recognize one block of `image` (raw pixels: see _page_pixels()) on a
+    handle of `handles`. The image is set again on each handle taken from
+    the pool: between two blocks, the handle may have been used by another
+    call sharing the pool.
+
+    Returns:
+        A _Recorder
+    """
+    ((left, top), (right, bottom)) = block.position
+    recorder = _Recorder(getattr(builder, "needs_layout", False),
+                         getattr(builder, "needs_symbols", False),
+                         getattr(builder, "max_choices", 0))
+    with handles.handle(lang, engine_config) as handle:
+        tesseract_raw.set_page_seg_mode(
+            handle, tesseract_raw.PageSegMode.SINGLE_BLOCK
+        )
+        tesseract_raw.set_debug_file(handle, os.devnull)
+        _set_image(handle, image)
+        tesseract_raw.set_rectangle(handle, left, top, right - left,
+                                    bottom - top)
+        digits = "digits" in builder.tesseract_configs
+        if digits:
+            tesseract_raw.set_is_numeric(handle, True)
+        try:
+            tesseract_raw.recognize(handle)
+            _read_results(handle, recorder)
+        except TesseractError as exc:
+            if exc.status != "no script":
+                raise
+            # nothing recognized in this block
+        finally:
+            if digits:
+                tesseract_raw.set_is_numeric(handle, False)
+    return recorder
+
+
+def image_to_string(image, lang=None, builder=None, oem=None,
+                    variables=None, preset=None, max_workers=None,
+                    handles=None):
+    """
+    Same as libtesseract.image_to_string(), but the text blocks of the page
+    are recognized in parallel.
+
+    Arguments:
+        max_workers --- maximum number of blocks recognized at the same
+            time (default: number of CPUs)
+        handles --- HandlePool providing the Tesseract handles (default: a
+            pool created and closed by this call)
+    """
+    if builder is None:
+        builder = builders.TextBuilder()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    engine_config = _engine_config(oem, variables, preset)
+
+    own_handles = handles is None
+    if own_handles:
+        handles = HandlePool()
+    try:
+        with instrumentation.span("libtesseract.image_to_string"):
+            # converted once, instead of once per block
+            image = _page_pixels(image)
+            with handles.handle(lang, engine_config) as handle:
+                _check_languages(handle, lang)
+            blocks = [
+                block for block in analyse_layout(image, handles=handles)
+                if block.block_type in tesseract_raw.TEXT_BLOCK_TYPES
+            ]
+            if len(blocks) <= 1:
+                with handles.handle(lang, engine_config) as handle:
+                    _image_to_string(handle, image, lang, builder)
+                    if "digits" in builder.tesseract_configs:
+                        tesseract_raw.set_is_numeric(handle, False)
+                return builder.get_output()
+
+            logger.debug("Recognizing %d blocks in parallel", len(blocks))
+            workers = min(max_workers, len(blocks))
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                futures = [
+                    executor.submit(
+                        _recognize_block, handles, image, lang,
+                        engine_config, builder, block
+                    )
+                    for block in blocks
+                ]
+                recorders = [future.result() for future in futures]
+            _set_image_height(builder, image)
+            for recorder in recorders:
+                recorder.replay(builder)
+            return builder.get_output()
+    finally:
+        if own_handles:
+            handles.close()
@@ -0,0 +1,243 @@
+'''
+Runs libtesseract in worker processes.
+
+libtesseract runs in the caller process: if Tesseract crashes (see for
+instance Issue #51, or the segfaults of Tesseract <= 3.02), it takes the
+whole process down with it. ProcessPool runs the recognition in separate
+worker processes instead:
+
+- each worker keeps its Tesseract handles initialized between jobs (one per
+  language and engine configuration), so models are loaded only once per
+  worker;
+- pixels are transferred through shared memory (see `transport`), not
+  pickled;
+- if a worker dies while running a job, it is restarted and the job is
+  retried once.
+
+USAGE:
+ > from PIL import Image
+ > from pyocr.libtesseract.pool import ProcessPool
+ > with ProcessPool(processes=4) as pool:
+ >     print(pool.image_to_string(Image.open('test.png'), lang='fra'))
+
+Requires Python >= 3.8.
+'''
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+from .. import builders
+from .. import transport
+from ..error import TesseractError
+from ..util import format_variable
+from . import tesseract_raw
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ProcessPool',
+]
+
+
+def _handle_key(lang, engine_config):
+    variables = engine_config["variables"]
+    if not variables:
+        variables = {}
+    return (lang, engine_config["oem"], engine_config["datapath"], tuple(
+        sorted((name, format_variable(value))
+               for (name, value) in variables.items())
+    ))
+
+
+def _run_job(handles, job):
+    """
+    Run one recognition job in a worker.
+
+    Arguments:
+        handles --- dict (lang, oem, datapath, variables) --> Tesseract
+            handle, kept between jobs
+        job --- (transport.SharedImage, lang, builder, engine_config) where
+            engine_config are the keyword arguments of tesseract_raw.init()
+            (oem, variables, datapath)
+    """
+    # imported here to avoid a circular import
+    from . import _image_to_string
+
+    (descriptor, lang, builder, engine_config) = job
+    key = _handle_key(lang, engine_config)
+    handle = handles.get(key)
+    if handle is None:
+        handle = tesseract_raw.init(lang=lang, **engine_config)
+        handles[key] = handle
+
+    with transport.open_image(descriptor) as image:
+        try:
+            _image_to_string(handle, image, lang, builder)
+        finally:
+            if "digits" in builder.tesseract_configs:
+                tesseract_raw.set_is_numeric(handle, False)
+    return builder.get_output()
+
+
+def _worker_main(conn):
+    handles = {}
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            try:
+                result = (True, _run_job(handles, job))
+            except Exception as exc:
+                result = (False, exc)
+            try:
+                conn.send(result)
+            except Exception as exc:  # result cannot be pickled
+                conn.send((False, TesseractError("error", str(exc))))
+    finally:
+        for handle in handles.values():
+            tesseract_raw.cleanup(handle)
+        conn.close()
+
+
+class _Worker(object):
+    def __init__(self, mp_context):
+        self.mp_context = mp_context
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        (self.conn, child_conn) = self.mp_context.Pipe()
+        self.process = self.mp_context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        # so that we get an EOFError if the worker dies
+        child_conn.close()
+
+    def run(self, job):
+        """
+        Returns:
+            (success, output or exception)
+
+        Raises:
+            EOFError, OSError --- the worker died
+        """
+        self.conn.send(job)
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():  # pragma: no cover
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def restart(self):
+        self.conn.close()
+        self.process.join()
+        logger.warning(
+            "libtesseract worker %d died (exit code: %s). Restarting it",
+            self.process.pid, self.process.exitcode
+        )
+        self.start()
+
+
+class ProcessPool(object):
+    """
+    Pool of worker processes running libtesseract.
+
+    Methods are thread-safe: each call uses the first idle worker (or waits
+    for one).
+    """
+
+    def __init__(self, processes=None, mp_context=None):
+        """
+        Arguments:
+            processes --- number of workers (default: number of CPUs)
+            mp_context --- multiprocessing context used to start the workers
+                (default: multiprocessing default context)
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if mp_context is None:
+            mp_context = multiprocessing.get_context()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = []
+        self._idle = queue.Queue()
+        for _ in range(processes):
+            worker = _Worker(mp_context)
+            worker.start()
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def image_to_string(self, image, lang=None, builder=None, oem=None,
+                        variables=None, preset=None):
+        """
+        Same as libtesseract.image_to_string(), but run in a worker process.
+        Handles are reused for the jobs with the same language and engine
+        configuration (engine mode, variables, models).
+
+        Raises:
+            TesseractError --- including if the worker died twice while
+                running this job (status "crashed")
+        """
+        # imported here to avoid a circular import
+        from . import _engine_config
+
+        if builder is None:
+            builder = builders.TextBuilder()
+        if self._closed:
+            raise ValueError("ProcessPool is closed")
+        engine_config = _engine_config(oem, variables, preset)
+
+        with transport.share_image(image) as block:
+            job = (block.descriptor, lang, builder, engine_config)
+            worker = self._idle.get()
+            try:
+                try:
+                    (success, output) = worker.run(job)
+                except (EOFError, OSError):
+                    worker.restart()
+                    try:
+                        (success, output) = worker.run(job)
+                    except (EOFError, OSError):
+                        worker.restart()
+                        raise TesseractError(
+                            "crashed",
+                            "libtesseract crashed twice on this image"
+                        )
+            finally:
+                self._idle.put(worker)
+        if not success:
+            raise output
+        return output
+
+    def close(self):
+        """
+        Stop all the workers. Waits for the running jobs to end.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._workers:
+            self._idle.get().stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
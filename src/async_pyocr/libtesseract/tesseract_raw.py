@@ -3,8 +3,11 @@ import locale
 import logging
 import os
 import sys
+import threading
 
+from .. import instrumentation
 from ..error import TesseractError
+from ..util import format_variable
 
 
 logger = logging.getLogger(__name__)
@@ -53,21 +56,13 @@ else:
     ]
 
 
+# libtesseract is loaded on first use (see load_libtesseract()): loading it
+# and declaring its functions is slow, and useless if it is never used.
 g_libtesseract = None
+g_load_attempted = False
+g_load_lock = threading.Lock()
 
 lib_load_errors = []
-for libname in libnames:  # pragma: no branch
-    try:
-        g_libtesseract = ctypes.cdll.LoadLibrary(libname)
-        lib_load_errors = []
-        break
-    except OSError as ex:  # pragma: no cover
-        if hasattr(ex, 'message'):
-            # python 2
-            lib_load_errors.append((libname, ex.message))
-        else:
-            # python 3
-            lib_load_errors.append((libname, str(ex)))
 
 
 class PageSegMode(object):
@@ -88,6 +83,13 @@ class PageSegMode(object):
     COUNT = 14
 
 
+class OcrEngineMode(object):
+    TESSERACT_ONLY = 0  # legacy engine
+    LSTM_ONLY = 1
+    TESSERACT_LSTM_COMBINED = 2
+    DEFAULT = 3
+
+
 class Orientation(object):
     PAGE_UP = 0
     PAGE_RIGHT = 1
@@ -120,6 +122,17 @@ class PolyBlockType(object):
     COUNT = 13
 
 
+# block types containing text (see PTIsTextType() in Tesseract)
+TEXT_BLOCK_TYPES = frozenset([
+    PolyBlockType.FLOWING_TEXT,
+    PolyBlockType.HEADING_TEXT,
+    PolyBlockType.PULLOUT_TEXT,
+    PolyBlockType.TABLE,
+    PolyBlockType.VERTICAL_TEXT,
+    PolyBlockType.CAPTION_TEXT,
+])
+
+
 class OSResults(ctypes.Structure):
     _fields_ = [
         ("orientations", ctypes.c_float * 4),
@@ -134,24 +147,27 @@ class OSResults(ctypes.Structure):
     ]
 
 
-if g_libtesseract:  # pragma: no cover
-    g_libtesseract.TessVersion.argtypes = []
-    g_libtesseract.TessVersion.restype = ctypes.c_char_p
+def _bind_functions(lib):  # pragma: no cover
+    """
+    Declare the prototypes of the libtesseract functions we use.
+    """
+    lib.TessVersion.argtypes = []
+    lib.TessVersion.restype = ctypes.c_char_p
 
-    g_libtesseract.TessBaseAPICreate.argtypes = []
-    g_libtesseract.TessBaseAPICreate.restype = ctypes.c_void_p  # TessBaseAPI*
-    g_libtesseract.TessBaseAPIDelete.argtypes = [
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPICreate.restype = ctypes.c_void_p  # TessBaseAPI*
+    lib.TessBaseAPIDelete.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIDelete.argtypes = None
+    lib.TessBaseAPIDelete.argtypes = None
 
-    g_libtesseract.TessBaseAPIGetDatapath.argtypes = [
+    lib.TessBaseAPIGetDatapath.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIGetDatapath.restype = ctypes.POINTER(
+    lib.TessBaseAPIGetDatapath.restype = ctypes.POINTER(
         ctypes.c_char)
 
-    g_libtesseract.TessBaseAPIInit1.argtypes = [
+    lib.TessBaseAPIInit1.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_char_p,  # datapath
         ctypes.c_char_p,  # language
@@ -159,47 +175,71 @@ if g_libtesseract:  # pragma: no cover
         ctypes.POINTER(ctypes.c_char_p),  # configs
         ctypes.c_int,  # configs_size
     ]
-    g_libtesseract.TessBaseAPIInit1.restype = ctypes.c_int
+    lib.TessBaseAPIInit1.restype = ctypes.c_int
 
-    g_libtesseract.TessBaseAPIInit3.argtypes = [
+    lib.TessBaseAPIInit3.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_char_p,  # datapath
         ctypes.c_char_p,  # language
     ]
-    g_libtesseract.TessBaseAPIInit3.restype = ctypes.c_int
+    lib.TessBaseAPIInit3.restype = ctypes.c_int
 
-    g_libtesseract.TessBaseAPISetSourceResolution.argtypes = [
+    if hasattr(lib, 'TessBaseAPIInit4'):
+        lib.TessBaseAPIInit4.argtypes = [
+            ctypes.c_void_p,  # TessBaseAPI*
+            ctypes.c_char_p,  # datapath
+            ctypes.c_char_p,  # language
+            ctypes.c_int,  # TessOcrEngineMode
+            ctypes.POINTER(ctypes.c_char_p),  # configs
+            ctypes.c_int,  # configs_size
+            ctypes.POINTER(ctypes.c_char_p),  # vars_vec
+            ctypes.POINTER(ctypes.c_char_p),  # vars_values
+            ctypes.c_size_t,  # vars_vec_size
+            ctypes.c_bool,  # set_only_non_debug_params
+        ]
+        lib.TessBaseAPIInit4.restype = ctypes.c_int
+
+    lib.TessBaseAPISetSourceResolution.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_int,     # PPI
     ]
 
-    g_libtesseract.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.restype = None
+
+    lib.TessBaseAPISetRectangle.argtypes = [
+        ctypes.c_void_p,  # TessBaseAPI*
+        ctypes.c_int,  # left
+        ctypes.c_int,  # top
+        ctypes.c_int,  # width
+        ctypes.c_int,  # height
+    ]
+    lib.TessBaseAPISetRectangle.restype = None
 
-    g_libtesseract.TessBaseAPISetVariable.argtypes = [
+    lib.TessBaseAPISetVariable.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_char_p,  # name
         ctypes.c_char_p,  # value
     ]
-    g_libtesseract.TessBaseAPISetVariable.restype = ctypes.c_bool
+    lib.TessBaseAPISetVariable.restype = ctypes.c_bool
 
-    g_libtesseract.TessBaseAPIGetAvailableLanguagesAsVector.argtypes = [
+    lib.TessBaseAPIGetAvailableLanguagesAsVector.argtypes = [
         ctypes.c_void_p  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIGetAvailableLanguagesAsVector.restype = \
+    lib.TessBaseAPIGetAvailableLanguagesAsVector.restype = \
         ctypes.POINTER(ctypes.c_char_p)
 
-    g_libtesseract.TessBaseAPISetPageSegMode.argtypes = [
+    lib.TessBaseAPISetPageSegMode.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_int,  # See PageSegMode
     ]
-    g_libtesseract.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.restype = None
 
-    g_libtesseract.TessBaseAPIInitForAnalysePage.argtypes = [
+    lib.TessBaseAPIInitForAnalysePage.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIInitForAnalysePage.restype = None
+    lib.TessBaseAPIInitForAnalysePage.restype = None
 
-    g_libtesseract.TessBaseAPISetImage.argtypes = [
+    lib.TessBaseAPISetImage.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.POINTER(ctypes.c_char),  # imagedata
         ctypes.c_int,  # width
@@ -207,101 +247,101 @@ if g_libtesseract:  # pragma: no cover
         ctypes.c_int,  # bytes_per_pixel
         ctypes.c_int,  # bytes_per_line
     ]
-    g_libtesseract.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.restype = None
 
-    g_libtesseract.TessResultRendererAddImage.argtypes = [
+    lib.TessResultRendererAddImage.argtypes = [
         ctypes.c_void_p,  # TessResultRenderer* renderer
         ctypes.c_void_p  # TessBaseAPI* api
     ]
-    g_libtesseract.TessResultRendererAddImage.restype = ctypes.c_bool
+    lib.TessResultRendererAddImage.restype = ctypes.c_bool
 
-    g_libtesseract.TessBaseAPISetInputName.argtypes = [
+    lib.TessBaseAPISetInputName.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI* handle
         ctypes.c_char_p  # const char* name
     ]
-    g_libtesseract.TessBaseAPISetInputName.restype = None
+    lib.TessBaseAPISetInputName.restype = None
 
-    g_libtesseract.TessResultRendererBeginDocument.argtypes = [
+    lib.TessResultRendererBeginDocument.argtypes = [
         ctypes.c_void_p,  # TessResultRenderer* renderer
         ctypes.c_char_p  # const char* title
     ]
-    g_libtesseract.TessResultRendererBeginDocument.restype = ctypes.c_bool
+    lib.TessResultRendererBeginDocument.restype = ctypes.c_bool
 
-    g_libtesseract.TessResultRendererEndDocument.argtypes = [
+    lib.TessResultRendererEndDocument.argtypes = [
         ctypes.c_void_p  # TessResultRenderer* renderer
     ]
-    g_libtesseract.TessResultRendererEndDocument.restype = ctypes.c_bool
+    lib.TessResultRendererEndDocument.restype = ctypes.c_bool
 
-    g_libtesseract.TessPDFRendererCreate.argtypes = [
+    lib.TessPDFRendererCreate.argtypes = [
         ctypes.c_char_p,  # const char* outputbase
         ctypes.c_char_p,  # const char* datadir
         ctypes.c_bool  # BOOL textonly
     ]
-    g_libtesseract.TessPDFRendererCreate.restype = ctypes.c_void_p
+    lib.TessPDFRendererCreate.restype = ctypes.c_void_p
 
-    g_libtesseract.TessBaseAPIRecognize.argtypes = [
+    lib.TessBaseAPIRecognize.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
         ctypes.c_void_p,  # ETEXT_DESC*
     ]
-    g_libtesseract.TessBaseAPIRecognize.restype = ctypes.c_int
+    lib.TessBaseAPIRecognize.restype = ctypes.c_int
 
-    g_libtesseract.TessBaseAPIGetIterator.argtypes = [
+    lib.TessBaseAPIGetIterator.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIGetIterator.restype = \
+    lib.TessBaseAPIGetIterator.restype = \
         ctypes.c_void_p  # TessResultIterator
 
-    g_libtesseract.TessBaseAPIAnalyseLayout.argtypes = [
+    lib.TessBaseAPIAnalyseLayout.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIAnalyseLayout.restype = \
+    lib.TessBaseAPIAnalyseLayout.restype = \
         ctypes.c_void_p  # TessPageIterator*
 
-    g_libtesseract.TessBaseAPIGetUTF8Text.argtypes = [
+    lib.TessBaseAPIGetUTF8Text.argtypes = [
         ctypes.c_void_p,  # TessBaseAPI*
     ]
-    g_libtesseract.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
 
-    g_libtesseract.TessPageIteratorDelete.argtypes = [
+    lib.TessPageIteratorDelete.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
     ]
-    g_libtesseract.TessPageIteratorDelete.restype = None
+    lib.TessPageIteratorDelete.restype = None
 
-    g_libtesseract.TessPageIteratorOrientation.argtypes = [
+    lib.TessPageIteratorOrientation.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
         ctypes.POINTER(ctypes.c_int),  # TessOrientation*
         ctypes.POINTER(ctypes.c_int),  # TessWritingDirection*
         ctypes.POINTER(ctypes.c_int),  # TessTextlineOrder*
         ctypes.POINTER(ctypes.c_float),  # deskew_angle
     ]
-    g_libtesseract.TessPageIteratorOrientation.restype = None
+    lib.TessPageIteratorOrientation.restype = None
 
-    g_libtesseract.TessPageIteratorNext.argtypes = [
+    lib.TessPageIteratorNext.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
         ctypes.c_int,  # TessPageIteratorLevel
     ]
-    g_libtesseract.TessPageIteratorNext.restype = ctypes.c_bool
+    lib.TessPageIteratorNext.restype = ctypes.c_bool
 
-    g_libtesseract.TessPageIteratorIsAtBeginningOf.argtypes = [
+    lib.TessPageIteratorIsAtBeginningOf.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
         ctypes.c_int,  # TessPageIteratorLevel
     ]
-    g_libtesseract.TessPageIteratorIsAtBeginningOf.restype = ctypes.c_bool
+    lib.TessPageIteratorIsAtBeginningOf.restype = ctypes.c_bool
 
-    g_libtesseract.TessPageIteratorIsAtFinalElement.argtypes = [
+    lib.TessPageIteratorIsAtFinalElement.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
         ctypes.c_int,  # TessPageIteratorLevel (level)
         ctypes.c_int,  # TessPageIteratorLevel (element)
     ]
-    g_libtesseract.TessPageIteratorIsAtFinalElement.restype = ctypes.c_bool
+    lib.TessPageIteratorIsAtFinalElement.restype = ctypes.c_bool
 
-    g_libtesseract.TessPageIteratorBlockType.argtypes = [
+    lib.TessPageIteratorBlockType.argtypes = [
         ctypes.c_void_p,  # TessPageIterator*
     ]
-    g_libtesseract.TessPageIteratorBlockType.restype = \
+    lib.TessPageIteratorBlockType.restype = \
         ctypes.c_int  # PolyBlockType
 
-    g_libtesseract.TessPageIteratorBoundingBox.args = [
+    lib.TessPageIteratorBoundingBox.args = [
         ctypes.c_void_p,  # TessPageIterator*
         ctypes.c_int,  # TessPageIteratorLevel (level)
         ctypes.POINTER(ctypes.c_int),  # left
@@ -309,77 +349,219 @@ if g_libtesseract:  # pragma: no cover
         ctypes.POINTER(ctypes.c_int),  # right
         ctypes.POINTER(ctypes.c_int),  # bottom
     ]
-    g_libtesseract.TessPageIteratorBoundingBox.restype = ctypes.c_bool
+    lib.TessPageIteratorBoundingBox.restype = ctypes.c_bool
 
-    g_libtesseract.TessResultIteratorGetPageIterator.argtypes = [
+    lib.TessResultIteratorGetPageIterator.argtypes = [
         ctypes.c_void_p,  # TessResultIterator*
     ]
-    g_libtesseract.TessResultIteratorGetPageIterator.restype = \
+    lib.TessResultIteratorGetPageIterator.restype = \
         ctypes.c_void_p  # TessPageIterator*
 
-    g_libtesseract.TessResultIteratorGetUTF8Text.argtypes = [
+    lib.TessResultIteratorGetUTF8Text.argtypes = [
         ctypes.c_void_p,  # TessResultIterator*
         ctypes.c_int,  # TessPageIteratorLevel (level)
     ]
-    g_libtesseract.TessResultIteratorGetUTF8Text.restype = \
+    lib.TessResultIteratorGetUTF8Text.restype = \
         ctypes.c_void_p
 
-    g_libtesseract.TessResultIteratorConfidence.argtypes = [
+    lib.TessResultIteratorConfidence.argtypes = [
         ctypes.c_void_p,
         ctypes.c_int,
     ]
-    g_libtesseract.TessResultIteratorConfidence.restype = ctypes.c_float
+    lib.TessResultIteratorConfidence.restype = ctypes.c_float
+
+    lib.TessResultIteratorGetChoiceIterator.argtypes = [
+        ctypes.c_void_p,  # TessResultIterator*
+    ]
+    lib.TessResultIteratorGetChoiceIterator.restype = \
+        ctypes.c_void_p  # TessChoiceIterator*
+
+    lib.TessChoiceIteratorDelete.argtypes = [
+        ctypes.c_void_p,  # TessChoiceIterator*
+    ]
+    lib.TessChoiceIteratorDelete.restype = None
+
+    lib.TessChoiceIteratorNext.argtypes = [
+        ctypes.c_void_p,  # TessChoiceIterator*
+    ]
+    lib.TessChoiceIteratorNext.restype = ctypes.c_bool
+
+    lib.TessChoiceIteratorGetUTF8Text.argtypes = [
+        ctypes.c_void_p,  # TessChoiceIterator*
+    ]
+    # owned by the iterator: must not be given to TessDeleteText()
+    lib.TessChoiceIteratorGetUTF8Text.restype = ctypes.c_char_p
 
-    g_libtesseract.TessDeleteText.argtypes = [
+    lib.TessChoiceIteratorConfidence.argtypes = [
+        ctypes.c_void_p,  # TessChoiceIterator*
+    ]
+    lib.TessChoiceIteratorConfidence.restype = ctypes.c_float
+
+    lib.TessDeleteText.argtypes = [
         ctypes.c_void_p
     ]
-    g_libtesseract.TessDeleteText.restype = None
+    lib.TessDeleteText.restype = None
 
-    if hasattr(g_libtesseract, 'TessBaseAPIDetectOrientationScript'):
-        g_libtesseract.TessBaseAPIDetectOrientationScript.argtypes = [
+    if hasattr(lib, 'TessBaseAPIDetectOrientationScript'):
+        lib.TessBaseAPIDetectOrientationScript.argtypes = [
             ctypes.c_void_p,  # TessBaseAPI*
             ctypes.POINTER(ctypes.c_int),  # orient_deg
             ctypes.POINTER(ctypes.c_float),  # orient_conf
             ctypes.POINTER(ctypes.c_char_p),  # script_name
             ctypes.POINTER(ctypes.c_float),  # script_conf
         ]
-        g_libtesseract.TessBaseAPIDetectOrientationScript.restype = \
+        lib.TessBaseAPIDetectOrientationScript.restype = \
             ctypes.c_bool
     else:
-        g_libtesseract.TessBaseAPIDetectOS.argtypes = [
+        lib.TessBaseAPIDetectOS.argtypes = [
             ctypes.c_void_p,  # TessBaseAPI*
             ctypes.POINTER(OSResults),
         ]
-        g_libtesseract.TessBaseAPIDetectOS.restype = ctypes.c_bool
-
-
-def init(lang=None):
+        lib.TessBaseAPIDetectOS.restype = ctypes.c_bool
+
+
+def load_libtesseract():
+    """
+    Load libtesseract, if it hasn't been loaded (or tried to) yet.
+
+    Returns:
+        The library, or None if it could not be loaded (see
+        `lib_load_errors`)
+    """
+    global g_libtesseract
+    global g_load_attempted
+    global lib_load_errors
+
+    if g_libtesseract is not None or g_load_attempted:
+        return g_libtesseract
+    with g_load_lock:
+        if g_libtesseract is not None or g_load_attempted:
+            return g_libtesseract
+        lib = None
+        errors = []
+        for libname in libnames:  # pragma: no branch
+            try:
+                lib = ctypes.cdll.LoadLibrary(libname)
+                errors = []
+                break
+            except OSError as ex:  # pragma: no cover
+                errors.append((libname, str(ex)))
+        if lib is not None:  # pragma: no cover
+            _bind_functions(lib)
+        lib_load_errors = errors
+        g_libtesseract = lib
+        g_load_attempted = True
+    return g_libtesseract
+
+
+def _encode_variable(value):
+    if isinstance(value, bytes):
+        return value
+    return format_variable(value).encode("utf-8")
+
+
+def init(lang=None, oem=None, variables=None, datapath=None):
+    """
+    Creates and initializes a Tesseract handle.
+
+    Arguments:
+        lang --- Tesseract language(s) to load (default: eng)
+        oem --- OCR engine mode (see OcrEngineMode). None means the
+            Tesseract default
+        variables --- dict of Tesseract variables (name --> value) to set
+            on the handle. Values can be str, int, float or bool. Variables
+            that can only be set at initialization time (load_system_dawg,
+            ...) are supported if libtesseract provides TessBaseAPIInit4()
+            (Tesseract >= 4)
+        datapath --- directory of the models (default: TESSDATA_PREFIX, or
+            the default directory of Tesseract)
+    """
+    load_libtesseract()
     assert(g_libtesseract)
 
     # Tesseract 4 workaround
     if get_version() == "4.0.0":
         locale.setlocale(locale.LC_ALL, "C")
 
-    handle = g_libtesseract.TessBaseAPICreate()
-    try:
-        if lang:
-            lang = lang.encode("utf-8")
-        prefix = None
-        if TESSDATA_PREFIX:  # pragma: no cover
-            prefix = TESSDATA_PREFIX.encode("utf-8")
-        g_libtesseract.TessBaseAPIInit3(
-            ctypes.c_void_p(handle),
-            ctypes.c_char_p(prefix),
-            ctypes.c_char_p(lang)
-        )
-        g_libtesseract.TessBaseAPISetVariable(
-            ctypes.c_void_p(handle),
-            b"tessedit_zero_rejection",
-            b"F"
-        )
-    except:  # noqa: E722
-        g_libtesseract.TessBaseAPIDelete(ctypes.c_void_p(handle))
-        raise
+    all_variables = {b"tessedit_zero_rejection": b"F"}
+    if variables:
+        for (name, value) in variables.items():
+            all_variables[_encode_variable(name)] = _encode_variable(value)
+
+    with instrumentation.span("libtesseract.init"):
+        handle = g_libtesseract.TessBaseAPICreate()
+        try:
+            if lang:
+                lang = lang.encode("utf-8")
+            prefix = None
+            if datapath is not None:
+                prefix = datapath.encode("utf-8")
+            elif TESSDATA_PREFIX:  # pragma: no cover
+                prefix = TESSDATA_PREFIX.encode("utf-8")
+            # variables to set once the handle is initialized
+            late_variables = all_variables
+            if oem is None and not variables:
+                g_libtesseract.TessBaseAPIInit3(
+                    ctypes.c_void_p(handle),
+                    ctypes.c_char_p(prefix),
+                    ctypes.c_char_p(lang)
+                )
+            elif hasattr(g_libtesseract, "TessBaseAPIInit4"):
+                if oem is None:
+                    oem = OcrEngineMode.DEFAULT
+                names = list(all_variables.keys())
+                values = [all_variables[name] for name in names]
+                g_libtesseract.TessBaseAPIInit4(
+                    ctypes.c_void_p(handle),
+                    ctypes.c_char_p(prefix),
+                    ctypes.c_char_p(lang),
+                    ctypes.c_int(oem),
+                    None, ctypes.c_int(0),
+                    (ctypes.c_char_p * len(names))(*names),
+                    (ctypes.c_char_p * len(values))(*values),
+                    ctypes.c_size_t(len(names)),
+                    ctypes.c_bool(False)
+                )
+                late_variables = {}
+            else:
+                if oem is None:
+                    oem = OcrEngineMode.DEFAULT
+                g_libtesseract.TessBaseAPIInit1(
+                    ctypes.c_void_p(handle),
+                    ctypes.c_char_p(prefix),
+                    ctypes.c_char_p(lang),
+                    ctypes.c_int(oem),
+                    None, ctypes.c_int(0)
+                )
+            for (name, value) in late_variables.items():
+                if not g_libtesseract.TessBaseAPISetVariable(
+                        ctypes.c_void_p(handle), name, value):
+                    logger.warning(
+                        "Failed to set Tesseract variable %s"
+                        " (unknown or init-only variable)",
+                        name.decode("utf-8")
+                    )
+        except:  # noqa: E722
+            g_libtesseract.TessBaseAPIDelete(ctypes.c_void_p(handle))
+            raise
+    return handle
+
+
+def init_for_layout():
+    """
+    Creates a Tesseract handle usable only for the layout analysis
+    (set_image(), analyse_layout()). No language model is loaded.
+    """
+    load_libtesseract()
+    assert(g_libtesseract)
+
+    with instrumentation.span("libtesseract.init"):
+        handle = g_libtesseract.TessBaseAPICreate()
+        try:
+            init_for_analyse_page(handle)
+        except:  # noqa: E722
+            g_libtesseract.TessBaseAPIDelete(ctypes.c_void_p(handle))
+            raise
     return handle
 
 
@@ -389,10 +571,11 @@ def cleanup(handle):
 
 
 def is_available():
-    return g_libtesseract is not None
+    return load_libtesseract() is not None
 
 
 def get_version():
+    load_libtesseract()
     assert(g_libtesseract)
     return g_libtesseract.TessVersion().decode("utf-8")
 
@@ -448,6 +631,20 @@ def set_page_seg_mode(handle, mode):
     )
 
 
+def set_rectangle(handle, left, top, width, height):
+    """
+    Restrict the recognition to a rectangle of the image. Must be called
+    after set_image() (setting the image resets the rectangle). The
+    coordinates of the results remain relative to the whole image.
+    """
+    assert(g_libtesseract)
+
+    g_libtesseract.TessBaseAPISetRectangle(
+        ctypes.c_void_p(handle), ctypes.c_int(left), ctypes.c_int(top),
+        ctypes.c_int(width), ctypes.c_int(height)
+    )
+
+
 def init_for_analyse_page(handle):
     assert(g_libtesseract)
 
@@ -457,35 +654,80 @@ def init_for_analyse_page(handle):
 def set_image(handle, image):
     assert(g_libtesseract)
 
-    image = image.convert("RGB")
-    image.load()
-    imgdata = image.tobytes("raw", "RGB")
+    with instrumentation.span("libtesseract.set_image"):
+        image = image.convert("RGB")
+        image.load()
+        imgdata = image.tobytes("raw", "RGB")
+
+        g_libtesseract.TessBaseAPISetImage(
+            ctypes.c_void_p(handle),
+            imgdata,
+            ctypes.c_int(image.width),
+            ctypes.c_int(image.height),
+            ctypes.c_int(3),  # RGB = 3 * 8
+            ctypes.c_int(image.width * 3)
+        )
+
+        dpi = image.info.get("dpi", [DPI_DEFAULT])[0]
+        g_libtesseract.TessBaseAPISetSourceResolution(
+            ctypes.c_void_p(handle), dpi
+        )
 
-    g_libtesseract.TessBaseAPISetImage(
-        ctypes.c_void_p(handle),
-        imgdata,
-        ctypes.c_int(image.width),
-        ctypes.c_int(image.height),
-        ctypes.c_int(3),  # RGB = 3 * 8
-        ctypes.c_int(image.width * 3)
-    )
 
-    dpi = image.info.get("dpi", [DPI_DEFAULT])[0]
-    g_libtesseract.TessBaseAPISetSourceResolution(ctypes.c_void_p(handle), dpi)
+def set_image_buffer(handle, buf, width, height, bytes_per_pixel,
+                     bytes_per_line, dpi=DPI_DEFAULT):
+    """
+    Same as set_image(), but takes raw pixels (any object supporting the
+    buffer protocol: bytes, bytearray, memoryview, mmap, ...). If `buf` is
+    writable, it is given to Tesseract without any copy.
+    """
+    assert(g_libtesseract)
+
+    buf = memoryview(buf)
+    if buf.nbytes < bytes_per_line * height:
+        raise ValueError("Image buffer too small")
+
+    with instrumentation.span("libtesseract.set_image"):
+        if buf.readonly:
+            imgdata = buf.tobytes()
+        else:
+            imgdata = (ctypes.c_char * buf.nbytes).from_buffer(buf)
+
+        try:
+            g_libtesseract.TessBaseAPISetImage(
+                ctypes.c_void_p(handle),
+                imgdata,
+                ctypes.c_int(width),
+                ctypes.c_int(height),
+                ctypes.c_int(bytes_per_pixel),
+                ctypes.c_int(bytes_per_line)
+            )
+        finally:
+            # Tesseract keeps its own copy of the pixels: the buffer can be
+            # released right away
+            del imgdata
+
+        g_libtesseract.TessBaseAPISetSourceResolution(
+            ctypes.c_void_p(handle), dpi
+        )
 
 
 def recognize(handle):
     assert(g_libtesseract)
 
-    return g_libtesseract.TessBaseAPIRecognize(
-        ctypes.c_void_p(handle), ctypes.c_void_p(None)
-    )
+    with instrumentation.span("libtesseract.recognize"):
+        return g_libtesseract.TessBaseAPIRecognize(
+            ctypes.c_void_p(handle), ctypes.c_void_p(None)
+        )
 
 
 def analyse_layout(handle):
     assert(g_libtesseract)
 
-    return g_libtesseract.TessBaseAPIAnalyseLayout(ctypes.c_void_p(handle))
+    with instrumentation.span("libtesseract.analyse_layout"):
+        return g_libtesseract.TessBaseAPIAnalyseLayout(
+            ctypes.c_void_p(handle)
+        )
 
 
 def get_utf8_text(handle):
@@ -620,6 +862,49 @@ def result_iterator_get_confidence(iterator, level):
     return val
 
 
+def result_iterator_get_choice_iterator(iterator):
+    """
+    Returns an iterator over the alternatives of the current symbol of
+    the result iterator (to delete with choice_iterator_delete()).
+    """
+    assert(g_libtesseract)
+
+    return g_libtesseract.TessResultIteratorGetChoiceIterator(
+        ctypes.c_void_p(iterator)
+    )
+
+
+def choice_iterator_delete(iterator):
+    assert(g_libtesseract)
+
+    return g_libtesseract.TessChoiceIteratorDelete(ctypes.c_void_p(iterator))
+
+
+def choice_iterator_next(iterator):
+    assert(g_libtesseract)
+
+    return g_libtesseract.TessChoiceIteratorNext(ctypes.c_void_p(iterator))
+
+
+def choice_iterator_get_utf8_text(iterator):
+    assert(g_libtesseract)
+
+    val = g_libtesseract.TessChoiceIteratorGetUTF8Text(
+        ctypes.c_void_p(iterator)
+    )
+    if val is None:
+        return None
+    return val.decode("utf-8")
+
+
+def choice_iterator_get_confidence(iterator):
+    assert(g_libtesseract)
+
+    return g_libtesseract.TessChoiceIteratorConfidence(
+        ctypes.c_void_p(iterator)
+    )
+
+
 def detect_os(handle):
     assert(g_libtesseract)
 
@@ -0,0 +1,378 @@
+"""
+Preprocessing of the images before OCR, with NumPy.
+
+A Pipeline runs stages (Grayscale, Otsu, Sauvola, NormalizeDpi, Deskew)
+on a Raster: the pixels of the image in a NumPy array and its resolution.
+The image is decoded once (Raster.from_pil()), the stages work on the
+array (in place when the size of the image doesn't change) and the Raster
+is given as-is to the OCR tools:
+
+- libtesseract gives the pixels of the array to Tesseract without copy nor
+  encoding (see tesseract_raw.set_image_buffer());
+- tesseract and cuneiform write them to their input file through a Pillow
+  image (Raster.to_pil()), sharing the memory of the array for grayscale
+  images only: Pillow stores RGB pixels on 4 bytes, so RGB arrays are
+  copied.
+
+A stage is any callable taking a Raster and returning a Raster (the same
+one when it works in place).
+
+Requires NumPy.
+
+USAGE:
+ > from pyocr import preprocessing
+ > pipeline = preprocessing.Pipeline([
+ >     preprocessing.Grayscale(),
+ >     preprocessing.NormalizeDpi(300),
+ >     preprocessing.Deskew(),
+ >     preprocessing.Sauvola(),
+ > ])
+ > raster = pipeline(Image.open('test.png'))
+ > print(libtesseract.image_to_string(raster, lang='fra'))
+"""
+
+import math
+
+import numpy
+from PIL import Image
+
+from . import instrumentation
+from . import transport
+
+__all__ = [
+    'Deskew',
+    'Grayscale',
+    'NormalizeDpi',
+    'Otsu',
+    'Pipeline',
+    'Raster',
+    'Sauvola',
+    'otsu_threshold',
+]
+
+
+# NumPy array shape --> Pillow mode
+_MODES = {
+    2: "L",
+    3: "RGB",
+}
+
+
+class Raster(object):
+    """
+    Pixels of an image, in a C-contiguous NumPy array of uint8: (height,
+    width) for a grayscale image, (height, width, 3) for a RGB image.
+
+    Attributes:
+        pixels --- the NumPy array
+        dpi --- resolution of the image (transport.DPI_DEFAULT if unknown;
+            a resolution <= 0 is unknown as well)
+    """
+
+    def __init__(self, pixels, dpi=transport.DPI_DEFAULT):
+        if pixels.dtype != numpy.uint8 or pixels.ndim not in _MODES or (
+                pixels.ndim == 3 and pixels.shape[2] != 3):
+            raise ValueError(
+                "Unsupported pixels: {} {} (expected: uint8, (height, width)"
+                " or (height, width, 3))".format(pixels.dtype, pixels.shape)
+            )
+        self.pixels = numpy.ascontiguousarray(pixels)
+        self.dpi = dpi
+
+    @staticmethod
+    def from_pil(image):
+        """
+        Copy the pixels of a Pillow image. Images that are neither
+        grayscale nor RGB are converted to RGB first (grayscale for binary
+        images).
+        """
+        if image.mode == "1":
+            image = image.convert("L")
+        elif image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        dpi = int(round(image.info.get("dpi", [transport.DPI_DEFAULT])[0]))
+        if dpi <= 0:
+            # stored as 0 by some files
+            dpi = transport.DPI_DEFAULT
+        return Raster(numpy.array(image), dpi)
+
+    def to_pil(self):
+        """
+        Returns a Pillow image of this raster. Only grayscale ("L")
+        images share the memory of the raster: RGB pixels are copied
+        (Pillow stores them on 4 bytes).
+        """
+        image = Image.frombuffer(self.mode, self.size, self.pixels,
+                                 "raw", self.mode, 0, 1)
+        image.info['dpi'] = (self.dpi, self.dpi)
+        return image
+
+    @property
+    def mode(self):
+        return _MODES[self.pixels.ndim]
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    # same interface as transport.ImageView: see
+    # tesseract_raw.set_image_buffer()
+
+    @property
+    def buf(self):
+        return memoryview(self.pixels).cast("B")
+
+    @property
+    def bytes_per_pixel(self):
+        return 1 if self.pixels.ndim == 2 else 3
+
+    @property
+    def bytes_per_line(self):
+        return self.width * self.bytes_per_pixel
+
+    def __repr__(self):
+        return "Raster({}x{}, {}, {} dpi)".format(
+            self.width, self.height, self.mode, self.dpi
+        )
+
+
+def _to_grayscale(raster):
+    if raster.pixels.ndim == 2:
+        return raster
+    # ITU-R 601-2 luma, as Pillow's convert("L")
+    gray = numpy.dot(raster.pixels,
+                     numpy.array([0.299, 0.587, 0.114], numpy.float32))
+    gray += 0.5
+    return Raster(gray.astype(numpy.uint8), raster.dpi)
+
+
+class Grayscale(object):
+    """
+    Converts RGB images to grayscale (one byte per pixel instead of 3: the
+    next stages, and Tesseract, have 3 times less data to process).
+    """
+
+    def __call__(self, raster):
+        with instrumentation.span("preprocessing.grayscale"):
+            return _to_grayscale(raster)
+
+    def __repr__(self):
+        return "Grayscale()"
+
+
+def otsu_threshold(pixels):
+    """
+    Returns the threshold separating the pixels (NumPy array of uint8) in
+    2 classes of minimal intra-class variance (Otsu's method).
+    """
+    histogram = numpy.bincount(pixels.ravel(), minlength=256).astype(
+        numpy.float64
+    )
+    levels = numpy.arange(256, dtype=numpy.float64)
+    # weight and sum of the levels of the class [0, t], for each t
+    weight = numpy.cumsum(histogram)
+    total = weight[-1]
+    level_sum = numpy.cumsum(histogram * levels)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        mean_low = level_sum / weight
+        mean_high = (level_sum[-1] - level_sum) / (total - weight)
+        variance = weight * (total - weight) * (mean_low - mean_high) ** 2
+    return int(numpy.argmax(numpy.nan_to_num(variance)))
+
+
+def _binarize(pixels, threshold):
+    """
+    Pixels above `threshold` (scalar or array) become white, others black.
+    In place.
+    """
+    numpy.multiply(pixels > threshold, 255, out=pixels, casting="unsafe")
+
+
+class Otsu(object):
+    """
+    Binarizes the image with a global threshold (Otsu's method). RGB
+    images are converted to grayscale first. In place.
+    """
+
+    def __call__(self, raster):
+        with instrumentation.span("preprocessing.binarize"):
+            raster = _to_grayscale(raster)
+            _binarize(raster.pixels, otsu_threshold(raster.pixels))
+            return raster
+
+    def __repr__(self):
+        return "Otsu()"
+
+
+def _window_sums(values, radius, dtype):
+    """
+    Returns the sum of `values` in the window of (2 * radius + 1) x
+    (2 * radius + 1) pixels around each pixel (clipped at the borders).
+    """
+    (height, width) = values.shape
+    # vertical sums, then horizontal sums of the vertical sums
+    cumulated = numpy.zeros((height + 1, width), dtype)
+    numpy.cumsum(values, axis=0, dtype=dtype, out=cumulated[1:])
+    rows = numpy.arange(height)
+    top = numpy.clip(rows - radius, 0, height)
+    bottom = numpy.clip(rows + radius + 1, 0, height)
+    vertical = cumulated[bottom] - cumulated[top]
+    del cumulated
+
+    cumulated = numpy.zeros((height, width + 1), dtype)
+    numpy.cumsum(vertical, axis=1, dtype=dtype, out=cumulated[:, 1:])
+    del vertical
+    columns = numpy.arange(width)
+    left = numpy.clip(columns - radius, 0, width)
+    right = numpy.clip(columns + radius + 1, 0, width)
+    return (cumulated[:, right] - cumulated[:, left],
+            (bottom - top)[:, None] * (right - left)[None, :])
+
+
+class Sauvola(object):
+    """
+    Binarizes the image with a local threshold (Sauvola's method): better
+    than Otsu on unevenly lit pages. RGB images are converted to grayscale
+    first. In place.
+
+    Attributes:
+        window --- size (in pixels) of the neighbourhood of each pixel
+        k --- sensitivity (higher values give thinner characters)
+    """
+
+    # dynamic range of the standard deviation
+    R = 128.0
+
+    def __init__(self, window=25, k=0.2):
+        if window < 3:
+            raise ValueError("Invalid Sauvola window: {}".format(window))
+        self.window = window
+        self.k = k
+
+    def __call__(self, raster):
+        with instrumentation.span("preprocessing.binarize"):
+            raster = _to_grayscale(raster)
+            pixels = raster.pixels
+            radius = self.window // 2
+            (sums, counts) = _window_sums(pixels, radius, numpy.int32)
+            mean = sums / counts
+            del sums
+            (squares, _) = _window_sums(
+                numpy.square(pixels, dtype=numpy.int64), radius, numpy.int64
+            )
+            variance = squares / counts
+            del squares
+            variance -= numpy.square(mean)
+            numpy.maximum(variance, 0, out=variance)
+            std = numpy.sqrt(variance, out=variance)
+            # threshold = mean * (1 + k * (std / R - 1))
+            std /= self.R
+            std -= 1
+            std *= self.k
+            std += 1
+            mean *= std
+            _binarize(pixels, mean)
+            return raster
+
+    def __repr__(self):
+        return "Sauvola(window={}, k={})".format(self.window, self.k)
+
+
+class NormalizeDpi(object):
+    """
+    Rescales the image to `dpi` (Tesseract works best at 300 dpi). Images
+    whose resolution is unknown, or within `tolerance` (ratio) of `dpi`,
+    are left untouched.
+    """
+
+    def __init__(self, dpi=300, tolerance=0.1):
+        self.dpi = dpi
+        self.tolerance = tolerance
+
+    def __call__(self, raster):
+        if raster.dpi == transport.DPI_DEFAULT or raster.dpi <= 0:
+            # unknown resolution
+            return raster
+        scale = self.dpi / raster.dpi
+        if abs(scale - 1) <= self.tolerance:
+            return raster
+        with instrumentation.span("preprocessing.normalize_dpi"):
+            size = (max(1, int(round(raster.width * scale))),
+                    max(1, int(round(raster.height * scale))))
+            resample = Image.LANCZOS if scale < 1 else Image.BICUBIC
+            image = raster.to_pil().resize(size, resample)
+            return Raster(numpy.array(image), self.dpi)
+
+    def __repr__(self):
+        return "NormalizeDpi({})".format(self.dpi)
+
+
+class Deskew(object):
+    """
+    Rotates the image so that its lines of text are horizontal. The skew
+    is found by the layout analysis of libtesseract
+    (libtesseract.get_deskew_angle()). Skews smaller than `min_angle`
+    (degrees) are ignored. The corners uncovered by the rotation are
+    filled with white.
+
+    Attributes:
+        handles --- libtesseract.parallel.HandlePool providing the
+            Tesseract handle (default: one created for each image)
+    """
+
+    def __init__(self, min_angle=0.1, handles=None):
+        self.min_angle = min_angle
+        self.handles = handles
+
+    def __call__(self, raster):
+        from . import libtesseract
+
+        with instrumentation.span("preprocessing.deskew"):
+            angle = math.degrees(
+                libtesseract.get_deskew_angle(raster, handles=self.handles)
+            )
+            if abs(angle) < self.min_angle:
+                return raster
+            fill = 255 if raster.pixels.ndim == 2 else (255, 255, 255)
+            image = raster.to_pil().rotate(
+                angle, resample=Image.BILINEAR, fillcolor=fill
+            )
+            return Raster(numpy.array(image), raster.dpi)
+
+    def __repr__(self):
+        return "Deskew(min_angle={})".format(self.min_angle)
+
+
+class Pipeline(object):
+    """
+    Runs stages one after the other.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def __call__(self, image):
+        """
+        Arguments:
+            image --- Pillow image or Raster. A Raster is modified in place
+                by the stages working in place.
+
+        Returns:
+            Raster
+        """
+        if not isinstance(image, Raster):
+            image = Raster.from_pil(image)
+        for stage in self.stages:
+            image = stage(image)
+        return image
+
+    def __repr__(self):
+        return "Pipeline({})".format(self.stages)
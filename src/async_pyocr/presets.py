@@ -0,0 +1,128 @@
+"""
+Named speed / accuracy profiles for Tesseract.
+
+Each preset maps to an OCR engine mode and a set of Tesseract variables. The
+tesseract tool passes them on its command line (--oem, -c name=value), the
+libtesseract tool gives them to the Tesseract handle (TessBaseAPIInit4() /
+SetVariable()). Cuneiform has no equivalent settings: it accepts the preset
+names and ignores them.
+
+- fast: LSTM engine only, no dictionaries, no second pass on inverted
+  text, and one OpenMP thread per tesseract process (the processes run in
+  parallel instead, see concurrency.set_max_processes()).
+- balanced: Tesseract defaults, without the second pass on inverted text.
+- accurate: Tesseract defaults, with the adaptive (local Otsu)
+  thresholding on Tesseract >= 5.
+
+Preset.tessdata_dir can point to a directory of models suited to the
+preset (for instance tessdata_fast for 'fast', tessdata_best for
+'accurate'). By default, the models of the Tesseract installation are used.
+
+USAGE:
+ > await tesseract.image_to_string(image, preset="fast")
+ > libtesseract.image_to_string(image, preset="accurate")
+ > presets.PRESETS["fast"].tessdata_dir = "/usr/share/tessdata_fast"
+"""
+
+__all__ = [
+    'PRESETS',
+    'Preset',
+    'get_preset',
+]
+
+
+# see libtesseract.tesseract_raw.OcrEngineMode
+OEM_LSTM_ONLY = 1
+
+
+class Preset(object):
+    """
+    Engine settings of a preset.
+
+    Attributes:
+        name --- name of the preset
+        oem --- OCR engine mode (None: Tesseract default)
+        variables --- dict of Tesseract variables
+        variables_v5 --- dict of Tesseract variables only known by
+            Tesseract >= 5
+        thread_limit --- maximum number of OpenMP threads of each tesseract
+            process (None: no limit). Libtesseract reads it only when it
+            is loaded (environment variable OMP_THREAD_LIMIT)
+        tessdata_dir --- directory of the models to use (None: default)
+    """
+
+    def __init__(self, name, oem=None, variables=None, variables_v5=None,
+                 thread_limit=None, tessdata_dir=None):
+        self.name = name
+        self.oem = oem
+        self.variables = variables if variables is not None else {}
+        self.variables_v5 = variables_v5 if variables_v5 is not None else {}
+        self.thread_limit = thread_limit
+        self.tessdata_dir = tessdata_dir
+
+    def get_engine_config(self, version, oem=None, variables=None):
+        """
+        Returns the (oem, variables) to give to Tesseract `version`. `oem`
+        and `variables` explicitly requested by the caller override the
+        ones of the preset.
+        """
+        all_variables = dict(self.variables)
+        if version[0] >= 5:
+            all_variables.update(self.variables_v5)
+        if variables:
+            all_variables.update(variables)
+        if oem is None and version[0] >= 4:
+            # the engine modes of Tesseract 3 are different (no LSTM)
+            oem = self.oem
+        return (oem, all_variables)
+
+    def __repr__(self):
+        return "Preset({})".format(self.name)
+
+
+PRESETS = {
+    "fast": Preset(
+        "fast",
+        oem=OEM_LSTM_ONLY,
+        variables={
+            # dictionaries are loaded at initialization time and consulted
+            # for each word
+            "load_system_dawg": False,
+            "load_freq_dawg": False,
+            # Tesseract 4 runs a second recognition on the words with a
+            # low confidence, assuming they may be white on black
+            "tessedit_do_invert": False,
+        },
+        thread_limit=1,
+    ),
+    "balanced": Preset(
+        "balanced",
+        variables={
+            "tessedit_do_invert": False,
+        },
+    ),
+    "accurate": Preset(
+        "accurate",
+        variables_v5={
+            # 1 = Leptonica local Otsu (better on unevenly lit pages)
+            "thresholding_method": 1,
+        },
+    ),
+}
+
+
+def get_preset(name):
+    """
+    Returns the Preset named `name`. Returns None if `name` is None.
+
+    Raises:
+        ValueError --- unknown preset
+    """
+    if name is None:
+        return None
+    try:
+        return PRESETS[name]
+    except KeyError:
+        raise ValueError("Unknown preset '{}' (available: {})".format(
+            name, ", ".join(sorted(PRESETS))
+        ))
@@ -44,24 +44,32 @@ WEBSITE:
 https://gitlab.gnome.org/World/OpenPaperwork/pyocr#readme
 """
 
+import importlib
+import os
+import threading
+
 from . import _version
-from . import cuneiform
-from . import libtesseract
-from . import tesseract
 
-__all__ = [
+__all__ = [  # noqa: F822 (TOOLS is provided by __getattr__())
+    'aget_available_tools',
     'get_available_tools',
     'TOOLS',
     'VERSION',
 ]
 
 
-TOOLS = [  # in preference order
-    tesseract,
-    libtesseract,
-    cuneiform,
+# Modules of the OCR tools, in preference order. They are only imported when
+# TOOLS is first accessed (see __getattr__()).
+TOOL_NAMES = [
+    'tesseract',
+    'libtesseract',
+    'cuneiform',
 ]
 
+# (pid, available tools): the cache is not valid anymore in forked children
+g_available_tools = None
+g_available_tools_lock = threading.Lock()
+
 try:
     VERSION = _version.version
     # drop Git commit
@@ -78,12 +86,74 @@ except Exception as exc:
     VERSION = (0, 0, 0)
 
 
-def get_available_tools():
+def _get_tools():
+    tools = globals().get('TOOLS')
+    if tools is None:
+        tools = [
+            importlib.import_module("." + name, __package__)
+            for name in TOOL_NAMES
+        ]
+        globals()['TOOLS'] = tools
+    return tools
+
+
+def __getattr__(name):
+    # PEP 562: the modules of the OCR tools are imported on first access
+    if name == 'TOOLS':
+        return _get_tools()
+    if name in TOOL_NAMES:
+        return importlib.import_module("." + name, __package__)
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+
+def _find_available_tools():
+    # imported here: most users never need it
+    import concurrent.futures
+
+    tools = _get_tools()
+    # some tools must load a library or run a command to know if they are
+    # available: look for all of them at the same time
+    with concurrent.futures.ThreadPoolExecutor(len(tools)) as executor:
+        availability = list(executor.map(
+            lambda tool: tool.is_available(), tools
+        ))
+    return [
+        tool for (tool, available) in zip(tools, availability) if available
+    ]
+
+
+def get_available_tools(refresh=False):
     """
     Return a list of OCR tools available on the local system.
+
+    The result is cached for the current process: the OCR tools are looked
+    for only on the first call (or if `refresh` is True). Concurrent calls
+    wait for the same lookup. A new lookup also clears the versions of the
+    tools cached for the recognition.
     """
-    available = []
-    for tool in TOOLS:
-        if tool.is_available():
-            available.append(tool)
-    return available
+    global g_available_tools
+    with g_available_tools_lock:
+        pid = os.getpid()
+        if (refresh or g_available_tools is None or
+                g_available_tools[0] != pid):
+            for tool in _get_tools():
+                # versions cached by the tools themselves
+                clear_version_cache = getattr(tool, "_clear_version_cache",
+                                              None)
+                if clear_version_cache is not None:
+                    clear_version_cache()
+            g_available_tools = (pid, _find_available_tools())
+        return g_available_tools[1][:]
+
+
+async def aget_available_tools(refresh=False):
+    """
+    Same as get_available_tools(), but the lookup runs in a thread so that
+    it doesn't block the event loop.
+    """
+    import asyncio  # imported here to keep 'import pyocr' fast
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_available_tools, refresh)
@@ -0,0 +1,194 @@
+"""
+Rescaling of the images to the resolution Tesseract works best at.
+
+Tesseract is the most accurate on text of a given size in pixels (around
+300 dpi for body text): smaller text loses accuracy, larger text (600 dpi
+scans for instance) costs several times the CPU for no gain. With a
+Rescale, image_to_string() resamples the image before the recognition,
+and maps the positions of the boxes back to the original image:
+
+- to `dpi`, from the resolution of the image (Pillow image.info['dpi'],
+  Raster.dpi, ImageView.dpi). Images whose resolution is unknown are not
+  rescaled;
+- or, if `line_height` is set, so that the median height of the lines of
+  text found by the layout analysis is `line_height` pixels. Works on
+  images whose resolution is unknown or wrong. libtesseract only: the
+  tesseract command can't analyse the layout without recognizing, so it
+  always rescales to `dpi`.
+
+Scales within `tolerance` of 1 are ignored: the image is given as-is.
+
+USAGE:
+ > lines = libtesseract.image_to_string(
+ >     image, builder=builders.LineBoxBuilder(),
+ >     rescale=scaling.Rescale(dpi=300)
+ > )
+"""
+
+import statistics
+
+from PIL import Image
+
+from . import builders
+from . import instrumentation
+from . import transport
+from .util import to_pil
+
+__all__ = [
+    'Rescale',
+    'get_dpi',
+    'map_output',
+]
+
+
+def get_dpi(image):
+    """
+    Returns the resolution of `image` (Pillow image, transport.ImageView or
+    preprocessing.Raster), transport.DPI_DEFAULT if unknown. Some files
+    store a resolution of 0: it is unknown as well.
+    """
+    if isinstance(image, Image.Image):
+        dpi = image.info.get("dpi", [transport.DPI_DEFAULT])[0]
+    else:
+        dpi = image.dpi
+    dpi = int(round(dpi))
+    if dpi <= 0:
+        return transport.DPI_DEFAULT
+    return dpi
+
+
+class Rescale(object):
+    """
+    Settings of the rescaling.
+
+    Attributes:
+        dpi --- target resolution
+        line_height --- target median height (in pixels) of the lines of
+            text (None: rescale to `dpi`). libtesseract only: tesseract
+            rescales to `dpi`
+        tolerance --- scales within `tolerance` (ratio) of 1 are ignored
+        max_scale --- the image is never enlarged nor reduced by more than
+            this factor
+    """
+
+    def __init__(self, dpi=300, line_height=None, tolerance=0.1,
+                 max_scale=4.0):
+        if dpi <= 0 or (line_height is not None and line_height <= 0):
+            raise ValueError(
+                "Invalid rescaling target: {} dpi, line height {}".format(
+                    dpi, line_height
+                )
+            )
+        if max_scale < 1:
+            raise ValueError(
+                "Invalid maximum scale: {} (expected: >= 1)".format(
+                    max_scale
+                )
+            )
+        self.dpi = dpi
+        self.line_height = line_height
+        self.tolerance = tolerance
+        self.max_scale = max_scale
+
+    def get_scale(self, image, blocks=None):
+        """
+        Returns the factor by which `image` must be resized (1.0 if it must
+        be given as-is).
+
+        Arguments:
+            image --- Pillow image, transport.ImageView or
+                preprocessing.Raster
+            blocks --- result of the layout analysis of `image` (list of
+                builders.Block). If None, the image is rescaled to `dpi`
+                even if `line_height` is set
+        """
+        if self.line_height is not None and blocks is not None:
+            heights = [
+                line.position[1][1] - line.position[0][1]
+                for block in blocks
+                for line in block.line_boxes
+            ]
+            heights = [height for height in heights if height > 0]
+            if not heights:
+                return 1.0
+            scale = self.line_height / statistics.median(heights)
+        else:
+            dpi = get_dpi(image)
+            if dpi == transport.DPI_DEFAULT:
+                # unknown resolution
+                return 1.0
+            scale = self.dpi / dpi
+        scale = min(max(scale, 1 / self.max_scale), self.max_scale)
+        if abs(scale - 1) <= self.tolerance:
+            return 1.0
+        return scale
+
+    @staticmethod
+    def resize(image, scale):
+        """
+        Returns a Pillow copy of `image` resized by `scale`, with its
+        resolution updated.
+        """
+        with instrumentation.span("scaling.resize"):
+            dpi = get_dpi(image)
+            source = to_pil(image)
+            try:
+                size = (max(1, int(round(source.size[0] * scale))),
+                        max(1, int(round(source.size[1] * scale))))
+                resample = Image.LANCZOS if scale < 1 else Image.BICUBIC
+                resized = source.resize(size, resample)
+            finally:
+                if source is not image:
+                    # may share the memory of `image`
+                    source.close()
+            if dpi != transport.DPI_DEFAULT:
+                dpi = int(round(dpi * scale))
+            resized.info['dpi'] = (dpi, dpi)
+            return resized
+
+    def __repr__(self):
+        return "Rescale(dpi={}, line_height={}, tolerance={})".format(
+            self.dpi, self.line_height, self.tolerance
+        )
+
+
+def _map_position(position, ratio_x, ratio_y):
+    return (
+        (int(round(position[0][0] * ratio_x)),
+         int(round(position[0][1] * ratio_y))),
+        (int(round(position[1][0] * ratio_x)),
+         int(round(position[1][1] * ratio_y))),
+    )
+
+
+def _map_item(item, ratio_x, ratio_y):
+    item.position = _map_position(item.position, ratio_x, ratio_y)
+    if isinstance(item, builders.Block):
+        children = item.paragraphs
+    elif isinstance(item, builders.Paragraph):
+        children = item.line_boxes
+    elif isinstance(item, builders.LineBox):
+        children = item.word_boxes
+    else:
+        children = getattr(item, "char_boxes", None) or []
+    for child in children:
+        _map_item(child, ratio_x, ratio_y)
+
+
+def map_output(output, original_size, scaled_size):
+    """
+    Maps the positions of the boxes of `output` (output of a builder) on
+    an image of `scaled_size` to the original image, of `original_size`.
+    In place.
+
+    Returns:
+        `output`
+    """
+    if not isinstance(output, list) or original_size == scaled_size:
+        # text: no position
+        return output
+    ratio_x = original_size[0] / scaled_size[0]
+    ratio_y = original_size[1] / scaled_size[1]
+    for item in output:
+        _map_item(item, ratio_x, ratio_y)
+    return output
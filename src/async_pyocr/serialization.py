@@ -0,0 +1,282 @@
+"""
+Compact binary encoding for lists of Box and LineBox.
+
+hOCR (see builders.WordBoxBuilder.write_file()) is verbose and slow to
+parse back. This module provides a small binary format meant for caching
+and for shipping results between processes.
+
+Layout (all integers after the header are 32 bits, little-endian):
+
+    header (8 bytes): magic "POCR", uint8 format version, uint8 kind
+        (words / lines), 2 bytes of padding
+
+    words section (kind == KIND_WORDS):
+        uint32             count
+        int32[count * 5]   left, top, right, bottom, confidence
+        uint32[count + 1]  offsets of each content in the text blob
+        bytes              UTF-8 text blob
+
+    lines section (kind == KIND_LINES):
+        uint32             count
+        int32[count * 4]   left, top, right, bottom of each line
+        uint32[count + 1]  index of the first word of each line
+        words section      (with its own count)
+
+The contents are concatenated in the text blob, without separator nor
+length prefix: content i spans offsets[i] to offsets[i + 1], so it can be
+sliced out of the blob without scanning it. loads_columns() decodes
+without copying: the returned columns are memoryviews on the original
+buffer.
+
+Coordinates and confidences are stored as integers (like hOCR does):
+confidences are truncated with int(), so the fractional part of the
+confidences reported by libtesseract (floats) is lost.
+"""
+
+import array
+import struct
+import sys
+
+from .builders import Box, LineBox
+
+__all__ = [
+    'BoxColumns',
+    'LineBoxColumns',
+    'dump',
+    'dumps',
+    'load',
+    'loads',
+    'loads_columns',
+]
+
+MAGIC = b"POCR"
+FORMAT_VERSION = 1
+
+KIND_WORDS = 0
+KIND_LINES = 1
+
+_HEADER = struct.Struct("<4sBBxx")
+_COUNT = struct.Struct("<I")
+
+_BIG_ENDIAN = (sys.byteorder == "big")
+
+
+def _int_array(typecode, values):
+    arr = array.array(typecode, values)
+    assert(arr.itemsize == 4)
+    if _BIG_ENDIAN:  # pragma: no cover
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _int_view(buf, offset, nb_items, typecode):
+    """
+    Returns a view on `nb_items` 32 bits integers stored in `buf` at
+    `offset`. The view shares the memory of `buf` unless the host is
+    big-endian.
+    """
+    end = offset + (4 * nb_items)
+    if end > len(buf):
+        raise ValueError("Truncated box data")
+    if _BIG_ENDIAN:  # pragma: no cover
+        arr = array.array(typecode)
+        arr.frombytes(buf[offset:end])
+        arr.byteswap()
+        return memoryview(arr), end
+    return buf[offset:end].cast(typecode), end
+
+
+def _encode_words(boxes):
+    table = []
+    offsets = [0]
+    texts = []
+    length = 0
+    for box in boxes:
+        ((left, top), (right, bottom)) = box.position
+        table += [int(left), int(top), int(right), int(bottom),
+                  int(box.confidence)]
+        content = box.content.encode("utf-8")
+        texts.append(content)
+        length += len(content)
+        offsets.append(length)
+    return b"".join([
+        _COUNT.pack(len(texts)),
+        _int_array('i', table),
+        _int_array('I', offsets),
+    ] + texts)
+
+
+def dumps(boxes):
+    """
+    Encode a list of Box or a list of LineBox.
+
+    Return:
+        bytes
+    """
+    boxes = list(boxes)
+    if len(boxes) > 0 and isinstance(boxes[0], LineBox):
+        table = []
+        starts = [0]
+        words = []
+        for line in boxes:
+            ((left, top), (right, bottom)) = line.position
+            table += [int(left), int(top), int(right), int(bottom)]
+            words += line.word_boxes
+            starts.append(len(words))
+        return b"".join([
+            _HEADER.pack(MAGIC, FORMAT_VERSION, KIND_LINES),
+            _COUNT.pack(len(boxes)),
+            _int_array('i', table),
+            _int_array('I', starts),
+            _encode_words(words),
+        ])
+    return (
+        _HEADER.pack(MAGIC, FORMAT_VERSION, KIND_WORDS) +
+        _encode_words(boxes)
+    )
+
+
+def dump(boxes, file_descriptor):
+    """
+    Write the encoded `boxes` to `file_descriptor` (opened in binary mode).
+    """
+    file_descriptor.write(dumps(boxes))
+
+
+class BoxColumns(object):
+    """
+    Columnar, read-only view of an encoded list of Box.
+
+    Attributes:
+        left, top, right, bottom, confidence --- sequences of int, one
+            element per box
+        offsets --- sequence of int: boundaries of each content in `text`
+        text --- UTF-8 encoded contents, all concatenated
+    """
+
+    def __init__(self, buf, offset=0):
+        buf = memoryview(buf)
+        (count,) = _COUNT.unpack_from(buf, offset)
+        offset += _COUNT.size
+        (table, offset) = _int_view(buf, offset, 5 * count, 'i')
+        (self.offsets, offset) = _int_view(buf, offset, count + 1, 'I')
+        self.left = table[0::5]
+        self.top = table[1::5]
+        self.right = table[2::5]
+        self.bottom = table[3::5]
+        self.confidence = table[4::5]
+        end = offset + self.offsets[count]
+        if end > len(buf):
+            raise ValueError("Truncated box data")
+        self.text = buf[offset:end]
+        self.end = end
+
+    def __len__(self):
+        return len(self.left)
+
+    def get_content(self, idx):
+        return str(self.text[self.offsets[idx]:self.offsets[idx + 1]],
+                   "utf-8")
+
+    def get_position(self, idx):
+        return ((self.left[idx], self.top[idx]),
+                (self.right[idx], self.bottom[idx]))
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("box index out of range")
+        return Box(self.get_content(idx), self.get_position(idx),
+                   self.confidence[idx])
+
+    def to_boxes(self, start=0, stop=None):
+        if stop is None:
+            stop = len(self)
+        return [self[idx] for idx in range(start, stop)]
+
+
+class LineBoxColumns(object):
+    """
+    Columnar, read-only view of an encoded list of LineBox.
+
+    Attributes:
+        left, top, right, bottom --- sequences of int, one element per line
+        word_starts --- sequence of int: index in `words` of the first word
+            of each line (plus the total number of words)
+        words --- BoxColumns: the words of all the lines
+    """
+
+    def __init__(self, buf, offset=0):
+        buf = memoryview(buf)
+        (count,) = _COUNT.unpack_from(buf, offset)
+        offset += _COUNT.size
+        (table, offset) = _int_view(buf, offset, 4 * count, 'i')
+        (self.word_starts, offset) = _int_view(buf, offset, count + 1, 'I')
+        self.left = table[0::4]
+        self.top = table[1::4]
+        self.right = table[2::4]
+        self.bottom = table[3::4]
+        self.words = BoxColumns(buf, offset)
+        self.end = self.words.end
+
+    def __len__(self):
+        return len(self.left)
+
+    def get_position(self, idx):
+        return ((self.left[idx], self.top[idx]),
+                (self.right[idx], self.bottom[idx]))
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("line index out of range")
+        word_boxes = self.words.to_boxes(self.word_starts[idx],
+                                         self.word_starts[idx + 1])
+        return LineBox(word_boxes, self.get_position(idx))
+
+    def to_lines(self):
+        return [self[idx] for idx in range(0, len(self))]
+
+
+def loads_columns(buf):
+    """
+    Decode `buf` (bytes, bytearray, mmap, ...) without copying it.
+
+    Return:
+        BoxColumns or LineBoxColumns, depending of what was encoded.
+    """
+    buf = memoryview(buf)
+    if len(buf) < _HEADER.size:
+        raise ValueError("Truncated box data")
+    (magic, version, kind) = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not box data (invalid magic: %r)" % bytes(magic))
+    if version != FORMAT_VERSION:
+        raise ValueError("Unsupported box data version: %d" % version)
+    if kind == KIND_WORDS:
+        return BoxColumns(buf, _HEADER.size)
+    elif kind == KIND_LINES:
+        return LineBoxColumns(buf, _HEADER.size)
+    raise ValueError("Unknown box data kind: %d" % kind)
+
+
+def loads(buf):
+    """
+    Decode `buf`.
+
+    Return:
+        A list of Box or a list of LineBox.
+    """
+    columns = loads_columns(buf)
+    if isinstance(columns, LineBoxColumns):
+        return columns.to_lines()
+    return columns.to_boxes()
+
+
+def load(file_descriptor):
+    """
+    Read boxes from `file_descriptor` (opened in binary mode).
+    """
+    return loads(file_descriptor.read())
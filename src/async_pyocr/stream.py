@@ -0,0 +1,228 @@
+"""
+Recognition of a stream of pages, yielding the results as pages finish.
+
+asyncio.gather() over the pages of a document waits for the slowest page
+before returning anything, and needs all the pages decoded up front.
+ocr_stream() takes the pages from an iterable or an asynchronous iterable
+(pages decoded lazily from a PDF or a TIFF file, for instance), keeps at
+most `max_in_flight` of them being recognized, and yields (page index,
+result) as soon as each page is done, in completion order.
+
+Leaving the stream (break, exception, cancellation of the consuming task)
+cancels the pages still being recognized: their tesseract processes are
+stopped and their temporary files removed. Use it as an asynchronous
+context manager to make sure it happens right away:
+
+USAGE:
+ > from pyocr import stream
+ > async with stream.ocr_stream(pages, lang='fra') as results:
+ >     async for (page_index, text) in results:
+ >         print(page_index, text)
+"""
+
+import asyncio
+import functools
+import os
+
+from . import concurrency
+
+__all__ = [
+    'ocr_stream',
+]
+
+
+async def _recognize(tool, page, kwargs):
+    """
+    Recognizes one page with `tool`. Synchronous tools (libtesseract) run
+    in the default executor of the event loop.
+    """
+    if isinstance(page, (str, os.PathLike)):
+        func = tool.image_file_to_string
+    else:
+        func = tool.image_to_string
+    if asyncio.iscoroutinefunction(func):
+        return await func(page, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, page, **kwargs)
+    )
+
+
+async def _anext(pages):
+    return await pages.__anext__()
+
+
+class _Stream(object):
+    """
+    Asynchronous iterator returned by ocr_stream().
+    """
+
+    def __init__(self, pages, tool, builder_factory, max_in_flight,
+                 return_exceptions, kwargs):
+        if hasattr(pages, "__aiter__"):
+            self._pages = pages.__aiter__()
+            self._async_pages = True
+        else:
+            self._pages = iter(pages)
+            self._async_pages = False
+        self.tool = tool
+        self.builder_factory = builder_factory
+        self.max_in_flight = max_in_flight
+        self.return_exceptions = return_exceptions
+        self.kwargs = kwargs
+        # running task --> page index
+        self._tasks = {}
+        # finished tasks not yielded yet: [(page index, task), ...]
+        self._finished = []
+        # task getting the next page from an asynchronous iterable
+        self._next_page = None
+        self._page_index = 0
+        self._exhausted = False
+        self._closed = False
+
+    def _start(self, page):
+        kwargs = dict(self.kwargs)
+        if self.builder_factory is not None:
+            kwargs['builder'] = self.builder_factory()
+        task = asyncio.ensure_future(_recognize(self.tool, page, kwargs))
+        self._tasks[task] = self._page_index
+        self._page_index += 1
+
+    def _fill(self):
+        """
+        Starts the recognition of the next pages while there are free
+        slots.
+        """
+        while (not self._exhausted and self._next_page is None and
+               len(self._tasks) < self.max_in_flight):
+            if self._async_pages:
+                self._next_page = asyncio.ensure_future(_anext(self._pages))
+                return
+            try:
+                page = next(self._pages)
+            except StopIteration:
+                self._exhausted = True
+                return
+            self._start(page)
+
+    async def _wait(self):
+        waited = set(self._tasks)
+        if self._next_page is not None:
+            waited.add(self._next_page)
+        if not waited:
+            raise StopAsyncIteration
+        (done, _) = await asyncio.wait(waited,
+                                       return_when=asyncio.FIRST_COMPLETED)
+        if self._next_page in done:
+            next_page = self._next_page
+            self._next_page = None
+            try:
+                self._start(next_page.result())
+            except StopAsyncIteration:
+                self._exhausted = True
+        self._finished += sorted(
+            (self._tasks.pop(task), task) for task in done
+            if task in self._tasks
+        )
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            while not self._finished:
+                self._fill()
+                await self._wait()
+            self._fill()
+            (page_index, task) = self._finished.pop(0)
+            if task.exception() is not None and not self.return_exceptions:
+                raise task.exception()
+        except BaseException:
+            await self.aclose()
+            raise
+        if task.exception() is not None:
+            return (page_index, task.exception())
+        return (page_index, task.result())
+
+    async def aclose(self):
+        """
+        Cancels the recognition of the pages still running, and waits for
+        the cancellation to complete.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        tasks = list(self._tasks)
+        if self._next_page is not None:
+            tasks.append(self._next_page)
+        self._tasks = {}
+        self._next_page = None
+        self._finished = []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._async_pages and hasattr(self._pages, "aclose"):
+            await self._pages.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+        return False
+
+    def __del__(self):
+        # not closed (left without 'async with'): at least stop the
+        # recognition of the remaining pages
+        for task in getattr(self, "_tasks", {}):
+            try:
+                task.cancel()
+            except RuntimeError:
+                # the event loop is closed
+                pass
+
+
+def ocr_stream(pages, tool=None, builder_factory=None, max_in_flight=None,
+               return_exceptions=False, **kwargs):
+    """
+    Recognizes `pages`, yielding the results as the pages finish.
+
+    Arguments:
+        pages --- iterable or asynchronous iterable of pages: Pillow
+            images, transport.ImageView, preprocessing.Raster or paths of
+            image files (given to image_file_to_string())
+        tool --- OCR tool module (default: tesseract). The calls of
+            synchronous tools (libtesseract) run in the default executor
+        builder_factory --- callable returning a new builder for each page
+            (for instance builders.WordBoxBuilder). Default: the default
+            builder of the tool
+        max_in_flight --- maximum number of pages being recognized at the
+            same time (default: concurrency.get_max_processes(), or the
+            number of CPUs if there is no limit). Pages are taken from
+            `pages` only when there is a free slot
+        return_exceptions --- if True, the exception raised by a page is
+            yielded as its result. Otherwise, it is raised by the stream
+            and the other pages are cancelled
+        kwargs --- other arguments of image_to_string() (lang, oem,
+            variables, preset, triage, rescale, timeout, ...)
+
+    Returns:
+        An asynchronous iterator (and asynchronous context manager)
+        yielding (page index, result) in completion order
+    """
+    if tool is None:
+        from . import tesseract as tool
+    if 'builder' in kwargs:
+        raise ValueError(
+            "builders can't be shared between pages: use builder_factory"
+        )
+    if max_in_flight is None:
+        max_in_flight = (concurrency.get_max_processes() or
+                         os.cpu_count() or 1)
+    if max_in_flight < 1:
+        raise ValueError("Invalid max_in_flight: {}".format(max_in_flight))
+    return _Stream(pages, tool, builder_factory, max_in_flight,
+                   return_exceptions, kwargs)
@@ -0,0 +1,871 @@
+'''
+Stub OCR engines, for offline and deterministic tests and benchmarks.
+
+The stubs replace the OCR engines but not the Python layers of PyOCR:
+
+- StubTesseract and StubCuneiform install fake `tesseract` / `cuneiform`
+  executables (small Python scripts). Image encoding, temporary files,
+  process spawning and output parsing all run as usual. The executables
+  write canned outputs (txt, hOCR, box, tsv) after a configurable latency.
+- StubLibTesseract replaces the ctypes library used by
+  `libtesseract.tesseract_raw`: every call to tesseract_raw still goes
+  through ctypes conversions, but the library functions are implemented in
+  Python and return the canned results.
+
+The canned results are described by a StubPage (generated by default).
+
+USAGE:
+ > from pyocr import libtesseract, stub, tesseract
+ > with stub.StubTesseract(latency=0.05):
+ >     print(await tesseract.image_to_string(image))
+ > with stub.StubLibTesseract():
+ >     print(libtesseract.image_to_string(image))
+
+The fake executables require a POSIX system.
+'''
+
+import ctypes
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+from . import builders
+from . import cuneiform
+from . import tesseract
+from .libtesseract import tesseract_raw
+
+__all__ = [
+    'StubCuneiform',
+    'StubLibTesseract',
+    'StubPage',
+    'StubTesseract',
+]
+
+DEFAULT_LANGUAGES = ("eng", "fra", "osd")
+DEFAULT_TESSERACT_VERSION = "4.1.1"
+DEFAULT_CUNEIFORM_VERSION = "1.1.0"
+
+_WORDS = [
+    "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+    "lorem", "ipsum", "dolor", "sit", "amet", "42", "3.14", "r\xe9sum\xe9",
+]
+
+
+class StubPage(object):
+    """
+    Canned recognition result of a page: the lines and words the stub
+    engines report, whatever the input image is.
+    """
+
+    def __init__(self, lines, size=(2480, 3508), orientation=(0, 10.0),
+                 deskew_angle=0.0):
+        """
+        Arguments:
+            lines --- list of builders.LineBox
+            size --- (width, height) of the page
+            orientation --- (angle, confidence) reported by the orientation
+                detection
+            deskew_angle --- skew (in radians) reported by the layout
+                analysis
+        """
+        self.lines = lines
+        self.size = size
+        self.orientation = orientation
+        self.deskew_angle = deskew_angle
+
+    @staticmethod
+    def generate(nb_lines=40, nb_words=10, size=(2480, 3508), seed=0):
+        """
+        Generate a page of `nb_lines` lines of `nb_words` words each.
+        The same arguments always give the same page.
+        """
+        rng = random.Random(seed)
+        (width, height) = size
+        margin = width // 12
+        line_height = (height - (2 * margin)) // max(nb_lines, 1)
+        word_width = (width - (2 * margin)) // max(nb_words, 1)
+        lines = []
+        for line_idx in range(nb_lines):
+            top = margin + (line_idx * line_height)
+            bottom = top + (line_height * 2 // 3)
+            word_boxes = []
+            for word_idx in range(nb_words):
+                left = margin + (word_idx * word_width)
+                right = left + (word_width * 4 // 5)
+                word_boxes.append(builders.Box(
+                    rng.choice(_WORDS), ((left, top), (right, bottom)),
+                    rng.randint(60, 99)
+                ))
+            lines.append(builders.LineBox(
+                word_boxes,
+                ((margin, top), (word_boxes[-1].position[1][0], bottom))
+            ))
+        return StubPage(lines, size)
+
+    @property
+    def words(self):
+        return [word for line in self.lines for word in line.word_boxes]
+
+    def get_text(self):
+        return "\n".join([line.content for line in self.lines]) + "\n"
+
+    def get_hocr(self):
+        output = io.StringIO()
+        builders.LineBoxBuilder.write_file(output, self.lines)
+        return output.getvalue()
+
+    def get_char_boxes(self):
+        """
+        Return:
+            The characters of the page, as a list of builders.Box (the
+            width of each word is split evenly between its characters).
+        """
+        return [box for word in self.words for box in _char_boxes(word)]
+
+    def get_box_file_char_boxes(self):
+        """
+        Return:
+            Same as get_char_boxes(), in the coordinates of the Tesseract
+            box files (origin at the bottom left of the page), as returned
+            by tesseract.CharBoxBuilder.
+        """
+        return [
+            builders.Box(box.content, tesseract.CharBoxBuilder.flip_position(
+                box.position, self.size[1]
+            ), box.confidence)
+            for box in self.get_char_boxes()
+        ]
+
+    def get_box(self):
+        output = io.StringIO()
+        tesseract.CharBoxBuilder.write_file(output,
+                                            self.get_box_file_char_boxes())
+        return output.getvalue()
+
+    def get_tsv(self):
+        rows = [
+            "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t"
+            "left\ttop\twidth\theight\tconf\ttext",
+            "1\t1\t0\t0\t0\t0\t0\t0\t%d\t%d\t-1\t" % self.size,
+        ]
+        for (line_idx, line) in enumerate(self.lines, start=1):
+            ((left, top), (right, bottom)) = line.position
+            rows.append("4\t1\t1\t1\t%d\t0\t%d\t%d\t%d\t%d\t-1\t" % (
+                line_idx, left, top, right - left, bottom - top
+            ))
+            for (word_idx, word) in enumerate(line.word_boxes, start=1):
+                ((left, top), (right, bottom)) = word.position
+                rows.append("5\t1\t1\t1\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%s" % (
+                    line_idx, word_idx, left, top, right - left,
+                    bottom - top, word.confidence, word.content
+                ))
+        return "\n".join(rows) + "\n"
+
+    def get_osd(self):
+        (angle, confidence) = self.orientation
+        # Tesseract reports the rotation to apply, not the orientation
+        return (
+            "Page number: 0\n"
+            "Orientation in degrees: {}\n"
+            "Rotate: {}\n"
+            "Orientation confidence: {:.2f}\n"
+            "Script: Latin\n"
+            "Script confidence: 10.00\n"
+        ).format((360 - angle) % 360, (360 - angle) % 360, confidence)
+
+
+_SCRIPT = r'''#!{python}
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(BASE_DIR, "stub.json"), encoding="utf-8") as fd:
+    CONFIG = json.load(fd)
+
+
+def output(name):
+    with open(os.path.join(BASE_DIR, name), encoding="utf-8") as fd:
+        return fd.read()
+
+
+def write(path, content):
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write(content)
+
+
+def tesseract(args):
+    if args[:1] in (["-v"], ["--version"]):
+        print("tesseract " + CONFIG["version"])
+        print(" leptonica-1.78.0")
+        return 0
+    if args[:1] == ["--list-langs"]:
+        print("List of available languages (%d):" % len(CONFIG["languages"]))
+        for lang in CONFIG["languages"]:
+            print(lang)
+        return 0
+    if len(args) < 2:
+        print("Usage: tesseract imagename outputbase [options...]")
+        return 1
+    (input_path, output_base) = args[:2]
+    if not os.path.exists(input_path):
+        print("Error, cannot read input file " + input_path)
+        return 1
+    options = args[2:]
+    configs = []
+    psm = None
+    idx = 0
+    while idx < len(options):
+        if options[idx] in ("-l", "--psm", "-psm", "--oem", "-c"):
+            if options[idx] in ("--psm", "-psm"):
+                psm = options[idx + 1]
+            idx += 2
+            continue
+        configs.append(options[idx])
+        idx += 1
+    time.sleep(CONFIG["latency"])
+    if psm == "0":
+        content = output("page.osd")
+        if output_base == "stdout":
+            sys.stdout.write(content)
+        else:
+            write(output_base + ".osd", content)
+        return 0
+    if "hocr" in configs:
+        (extension, name) = ("hocr", "page.hocr")
+    elif "makebox" in configs:
+        (extension, name) = ("box", "page.box")
+    elif "tsv" in configs:
+        (extension, name) = ("tsv", "page.tsv")
+    else:
+        (extension, name) = ("txt", "page.txt")
+    if output_base == "stdout":
+        sys.stdout.write(output(name))
+    else:
+        write(output_base + "." + extension, output(name))
+    return 0
+
+
+def cuneiform(args):
+    if args == []:
+        print("Cuneiform for Linux " + CONFIG["version"])
+        return 0
+    if args == ["-l"]:
+        print("Cuneiform for Linux " + CONFIG["version"])
+        print("Supported languages: " + " ".join(CONFIG["languages"]) + ".")
+        return 0
+    output_format = args[args.index("-f") + 1] if "-f" in args else "text"
+    output_path = args[args.index("-o") + 1]
+    if args[-1] == "-":
+        sys.stdin.buffer.read()
+    elif not os.path.exists(args[-1]):
+        print("Failed to load image " + args[-1])
+        return 1
+    time.sleep(CONFIG["latency"])
+    if output_format == "hocr":
+        write(output_path, output("page.hocr"))
+    else:
+        write(output_path, output("page.txt"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(globals()[CONFIG["engine"]](sys.argv[1:]))
+'''
+
+
+class _StubExecutable(object):
+    module = None
+    engine = None
+
+    def __init__(self, page=None, latency=0.0, version=None,
+                 languages=DEFAULT_LANGUAGES):
+        """
+        Arguments:
+            page --- StubPage: results returned by the executable (default:
+                StubPage.generate())
+            latency --- time (in seconds) spent by each run of the
+                executable before writing its output
+            version --- version reported by the executable
+            languages --- languages reported by the executable
+        """
+        self.page = page if page is not None else StubPage.generate()
+        self.latency = latency
+        self.version = version
+        self.languages = list(languages)
+        self.tmpdir = None
+        self.path = None
+        self._previous_cmd = None
+
+    def _get_cmd(self):  # pragma: no cover
+        raise NotImplementedError()
+
+    def _set_cmd(self, cmd):  # pragma: no cover
+        raise NotImplementedError()
+
+    def start(self):
+        """
+        Write the executable and its outputs in a temporary directory, and
+        make PyOCR use it.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="pyocr_stub_")
+        self.path = os.path.join(self.tmpdir, self.engine)
+        config = {
+            "engine": self.engine,
+            "latency": self.latency,
+            "version": self.version,
+            "languages": self.languages,
+        }
+        outputs = {
+            "stub.json": json.dumps(config),
+            "page.txt": self.page.get_text(),
+            "page.hocr": self.page.get_hocr(),
+            "page.box": self.page.get_box(),
+            "page.tsv": self.page.get_tsv(),
+            "page.osd": self.page.get_osd(),
+        }
+        for (name, content) in outputs.items():
+            with open(os.path.join(self.tmpdir, name), "w",
+                      encoding="utf-8") as fd:
+                fd.write(content)
+        with open(self.path, "w", encoding="utf-8") as fd:
+            fd.write(_SCRIPT.replace("{python}", sys.executable, 1))
+        os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IXUSR)
+        self._previous_cmd = self._get_cmd()
+        self._set_cmd(self.path)
+        return self
+
+    def stop(self):
+        """
+        Restore the previous executable and remove the stub.
+        """
+        if self.tmpdir is None:
+            return
+        self._set_cmd(self._previous_cmd)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        self.tmpdir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class StubTesseract(_StubExecutable):
+    """
+    Fake `tesseract` executable. While started, tesseract.TESSERACT_CMD
+    points to it.
+    """
+    engine = "tesseract"
+
+    def __init__(self, page=None, latency=0.0,
+                 version=DEFAULT_TESSERACT_VERSION,
+                 languages=DEFAULT_LANGUAGES):
+        super(StubTesseract, self).__init__(page, latency, version,
+                                            languages)
+
+    def _get_cmd(self):
+        return tesseract.TESSERACT_CMD
+
+    def _set_cmd(self, cmd):
+        tesseract.TESSERACT_CMD = cmd
+
+
+class StubCuneiform(_StubExecutable):
+    """
+    Fake `cuneiform` executable. While started, cuneiform.CUNEIFORM_CMD
+    points to it.
+    """
+    engine = "cuneiform"
+
+    def __init__(self, page=None, latency=0.0,
+                 version=DEFAULT_CUNEIFORM_VERSION,
+                 languages=DEFAULT_LANGUAGES):
+        super(StubCuneiform, self).__init__(page, latency, version,
+                                            languages)
+
+    def _get_cmd(self):
+        return cuneiform.CUNEIFORM_CMD
+
+    def _set_cmd(self, cmd):
+        cuneiform.CUNEIFORM_CMD = cmd
+
+
+def _char_boxes(word):
+    """
+    Split the box of `word` evenly between its characters.
+    """
+    ((left, top), (right, bottom)) = word.position
+    char_width = (right - left) // max(len(word.content), 1)
+    boxes = []
+    for (idx, char) in enumerate(word.content):
+        char_left = left + (idx * char_width)
+        boxes.append(builders.Box(
+            char, ((char_left, top), (char_left + char_width, bottom)),
+            word.confidence
+        ))
+    return boxes
+
+
+def _char_choices(char, confidence):
+    """
+    Alternatives reported by StubLibTesseract for a character: the
+    character itself, then its other case (or "?"), with half the
+    confidence.
+    """
+    other = char.swapcase() if char.swapcase() != char else "?"
+    return [(char, float(confidence)), (other, confidence / 2.0)]
+
+
+def _union(position_a, position_b):
+    ((left_a, top_a), (right_a, bottom_a)) = position_a
+    ((left_b, top_b), (right_b, bottom_b)) = position_b
+    return (
+        (min(left_a, left_b), min(top_a, top_b)),
+        (max(right_a, right_b), max(bottom_a, bottom_b)),
+    )
+
+
+def _center(position):
+    ((left, top), (right, bottom)) = position
+    return ((left + right) // 2, (top + bottom) // 2)
+
+
+class _StubIterator(object):
+    def __init__(self, words):
+        self.index = 0
+        # index of the current character in the current word
+        self.symbol = 0
+        self.words = words
+
+    def get_symbols(self):
+        return _char_boxes(self.words[self.index][1])
+
+
+class _StubChoiceIterator(object):
+    def __init__(self, choices):
+        self.index = 0
+        self.choices = choices
+
+
+class _StubHandle(object):
+    def __init__(self):
+        self.lang = None
+        self.oem = None
+        self.variables = {}
+        self.page_seg_mode = None
+        self.image = None
+        self.dpi = None
+        self.rectangle = None
+        self.recognized = False
+        self.languages = None
+
+
+class StubLibTesseract(object):
+    """
+    Python implementation of the functions of libtesseract used by
+    tesseract_raw. While started, it replaces tesseract_raw.g_libtesseract.
+
+    Handles, iterators and strings returned to tesseract_raw are real
+    ctypes values (addresses, pointers), so tesseract_raw runs unchanged.
+    """
+
+    def __init__(self, page=None, latency=0.0,
+                 version=DEFAULT_TESSERACT_VERSION,
+                 languages=DEFAULT_LANGUAGES, lines_per_block=None,
+                 block_types=None):
+        """
+        Arguments:
+            page --- StubPage: results returned (default:
+                StubPage.generate())
+            latency --- time (in seconds) spent in each call to
+                TessBaseAPIRecognize() on the whole image (proportional to
+                the area of the rectangle if one is set)
+            version --- version reported by TessVersion()
+            languages --- languages reported by the library
+            lines_per_block --- number of lines in each text block found
+                by the layout analysis (None: a single block covering the
+                whole page)
+            block_types --- type of each block
+                (tesseract_raw.PolyBlockType, default: FLOWING_TEXT)
+        """
+        self.page = page if page is not None else StubPage.generate()
+        self.latency = latency
+        self.version = version
+        self.languages = list(languages)
+        self.lines_per_block = lines_per_block
+        self.block_types = block_types
+        # position of each block
+        self.blocks = []
+        # (line, word, first word of the line, last word of the line,
+        # index of the block)
+        self._words = []
+        for (line_idx, line) in enumerate(self.page.lines):
+            if lines_per_block is None:
+                block_idx = 0
+                if not self.blocks:
+                    self.blocks.append(((0, 0), self.page.size))
+            else:
+                block_idx = line_idx // lines_per_block
+                if block_idx >= len(self.blocks):
+                    self.blocks.append(line.position)
+                else:
+                    self.blocks[block_idx] = _union(self.blocks[block_idx],
+                                                    line.position)
+            for (idx, word) in enumerate(line.word_boxes):
+                self._words.append((line, word, idx == 0,
+                                    idx == len(line.word_boxes) - 1,
+                                    block_idx))
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._handles = {}
+        self._iterators = {}
+        self._texts = {}
+        self._previous_lib = None
+        self._started = False
+
+    def start(self):
+        self._previous_lib = tesseract_raw.g_libtesseract
+        tesseract_raw.g_libtesseract = self
+        self._started = True
+        return self
+
+    def stop(self):
+        if not self._started:
+            return
+        tesseract_raw.g_libtesseract = self._previous_lib
+        self._started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def nb_handles(self):
+        """
+        Number of handles created and not deleted yet.
+        """
+        return len(self._handles)
+
+    def _new_id(self, table, obj):
+        with self._lock:
+            obj_id = next(self._ids)
+            table[obj_id] = obj
+        return obj_id
+
+    @staticmethod
+    def _value(arg):
+        if isinstance(arg, (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int,
+                            ctypes.c_bool, ctypes.c_size_t)):
+            return arg.value
+        return arg
+
+    def _handle(self, handle):
+        return self._handles[self._value(handle)]
+
+    def _iterator(self, iterator):
+        return self._iterators[self._value(iterator)]
+
+    def _new_text(self, text):
+        buf = ctypes.create_string_buffer(text.encode("utf-8"))
+        address = ctypes.addressof(buf)
+        with self._lock:
+            self._texts[address] = buf
+        return address
+
+    # library
+
+    def TessVersion(self):
+        return self.version.encode("utf-8")
+
+    def TessDeleteText(self, ptr):
+        with self._lock:
+            self._texts.pop(self._value(ptr), None)
+
+    # TessBaseAPI
+
+    def TessBaseAPICreate(self):
+        return self._new_id(self._handles, _StubHandle())
+
+    def TessBaseAPIDelete(self, handle):
+        with self._lock:
+            self._handles.pop(self._value(handle))
+
+    def TessBaseAPIInit3(self, handle, datapath, lang):
+        lang = self._value(lang)
+        lang = lang.decode("utf-8") if lang else "eng"
+        for lang_item in lang.split("+"):
+            if lang_item not in self.languages:
+                return -1
+        self._handle(handle).lang = lang
+        return 0
+
+    def TessBaseAPIInit1(self, handle, datapath, lang, oem, configs,
+                         configs_size):
+        self._handle(handle).oem = self._value(oem)
+        return self.TessBaseAPIInit3(handle, datapath, lang)
+
+    def TessBaseAPIInit4(self, handle, datapath, lang, oem, configs,
+                         configs_size, vars_vec, vars_values, vars_vec_size,
+                         set_only_non_debug_params):
+        variables = self._handle(handle).variables
+        for idx in range(self._value(vars_vec_size)):
+            variables[vars_vec[idx]] = vars_values[idx]
+        return self.TessBaseAPIInit1(handle, datapath, lang, oem, configs,
+                                     configs_size)
+
+    def TessBaseAPIGetDatapath(self, handle):
+        return b""
+
+    def TessBaseAPISetVariable(self, handle, name, value):
+        name = self._value(name)
+        self._handle(handle).variables[name] = self._value(value)
+        return True
+
+    def TessBaseAPIGetAvailableLanguagesAsVector(self, handle):
+        langs = [lang.encode("utf-8") for lang in self.languages]
+        vector = (ctypes.c_char_p * (len(langs) + 1))(*(langs + [None]))
+        # keep it alive as long as the handle
+        self._handle(handle).languages = vector
+        return vector
+
+    def TessBaseAPISetPageSegMode(self, handle, mode):
+        self._handle(handle).page_seg_mode = self._value(mode)
+
+    def TessBaseAPIInitForAnalysePage(self, handle):
+        pass
+
+    def TessBaseAPISetImage(self, handle, imagedata, width, height,
+                            bytes_per_pixel, bytes_per_line):
+        (width, height, bytes_per_pixel, bytes_per_line) = [
+            self._value(arg)
+            for arg in (width, height, bytes_per_pixel, bytes_per_line)
+        ]
+        if len(imagedata) < bytes_per_line * height:
+            raise ValueError("Image buffer too small")
+        handle = self._handle(handle)
+        handle.image = (width, height, bytes_per_pixel)
+        handle.rectangle = None
+        handle.recognized = False
+
+    def TessBaseAPISetSourceResolution(self, handle, dpi):
+        self._handle(handle).dpi = self._value(dpi)
+
+    def TessBaseAPISetRectangle(self, handle, left, top, width, height):
+        handle = self._handle(handle)
+        handle.rectangle = tuple(
+            self._value(arg) for arg in (left, top, width, height)
+        )
+        handle.recognized = False
+
+    def TessBaseAPIRecognize(self, handle, monitor):
+        handle = self._handle(handle)
+        if handle.image is None:
+            return -1
+        if self.latency:
+            latency = self.latency
+            if handle.rectangle is not None:
+                (page_width, page_height) = self.page.size
+                latency *= min(
+                    1.0, (handle.rectangle[2] * handle.rectangle[3]) /
+                    (page_width * page_height)
+                )
+            time.sleep(latency)
+        handle.recognized = True
+        return 0
+
+    def TessBaseAPIGetUTF8Text(self, handle):
+        return self._new_text(self.page.get_text())
+
+    def TessBaseAPIGetIterator(self, handle):
+        handle = self._handle(handle)
+        if not handle.recognized:
+            return None
+        words = self._words
+        if handle.rectangle is not None:
+            # the words whose center is in the rectangle
+            (left, top, width, height) = handle.rectangle
+            words = [
+                item for item in words
+                if left <= _center(item[1].position)[0] < left + width and
+                top <= _center(item[1].position)[1] < top + height
+            ]
+            if not words:
+                return None
+        return self._new_id(self._iterators, _StubIterator(words))
+
+    def TessBaseAPIAnalyseLayout(self, handle):
+        if self._handle(handle).image is None:
+            return None
+        return self._new_id(self._iterators, _StubIterator(self._words))
+
+    def TessBaseAPIDetectOrientationScript(self, handle, orient_deg,
+                                           orient_conf, script_name,
+                                           script_conf):
+        if self._handle(handle).image is None:
+            return False
+        (angle, confidence) = self.page.orientation
+        orient_deg._obj.value = angle
+        orient_conf._obj.value = confidence
+        return True
+
+    # TessPageIterator / TessResultIterator
+
+    def TessResultIteratorGetPageIterator(self, iterator):
+        return self._value(iterator)
+
+    def TessPageIteratorDelete(self, iterator):
+        with self._lock:
+            self._iterators.pop(self._value(iterator), None)
+
+    TessResultIteratorDelete = TessPageIteratorDelete
+
+    def TessPageIteratorNext(self, iterator, level):
+        iterator = self._iterator(iterator)
+        level = self._value(level)
+        if (level == tesseract_raw.PageIteratorLevel.SYMBOL and
+                iterator.index < len(iterator.words) and
+                iterator.symbol + 1 < len(iterator.get_symbols())):
+            iterator.symbol += 1
+            return True
+        iterator.symbol = 0
+        if level <= tesseract_raw.PageIteratorLevel.TEXTLINE:
+            # skip the remaining words of the line
+            while (iterator.index < len(iterator.words) and
+                   not iterator.words[iterator.index][3]):
+                iterator.index += 1
+        if level <= tesseract_raw.PageIteratorLevel.PARA:
+            # skip the remaining words of the block
+            while (iterator.index + 1 < len(iterator.words) and
+                   iterator.words[iterator.index + 1][4] ==
+                   iterator.words[iterator.index][4]):
+                iterator.index += 1
+        iterator.index += 1
+        return iterator.index < len(iterator.words)
+
+    def TessPageIteratorIsAtBeginningOf(self, iterator, level):
+        iterator = self._iterator(iterator)
+        level = self._value(level)
+        if iterator.index >= len(iterator.words):
+            return False
+        if level < tesseract_raw.PageIteratorLevel.SYMBOL and iterator.symbol:
+            return False
+        if level <= tesseract_raw.PageIteratorLevel.PARA:
+            return (iterator.index == 0 or
+                    iterator.words[iterator.index - 1][4] !=
+                    iterator.words[iterator.index][4])
+        if level == tesseract_raw.PageIteratorLevel.TEXTLINE:
+            return iterator.words[iterator.index][2]
+        return True
+
+    def TessPageIteratorIsAtFinalElement(self, iterator, level, element):
+        iterator = self._iterator(iterator)
+        level = self._value(level)
+        if iterator.index >= len(iterator.words):
+            return True
+        if level <= tesseract_raw.PageIteratorLevel.PARA:
+            return (iterator.index == len(iterator.words) - 1 or
+                    iterator.words[iterator.index + 1][4] !=
+                    iterator.words[iterator.index][4])
+        if level == tesseract_raw.PageIteratorLevel.TEXTLINE:
+            return iterator.words[iterator.index][3]
+        if (level == tesseract_raw.PageIteratorLevel.WORD and
+                self._value(element) ==
+                tesseract_raw.PageIteratorLevel.SYMBOL):
+            return iterator.symbol + 1 >= len(iterator.get_symbols())
+        return True
+
+    def TessPageIteratorBlockType(self, iterator):
+        iterator = self._iterator(iterator)
+        if iterator.index >= len(iterator.words):
+            return tesseract_raw.PolyBlockType.UNKNOWN
+        block_idx = iterator.words[iterator.index][4]
+        if self.block_types is None:
+            return tesseract_raw.PolyBlockType.FLOWING_TEXT
+        return self.block_types[block_idx]
+
+    def TessPageIteratorBoundingBox(self, iterator, level, left, top, right,
+                                    bottom):
+        iterator = self._iterator(iterator)
+        level = self._value(level)
+        if iterator.index >= len(iterator.words):
+            return False
+        (line, word, _, _, block_idx) = iterator.words[iterator.index]
+        if level <= tesseract_raw.PageIteratorLevel.PARA:
+            position = self.blocks[block_idx]
+        elif level == tesseract_raw.PageIteratorLevel.TEXTLINE:
+            position = line.position
+        elif level == tesseract_raw.PageIteratorLevel.WORD:
+            position = word.position
+        else:
+            position = iterator.get_symbols()[iterator.symbol].position
+        ((left.contents.value, top.contents.value),
+         (right.contents.value, bottom.contents.value)) = position
+        return True
+
+    def TessPageIteratorOrientation(self, iterator, orientation,
+                                    writing_direction, textline_order,
+                                    deskew_angle):
+        orientation.contents.value = 0
+        writing_direction.contents.value = 0
+        textline_order.contents.value = 0
+        deskew_angle.contents.value = self.page.deskew_angle
+
+    def TessResultIteratorGetUTF8Text(self, iterator, level):
+        iterator = self._iterator(iterator)
+        level = self._value(level)
+        if iterator.index >= len(iterator.words):
+            return None
+        (line, word, _, _, _) = iterator.words[iterator.index]
+        if level == tesseract_raw.PageIteratorLevel.TEXTLINE:
+            return self._new_text(line.content + "\n")
+        if level == tesseract_raw.PageIteratorLevel.SYMBOL:
+            return self._new_text(word.content[iterator.symbol])
+        return self._new_text(word.content)
+
+    def TessResultIteratorConfidence(self, iterator, level):
+        iterator = self._iterator(iterator)
+        if iterator.index >= len(iterator.words):
+            return 0.0
+        return float(iterator.words[iterator.index][1].confidence)
+
+    def TessResultIteratorGetChoiceIterator(self, iterator):
+        iterator = self._iterator(iterator)
+        if iterator.index >= len(iterator.words):
+            return None
+        symbol = iterator.get_symbols()[iterator.symbol]
+        return self._new_id(self._iterators, _StubChoiceIterator(
+            _char_choices(symbol.content, symbol.confidence)
+        ))
+
+    # TessChoiceIterator
+
+    def TessChoiceIteratorDelete(self, iterator):
+        with self._lock:
+            self._iterators.pop(self._value(iterator), None)
+
+    def TessChoiceIteratorNext(self, iterator):
+        iterator = self._iterator(iterator)
+        iterator.index += 1
+        return iterator.index < len(iterator.choices)
+
+    def TessChoiceIteratorGetUTF8Text(self, iterator):
+        iterator = self._iterator(iterator)
+        return iterator.choices[iterator.index][0].encode("utf-8")
+
+    def TessChoiceIteratorConfidence(self, iterator):
+        iterator = self._iterator(iterator)
+        return iterator.choices[iterator.index][1]
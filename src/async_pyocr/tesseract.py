@@ -17,40 +17,62 @@ https://gitlab.gnome.org/World/OpenPaperwork/pyocr#readme
 
 import asyncio
 import codecs
+import errno
 import logging
 import os
+import shlex
 import shutil
+import signal
 import subprocess
 import sys
 import tempfile
 
+from PIL import Image
+
 from . import builders
+from . import concurrency
+from . import instrumentation
+from . import presets
+from . import scaling
 from .builders import DigitBuilder  # backward compatibility
 from .error import TesseractError  # backward compatibility
+from .error import TesseractTimeoutError
 from .util import digits_only
+from .util import format_variable
+from .util import to_pil
 
 # CHANGE THIS IF TESSERACT IS NOT IN YOUR PATH, OR IS NAMED DIFFERENTLY
 TESSERACT_CMD = 'tesseract.exe' if os.name == 'nt' else 'tesseract'
 
 TESSDATA_EXTENSION = ".traineddata"
 
+# time (in seconds) given to Tesseract to exit once asked to (timeout or
+# cancellation), before it is killed
+TERMINATE_TIMEOUT = 2.0
+
 logger = logging.getLogger(__name__)
 
 g_subprocess_startup_info = None
 g_creation_flags = 0
 
+# (TESSERACT_CMD, version): see _aget_version()
+g_version = None
+
 __all__ = [
     'CharBoxBuilder',
     'DigitBuilder',
     'can_detect_orientation',
     'detect_orientation',
+    'detect_orientation_file',
     'get_available_builders',
     'get_available_languages',
     'get_name',
     'get_version',
+    'image_file_to_string',
     'image_to_string',
     'is_available',
     'TesseractError',
+    'TesseractTimeoutError',
 ]
 
 
@@ -58,8 +80,19 @@ class CharBoxBuilder(builders.BaseBuilder):
     """
     If passed to image_to_string(), image_to_string() will return an array of
     Box. Each box correspond to a character recognized in the image.
+
+    Tesseract writes the boxes with its 'makebox' configuration (no
+    confidence). Libtesseract reads them, with their confidence, from the
+    results of the recognition.
+
+    With both, the positions are the ones of the Tesseract box files:
+    ((left, bottom), (right, top)), with the origin at the bottom left of
+    the image (the other builders have their origin at the top left).
+    Libtesseract sets `image_height` to convert the boxes it reads.
     """
 
+    needs_symbols = True
+
     def __init__(self):
         file_ext = ["box"]
         tess_flags = []
@@ -68,6 +101,20 @@ class CharBoxBuilder(builders.BaseBuilder):
         super(CharBoxBuilder, self).__init__(file_ext, tess_flags, tess_conf,
                                              cun_args)
         self.tesseract_layout = 1
+        self.char_boxes = []
+        # height of the image given to libtesseract: the boxes given to
+        # add_symbol() have their origin at the top left
+        self.image_height = None
+
+    @staticmethod
+    def flip_position(position, image_height):
+        """
+        Converts a position with its origin at the top left of the image
+        to the coordinates of the box files (origin at the bottom left),
+        and back.
+        """
+        ((left, top), (right, bottom)) = position
+        return ((left, image_height - bottom), (right, image_height - top))
 
     @staticmethod
     def read_file(file_descriptor):
@@ -77,18 +124,20 @@ class CharBoxBuilder(builders.BaseBuilder):
         Return:
             An array of Box.
         """
-        boxes = []  # note that the order of the boxes may matter to the caller
-        for line in file_descriptor.readlines():
-            line = line.strip()
-            if line == "":
-                continue
-            elements = line.split(" ")
-            if len(elements) < 6:
-                continue
-            position = ((int(elements[1]), int(elements[2])),
-                        (int(elements[3]), int(elements[4])))
-            box = builders.Box(elements[0], position)
-            boxes.append(box)
+        with instrumentation.span("builder.read_file"):
+            # note that the order of the boxes may matter to the caller
+            boxes = []
+            for line in file_descriptor.readlines():
+                line = line.strip()
+                if line == "":
+                    continue
+                elements = line.split(" ")
+                if len(elements) < 6:
+                    continue
+                position = ((int(elements[1]), int(elements[2])),
+                            (int(elements[3]), int(elements[4])))
+                box = builders.Box(elements[0], position)
+                boxes.append(box)
         return boxes
 
     @staticmethod
@@ -103,6 +152,23 @@ class CharBoxBuilder(builders.BaseBuilder):
         for box in boxes:
             file_descriptor.write(str(box) + " 0\n")
 
+    def start_line(self, box):
+        pass
+
+    def add_word(self, word, box, confidence=0):
+        pass
+
+    def add_symbol(self, symbol, box, confidence=0):
+        if self.image_height is not None:
+            box = self.flip_position(box, self.image_height)
+        self.char_boxes.append(builders.Box(symbol, box, confidence))
+
+    def end_line(self):
+        pass
+
+    def get_output(self):
+        return self.char_boxes
+
     def __str__(self):
         return "Character boxes"
 
@@ -181,50 +247,106 @@ def detect_orientation(image, lang=None):
     """
     _set_environment()
     with tempfile.TemporaryDirectory() as tmpdir:
-        command = [TESSERACT_CMD, "input.bmp", 'stdout', psm_parameter(), "0"]
-        version = get_version()
-        if lang is not None:
-            if version[0] < 4:
-                command += ['-l', lang]
-            else:
-                command += ['-l', 'osd']
+        _save_image(image, os.path.join(tmpdir, "input.bmp"))
+        return _detect_orientation(tmpdir, "input.bmp", lang)
 
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        image.save(os.path.join(tmpdir, "input.bmp"))
 
-        proc = subprocess.Popen(command, stdin=subprocess.PIPE, shell=False,
-                                startupinfo=g_subprocess_startup_info,
-                                creationflags=g_creation_flags,
-                                cwd=tmpdir,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-        proc.stdin.close()
-        original_output = proc.stdout.read()
-        proc.wait()
+def detect_orientation_file(path, lang=None):
+    """
+    Same as detect_orientation(), but on an image file. The file is given
+    as-is to Tesseract: it is not decoded nor re-encoded.
 
-        original_output = original_output.decode("utf-8")
-        original_output = original_output.strip()
+    Arguments:
+        path --- path of the image file to analyze (any format supported by
+            Tesseract)
+        lang --- lang to specify to tesseract
+    """
+    _set_environment()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_filename = _link_input_file(path, tmpdir)
+        return _detect_orientation(tmpdir, input_filename, lang)
 
-        if "Could not initialize tesseract" in original_output:
-            raise TesseractError(-1, "Error initializing tesseract: %s"
-                                 % original_output)
 
+def _save_image(image, path):
+    """
+    Writes `image` (Pillow image) in the BMP file `path`, with its
+    resolution (Pillow writes 96 dpi otherwise, and Tesseract trusts it).
+    """
+    dpi = scaling.get_dpi(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(path, dpi=(dpi, dpi))
+
+
+def _link_input_file(path, tmpdir):
+    """
+    Make the file `path` available in `tmpdir` without copying it if
+    possible (hard link, or symbolic link).
+
+    Returns:
+        The file name of the input in `tmpdir`
+    """
+    extension = os.path.splitext(path)[1]
+    if not extension[1:].isalnum():
+        extension = ""
+    input_filename = "input" + extension
+    link_path = os.path.join(tmpdir, input_filename)
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            errno.ENOENT, os.strerror(errno.ENOENT), path
+        )
+    for link in (os.link, os.symlink):
         try:
-            output = original_output.split("\n")
-            output = [line.split(": ", 1) for line in output if (": " in line)]
-            output = {x: y for (x, y) in output}
-            angle = int(output.get('Rotate', output['Orientation in degrees']))
-            # Tesseract reports the angle in the opposite direction the one we
-            # want
-            angle = (360 - angle) % 360
-            return {
-                'angle': angle,
-                'confidence': float(output['Orientation confidence']),
-            }
-        except Exception as ex:
-            raise TesseractError(-1, "No script found in image (%s - %s)"
-                                 % (str(ex), original_output))
+            link(path, link_path)
+            return input_filename
+        except (OSError, NotImplementedError):
+            continue
+    shutil.copyfile(path, link_path)  # pragma: no cover
+    return input_filename  # pragma: no cover
+
+
+def _detect_orientation(tmpdir, input_filename, lang):
+    command = [TESSERACT_CMD, input_filename, 'stdout', psm_parameter(), "0"]
+    version = get_version()
+    if lang is not None:
+        if version[0] < 4:
+            command += ['-l', lang]
+        else:
+            command += ['-l', 'osd']
+
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, shell=False,
+                            startupinfo=g_subprocess_startup_info,
+                            creationflags=g_creation_flags,
+                            cwd=tmpdir,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    proc.stdin.close()
+    original_output = proc.stdout.read()
+    proc.wait()
+
+    original_output = original_output.decode("utf-8")
+    original_output = original_output.strip()
+
+    if "Could not initialize tesseract" in original_output:
+        raise TesseractError(-1, "Error initializing tesseract: %s"
+                             % original_output)
+
+    try:
+        output = original_output.split("\n")
+        output = [line.split(": ", 1) for line in output if (": " in line)]
+        output = {x: y for (x, y) in output}
+        angle = int(output.get('Rotate', output['Orientation in degrees']))
+        # Tesseract reports the angle in the opposite direction the one we
+        # want
+        angle = (360 - angle) % 360
+        return {
+            'angle': angle,
+            'confidence': float(output['Orientation confidence']),
+        }
+    except Exception as ex:
+        raise TesseractError(-1, "No script found in image (%s - %s)"
+                             % (str(ex), original_output))
 
 
 def get_name():
@@ -239,11 +361,12 @@ def get_available_builders():
         CharBoxBuilder,
         builders.DigitBuilder,
         builders.DigitLineBoxBuilder,
+        builders.PageBuilder,
     ]
 
 
 async def run_tesseract(input_filename, output_filename_base, cwd=None, lang=None,
-                        flags=None, configs=None):
+                        flags=None, configs=None, env=None, timeout=None):
     '''
     Runs Tesseract:
         `TESSERACT_CMD` \
@@ -261,9 +384,22 @@ async def run_tesseract(input_filename, output_filename_base, cwd=None, lang=Non
         lang --- Tesseract language to use (if None, none will be specified)
         config --- List of Tesseract configs to use (if None, none will be
             specified)
+        env --- environment of the Tesseract process (if None, the one of
+            the current process)
+        timeout --- maximum run time (in seconds) of Tesseract (if None, no
+            limit). The wait for a free slot is not counted
 
     Returns:
         Returns (the exit status of Tesseract, Tesseract's output)
+
+    Raises:
+        TesseractTimeoutError --- Tesseract didn't exit within `timeout`
+
+    At most concurrency.get_max_processes() Tesseract processes run at the
+    same time: the call waits for a free slot before spawning Tesseract.
+    If the call is cancelled or times out, Tesseract is terminated (killed
+    if still running after TERMINATE_TIMEOUT seconds) before the call
+    returns.
     '''
     _set_environment()
 
@@ -279,18 +415,83 @@ async def run_tesseract(input_filename, output_filename_base, cwd=None, lang=Non
         command += configs
 
     command = ' '.join(command)
-    proc = await asyncio.create_subprocess_shell(command, cwd=cwd,
-                                                 startupinfo=g_subprocess_startup_info,
-                                                 creationflags=g_creation_flags,
-                                                 stdout=asyncio.subprocess.PIPE,
-                                                 stderr=asyncio.subprocess.STDOUT)
-    # Beware that in some cases, tesseract may print more on stderr than
-    # allowed by the buffer of subprocess.Popen.stderr. So we must read stderr
-    # asap or Tesseract will remain stuck when trying to write again on stderr.
-    # In the end, we just have to make sure that proc.stderr.read() is called
-    # before proc.wait()
+    async with concurrency.governor:
+        with instrumentation.span("tesseract.spawn"):
+            # in its own process group: Tesseract can be stopped with the
+            # shell running it
+            proc = await asyncio.create_subprocess_shell(
+                command, cwd=cwd, env=env,
+                startupinfo=g_subprocess_startup_info,
+                creationflags=g_creation_flags,
+                start_new_session=(os.name != 'nt'),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+        with instrumentation.span("tesseract.process"):
+            try:
+                (status, errors) = await asyncio.wait_for(
+                    _communicate(proc), timeout
+                )
+            except asyncio.TimeoutError:
+                await _stop(proc)
+                raise TesseractTimeoutError(timeout, command)
+            except asyncio.CancelledError:
+                # the caller is gone: don't leave Tesseract running
+                await _stop(proc)
+                raise
+    return (status, errors)
+
+
+async def _communicate(proc):
+    # Beware that in some cases, tesseract may print more on stderr
+    # than allowed by the buffer of subprocess.Popen.stderr. So we
+    # must read stderr asap or Tesseract will remain stuck when
+    # trying to write again on stderr.
+    # In the end, we just have to make sure that proc.stderr.read()
+    # is called before proc.wait()
     errors = await proc.stdout.read()
-    return (await proc.wait(), errors)
+    status = await proc.wait()
+    return (status, errors)
+
+
+def _signal(proc, kill):
+    """
+    Terminates (or kills if `kill` is True) the process `proc` started by
+    run_tesseract(), and its children.
+    """
+    try:
+        if os.name == 'nt':  # pragma: no cover
+            if kill:
+                proc.kill()
+            else:
+                proc.terminate()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except ProcessLookupError:
+        # already gone
+        pass
+
+
+async def _stop(proc):
+    """
+    Terminates the process `proc` started by run_tesseract(), and kills it
+    if it is still running after TERMINATE_TIMEOUT seconds. Returns once
+    the process has exited.
+    """
+    _signal(proc, kill=False)
+    try:
+        await asyncio.wait_for(proc.wait(), TERMINATE_TIMEOUT)
+        return
+    except asyncio.TimeoutError:
+        pass
+    except asyncio.CancelledError:
+        # cancelled again: no more waiting
+        _signal(proc, kill=True)
+        raise
+    logger.warning("Tesseract (pid %d) didn't terminate: killing it",
+                   proc.pid)
+    _signal(proc, kill=True)
+    await proc.wait()
 
 
 def cleanup(filename):
@@ -325,19 +526,43 @@ class ReOpenableTempfile(object):  # pragma: no cover
             self.name = None
 
 
-async def image_to_string(image, lang=None, builder=None):
+async def image_to_string(image, lang=None, builder=None, oem=None,
+                          variables=None, preset=None, triage=None,
+                          rescale=None, timeout=None):
     '''
     Runs tesseract on the specified image. First, the image is written to disk,
     and then the tesseract command is run on the image. Tesseract's result is
     read, and the temporary files are erased.
 
     Arguments:
-        image --- image to OCR.
+        image --- image to OCR: Pillow image, transport.ImageView or
+            preprocessing.Raster.
         lang --- tesseract language to use.
         builder --- builder used to configure Tesseract and read its result.
             The builder is used to specify the type of output expected.
             Possible builders are TextBuilder or CharBoxBuilder. If builder ==
             None, the builder used will be TextBuilder.
+        oem --- OCR engine mode (0: legacy engine, 1: LSTM, 2: both,
+            3: default; see libtesseract.tesseract_raw.OcrEngineMode).
+            Tesseract >= 4 only. None means the Tesseract default.
+        variables --- dict of Tesseract variables (name --> value) to set
+            (tesseract -c name=value), for instance
+            {"load_system_dawg": False, "tessedit_do_invert": False}
+        preset --- name of a speed / accuracy preset ("fast", "balanced",
+            "accurate"; see module presets). `oem` and `variables` override
+            the settings of the preset.
+        triage --- triage.Triage: recognition of a low resolution copy of
+            the image first, skipping the full recognition of pages
+            without text (see module triage). The reason of a skip is
+            stored in builder.skip_reason
+        rescale --- scaling.Rescale: resampling of the image to the
+            resolution Tesseract works best at. The positions of the boxes
+            are mapped back to `image`
+        timeout --- maximum run time (in seconds) of each tesseract
+            process (the triage runs one more). A process still running
+            after `timeout` is stopped, the temporary files are removed
+            and TesseractTimeoutError is raised. Cancelling the call stops
+            the process the same way
 
     Returns:
         Depends of the specified builder. By default, it will return a simple
@@ -346,19 +571,152 @@ async def image_to_string(image, lang=None, builder=None):
 
     if builder is None:
         builder = builders.TextBuilder()
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        image.save(os.path.join(tmpdir, "input.bmp"))
-        (status, errors) = await run_tesseract("input.bmp", "output", cwd=tmpdir,
-                                               lang=lang,
-                                               flags=builder.tesseract_flags,
-                                               configs=builder.tesseract_configs)
-        if status:
-            raise TesseractError(status, errors)
-
-        tested_files = []
-        output_file_name = "ERROR"
+    preset = presets.get_preset(preset)
+    image = to_pil(image)
+    original_size = image.size
+    with instrumentation.span("tesseract.image_to_string"):
+        if rescale is not None:
+            scale = rescale.get_scale(image)
+            if scale != 1.0:
+                image = rescale.resize(image, scale)
+        with instrumentation.span("tesseract.temp_dir"):
+            tmp = tempfile.TemporaryDirectory()
+        with tmp as tmpdir:
+            if triage is not None:
+                builder.skip_reason = await _triage(
+                    tmpdir, image, lang, triage, oem, variables, preset,
+                    timeout
+                )
+                if builder.skip_reason is not None:
+                    return builder.get_output()
+            with instrumentation.span("tesseract.encode_image"):
+                _save_image(image, os.path.join(tmpdir, "input.bmp"))
+            output = await _run_and_read(tmpdir, "input.bmp", lang, builder,
+                                         oem, variables, preset, timeout)
+        return scaling.map_output(output, original_size, image.size)
+
+
+async def image_file_to_string(path, lang=None, builder=None, oem=None,
+                               variables=None, preset=None, triage=None,
+                               rescale=None, timeout=None):
+    '''
+    Same as image_to_string(), but on an image file already on disk. The
+    file is not decoded nor re-encoded: it is linked in the temporary
+    directory (or copied if it cannot be linked) and given as-is to
+    Tesseract.
+
+    Arguments:
+        path --- path of the image file to OCR (any format supported by
+            Tesseract)
+        lang --- tesseract language to use.
+        builder --- builder used to configure Tesseract and read its result.
+            If builder == None, the builder used will be TextBuilder.
+        oem, variables, preset, triage, rescale, timeout --- see
+            image_to_string(). The triage decodes the image to make its low
+            resolution copy. If the image must be rescaled, it is decoded
+            and the resized copy is given to Tesseract instead. Files of
+            several pages (multi-page TIFF) are never rescaled: only their
+            first page would be recognized
+    '''
+    if builder is None:
+        builder = builders.TextBuilder()
+    preset = presets.get_preset(preset)
+    if rescale is not None:
+        with Image.open(path) as image:
+            if getattr(image, "n_frames", 1) > 1:
+                scale = 1.0
+            else:
+                scale = rescale.get_scale(image)
+            if scale != 1.0:
+                return await image_to_string(
+                    image, lang=lang, builder=builder, oem=oem,
+                    variables=variables, preset=preset, triage=triage,
+                    rescale=rescale, timeout=timeout
+                )
+    with instrumentation.span("tesseract.temp_dir"):
+        tmp = tempfile.TemporaryDirectory()
+    with tmp as tmpdir:
+        if triage is not None:
+            with Image.open(path) as image:
+                builder.skip_reason = await _triage(
+                    tmpdir, image, lang, triage, oem, variables, preset,
+                    timeout
+                )
+            if builder.skip_reason is not None:
+                return builder.get_output()
+        input_filename = _link_input_file(path, tmpdir)
+        return await _run_and_read(tmpdir, input_filename, lang, builder,
+                                   oem, variables, preset, timeout)
+
+
+async def _triage(tmpdir, image, lang, triage, oem, variables, preset,
+                  timeout=None):
+    '''
+    Recognizes the low resolution copy of `image` given by `triage`.
+
+    Returns:
+        The reason to skip the recognition of `image`, or None.
+    '''
+    with instrumentation.span("tesseract.triage"):
+        _save_image(triage.get_image(image),
+                    os.path.join(tmpdir, "triage.bmp"))
+        try:
+            word_boxes = await _run_and_read(
+                tmpdir, "triage.bmp", lang,
+                builders.WordBoxBuilder(tesseract_layout=3), oem, variables,
+                preset, timeout
+            )
+        finally:
+            cleanup(os.path.join(tmpdir, "triage.bmp"))
+    return triage.check_words(word_boxes)
+
+
+def _quote(arg):
+    if os.name == 'nt':  # pragma: no cover
+        return subprocess.list2cmdline([arg])
+    return shlex.quote(arg)
+
+
+def engine_flags(oem=None, variables=None):
+    '''
+    Returns the command line flags selecting the OCR engine mode `oem` and
+    setting the Tesseract `variables` (see image_to_string()).
+    '''
+    flags = []
+    if oem is not None:
+        flags += ["--oem", str(int(oem))]
+    if variables:
+        for (name, value) in variables.items():
+            flags += [
+                "-c", _quote("{}={}".format(name, format_variable(value)))
+            ]
+    return flags
+
+
+async def _run_and_read(tmpdir, input_filename, lang, builder, oem=None,
+                        variables=None, preset=None, timeout=None):
+    flags = builder.tesseract_flags
+    env = None
+    if preset is not None:
+        (oem, variables) = preset.get_engine_config(await _aget_version(),
+                                                    oem, variables)
+        if preset.tessdata_dir is not None:
+            flags = flags + ["--tessdata-dir", _quote(preset.tessdata_dir)]
+        if preset.thread_limit is not None:
+            env = dict(os.environ)
+            env["OMP_THREAD_LIMIT"] = str(preset.thread_limit)
+    if oem is not None or variables:
+        flags = flags + engine_flags(oem, variables)
+    (status, errors) = await run_tesseract(
+        input_filename, "output", cwd=tmpdir, lang=lang, flags=flags,
+        configs=builder.tesseract_configs, env=env, timeout=timeout
+    )
+    if status:
+        raise TesseractError(status, errors)
+
+    tested_files = []
+    output_file_name = "ERROR"
+    with instrumentation.span("tesseract.read_output"):
         for file_extension in builder.file_extensions:
             output_file_name = ('%s.%s' % (os.path.join(tmpdir, "output"),
                                            file_extension))
@@ -372,9 +730,9 @@ async def image_to_string(image, lang=None, builder=None):
                 continue
             finally:
                 cleanup(output_file_name)
-        raise TesseractError(
-            -1, "Unable to find output file (tested {})".format(tested_files)
-        )
+    raise TesseractError(
+        -1, "Unable to find output file (tested {})".format(tested_files)
+    )
 
 
 def is_available():
@@ -405,6 +763,26 @@ def get_available_languages():
     return [lang for lang in langs if lang and lang[-1] != ':']
 
 
+async def _aget_version():
+    """
+    Same as get_version(), without blocking the event loop: the command runs
+    in the default executor, and its version is cached until TESSERACT_CMD
+    changes or the tools are looked for again
+    (pyocr.get_available_tools(refresh=True)).
+    """
+    global g_version
+    cmd = TESSERACT_CMD
+    if g_version is None or g_version[0] != cmd:
+        loop = asyncio.get_running_loop()
+        g_version = (cmd, await loop.run_in_executor(None, get_version))
+    return g_version[1]
+
+
+def _clear_version_cache():
+    global g_version
+    g_version = None
+
+
 def get_version():
     """
     Returns Tesseract version.
@@ -0,0 +1,432 @@
+"""
+Transport of decoded images between processes without pickling them.
+
+The pixels of the image are placed once in a shared memory block
+(`multiprocessing.shared_memory`) or in a memory-mapped file. Only a small
+descriptor (SharedImage: where the pixels are, size, mode, dpi) has to be
+sent to the other process. There, open_image() maps the pixels back and
+returns an ImageView whose buffer can be given directly to
+`libtesseract.tesseract_raw.set_image_buffer()` (or to
+`libtesseract.image_to_string()`) without any copy.
+
+USAGE:
+ > # producer
+ > with transport.share_image(image) as block:
+ >     send(block.descriptor)
+ >     wait_for_result()
+ >
+ > # consumer
+ > with transport.open_image(descriptor) as view:
+ >     libtesseract.image_to_string(view, lang="eng")
+
+Image files whose pixels are stored uncompressed (binary PGM / PPM,
+uncompressed TIFF) can also be mapped directly: see describe_image_file().
+
+The shared memory backend requires Python >= 3.8.
+"""
+
+import mmap
+import os
+import re
+import struct
+
+__all__ = [
+    'ImageView',
+    'SharedImage',
+    'SharedImageBlock',
+    'describe_image_file',
+    'open_image',
+    'share_image',
+]
+
+BACKEND_SHARED_MEMORY = "shm"
+BACKEND_FILE = "file"
+
+# modes that can be given as-is to Tesseract --> bytes per pixel
+MODES = {
+    "L": 1,
+    "RGB": 3,
+    "RGBA": 4,
+}
+
+# 70 is the minimum credible dpi for tesseract and force it to compute an
+# estimate of the image dpi (see tesseract_raw.DPI_DEFAULT)
+DPI_DEFAULT = 70
+
+
+class SharedImage(object):
+    """
+    Describes where the pixels of an image are and how to interpret them.
+    This is what must be sent to the other processes (it is small and can
+    be pickled).
+
+    Attributes:
+        backend --- BACKEND_SHARED_MEMORY or BACKEND_FILE
+        name --- name of the shared memory block, or path of the file
+        offset --- position of the first pixel in the block / file
+        size --- (width, height)
+        mode --- Pillow mode of the pixels (see MODES)
+        dpi --- resolution of the image
+    """
+
+    def __init__(self, backend, name, size, mode, dpi=DPI_DEFAULT,
+                 offset=0):
+        self.backend = backend
+        self.name = name
+        self.offset = offset
+        self.size = tuple(size)
+        self.mode = mode
+        self.dpi = dpi
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def bytes_per_pixel(self):
+        return MODES[self.mode]
+
+    @property
+    def bytes_per_line(self):
+        return self.width * self.bytes_per_pixel
+
+    @property
+    def nbytes(self):
+        return self.bytes_per_line * self.height
+
+    def __str__(self):
+        return "SharedImage({}:{}+{}, {}x{}, {}, {} dpi)".format(
+            self.backend, self.name, self.offset, self.width, self.height,
+            self.mode, self.dpi
+        )
+
+
+def _prepare_image(image):
+    if image.mode == "1":
+        image = image.convert("L")
+    elif image.mode not in MODES:
+        image = image.convert("RGB")
+    dpi = image.info.get("dpi", [DPI_DEFAULT])[0]
+    return (image, int(dpi))
+
+
+class SharedImageBlock(object):
+    """
+    Owner of the memory where the pixels of a shared image are stored.
+    The memory is released (and the shared memory block / file removed)
+    by close().
+    """
+
+    def __init__(self, descriptor, shm=None):
+        self.descriptor = descriptor
+        self._shm = shm
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        elif self.descriptor is not None:
+            try:
+                os.remove(self.descriptor.name)
+            except FileNotFoundError:  # pragma: no cover
+                pass
+        self.descriptor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def share_image(image, path=None):
+    """
+    Copy the pixels of `image` to a new shared memory block or, if `path`
+    is specified, to a new file (that other processes will mmap).
+    Images that are not in one of the modes supported by Tesseract (see
+    MODES) are converted to RGB first.
+
+    Arguments:
+        image --- Pillow image
+        path --- path of the file to create. If None, a shared memory block
+            is used instead.
+
+    Returns:
+        SharedImageBlock
+    """
+    (image, dpi) = _prepare_image(image)
+    data = image.tobytes("raw", image.mode)
+
+    if path is None:
+        from multiprocessing import shared_memory
+        # a shared memory block can not be empty
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        descriptor = SharedImage(
+            BACKEND_SHARED_MEMORY, shm.name, image.size, image.mode, dpi
+        )
+        return SharedImageBlock(descriptor, shm=shm)
+
+    with open(path, "wb") as file_desc:
+        file_desc.write(data)
+    descriptor = SharedImage(BACKEND_FILE, path, image.size, image.mode, dpi)
+    return SharedImageBlock(descriptor)
+
+
+class ImageView(object):
+    """
+    Pixels of a shared image, mapped in the current process.
+
+    Attributes:
+        descriptor --- SharedImage
+        buf --- writable memoryview on the pixels (writes are visible to the
+            other processes only with the shared memory backend)
+    """
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self._shm = None
+        self._mmap = None
+        end = descriptor.offset + descriptor.nbytes
+
+        if descriptor.backend == BACKEND_SHARED_MEMORY:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(name=descriptor.name)
+            mem = self._shm.buf
+        elif descriptor.backend == BACKEND_FILE:
+            with open(descriptor.name, "rb") as file_desc:
+                # copy-on-write: writable for ctypes, but never modified
+                # on disk
+                self._mmap = mmap.mmap(file_desc.fileno(), 0,
+                                       access=mmap.ACCESS_COPY)
+            mem = memoryview(self._mmap)
+        else:
+            raise ValueError(
+                "Unknown shared image backend: {}".format(descriptor.backend)
+            )
+        self._mem = mem
+        if len(mem) < end:
+            self.close()
+            raise ValueError("Shared image truncated: {}".format(descriptor))
+        self.buf = mem[descriptor.offset:end]
+
+    @property
+    def size(self):
+        return self.descriptor.size
+
+    @property
+    def width(self):
+        return self.descriptor.width
+
+    @property
+    def height(self):
+        return self.descriptor.height
+
+    @property
+    def mode(self):
+        return self.descriptor.mode
+
+    @property
+    def dpi(self):
+        return self.descriptor.dpi
+
+    @property
+    def bytes_per_pixel(self):
+        return self.descriptor.bytes_per_pixel
+
+    @property
+    def bytes_per_line(self):
+        return self.descriptor.bytes_per_line
+
+    def to_pil(self):
+        """
+        Returns a Pillow image sharing the memory of this view. It must be
+        closed before the view.
+        """
+        from PIL import Image
+        image = Image.frombuffer(self.mode, self.size, self.buf,
+                                 "raw", self.mode, 0, 1)
+        image.info['dpi'] = (self.dpi, self.dpi)
+        return image
+
+    def close(self):
+        if getattr(self, "buf", None) is not None:
+            self.buf.release()
+            self.buf = None
+        if getattr(self, "_mem", None) is not None:
+            if self._mmap is not None:
+                self._mem.release()
+            self._mem = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_image(descriptor):
+    """
+    Map the pixels described by `descriptor` (see share_image()) in the
+    current process.
+
+    Returns:
+        ImageView
+    """
+    return ImageView(descriptor)
+
+
+_PNM_HEADER_RE = re.compile(
+    rb"(P[56])(?:\s|#[^\n]*\n)+(\d+)(?:\s|#[^\n]*\n)+(\d+)"
+    rb"(?:\s|#[^\n]*\n)+(\d+)\s"
+)
+_PNM_MODES = {
+    b"P5": "L",
+    b"P6": "RGB",
+}
+
+
+def _describe_pnm(path, header):
+    match = _PNM_HEADER_RE.match(header)
+    if match is None:
+        return None
+    (magic, width, height, maxval) = match.groups()
+    if int(maxval) != 255:
+        return None
+    return SharedImage(BACKEND_FILE, path, (int(width), int(height)),
+                       _PNM_MODES[magic], offset=match.end())
+
+
+_TIFF_TYPES = {
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+}
+
+
+def _read_tiff_tags(file_desc, endian):
+    """
+    Returns the tags of the first IFD of a (classic) TIFF file as a
+    dict tag --> list of values. Tags of unknown types are ignored.
+    """
+    file_desc.seek(4)
+    (ifd_offset,) = struct.unpack(endian + "I", file_desc.read(4))
+    file_desc.seek(ifd_offset)
+    (nb_entries,) = struct.unpack(endian + "H", file_desc.read(2))
+    entries = file_desc.read(12 * nb_entries)
+    tags = {}
+    for idx in range(nb_entries):
+        (tag, tag_type, count) = struct.unpack_from(endian + "HHI", entries,
+                                                    12 * idx)
+        if tag_type not in _TIFF_TYPES:
+            continue
+        (fmt, size) = _TIFF_TYPES[tag_type]
+        fmt = endian + (fmt * count)
+        if size * count <= 4:
+            values = struct.unpack_from(fmt, entries, (12 * idx) + 8)
+        else:
+            (offset,) = struct.unpack_from(endian + "I", entries,
+                                           (12 * idx) + 8)
+            file_desc.seek(offset)
+            values = struct.unpack(fmt, file_desc.read(size * count))
+        if tag_type == 5:
+            values = [
+                values[i] / values[i + 1] if values[i + 1] else 0
+                for i in range(0, len(values), 2)
+            ]
+        tags[tag] = list(values)
+    return tags
+
+
+# TIFF tags
+_TIFF_WIDTH = 256
+_TIFF_HEIGHT = 257
+_TIFF_BITS_PER_SAMPLE = 258
+_TIFF_COMPRESSION = 259
+_TIFF_PHOTOMETRIC = 262
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_SAMPLES_PER_PIXEL = 277
+_TIFF_STRIP_BYTE_COUNTS = 279
+_TIFF_X_RESOLUTION = 282
+_TIFF_PLANAR_CONFIGURATION = 284
+_TIFF_RESOLUTION_UNIT = 296
+_TIFF_TILE_WIDTH = 322
+
+# (samples per pixel, photometric interpretation) --> mode
+_TIFF_MODES = {
+    (1, 1): "L",  # BlackIsZero
+    (3, 2): "RGB",
+    (4, 2): "RGBA",
+}
+
+
+def _describe_tiff(path, file_desc, endian):
+    try:
+        tags = _read_tiff_tags(file_desc, endian)
+    except struct.error:  # truncated file
+        return None
+    try:
+        width = tags[_TIFF_WIDTH][0]
+        height = tags[_TIFF_HEIGHT][0]
+        samples = tags.get(_TIFF_SAMPLES_PER_PIXEL, [1])[0]
+        mode = _TIFF_MODES.get((samples, tags[_TIFF_PHOTOMETRIC][0]))
+        strip_offsets = tags[_TIFF_STRIP_OFFSETS]
+        strip_byte_counts = tags[_TIFF_STRIP_BYTE_COUNTS]
+    except (KeyError, IndexError):
+        return None
+    if (mode is None or
+            tags.get(_TIFF_COMPRESSION, [1])[0] != 1 or
+            tags.get(_TIFF_PLANAR_CONFIGURATION, [1])[0] != 1 or
+            _TIFF_TILE_WIDTH in tags or
+            any(bits != 8 for bits in tags.get(_TIFF_BITS_PER_SAMPLE, [1]))):
+        return None
+
+    # strips must follow each other to be seen as a single buffer
+    end = strip_offsets[0]
+    for (offset, count) in zip(strip_offsets, strip_byte_counts):
+        if offset != end:
+            return None
+        end += count
+
+    dpi = tags.get(_TIFF_X_RESOLUTION, [0])[0]
+    if tags.get(_TIFF_RESOLUTION_UNIT, [2])[0] == 3:  # centimeters
+        dpi *= 2.54
+    dpi = int(round(dpi)) if dpi >= 1 else DPI_DEFAULT
+
+    descriptor = SharedImage(BACKEND_FILE, path, (width, height), mode,
+                             dpi=dpi, offset=strip_offsets[0])
+    if end - descriptor.offset < descriptor.nbytes:
+        return None
+    return descriptor
+
+
+def describe_image_file(path):
+    """
+    Look if the pixels of the image file `path` can be memory-mapped and
+    given as-is to Tesseract (see open_image()). This is the case of binary
+    8 bits PGM / PPM files, and of uncompressed 8 bits grayscale / RGB(A)
+    TIFF files whose strips are contiguous (first page only).
+
+    Returns:
+        SharedImage, or None if the file must be decoded
+    """
+    with open(path, "rb") as file_desc:
+        header = file_desc.read(512)
+        if header[:2] in _PNM_MODES:
+            return _describe_pnm(path, header)
+        if header[:4] == b"II*\0":
+            return _describe_tiff(path, file_desc, "<")
+        if header[:4] == b"MM\0*":
+            return _describe_tiff(path, file_desc, ">")
+    return None
@@ -0,0 +1,119 @@
+"""
+Cheap first pass deciding if a page is worth a full recognition.
+
+Blank pages and pages made of pictures only cost as much as text pages to
+recognize. With a Triage, image_to_string() first looks at the page
+cheaply, and skips the full recognition when:
+
+- the layout analysis finds no text block (libtesseract only: the
+  tesseract command can't analyse the layout without recognizing);
+- the recognition of a reduced copy of the page (`scale`) finds no word;
+- the mean confidence of the words of the reduced copy is lower than
+  `min_confidence`.
+
+The low resolution recognition only runs when needed: with libtesseract
+when `min_confidence` is set, and always with tesseract.
+
+A skipped page gives the output of an empty builder ("" for TextBuilder,
+[] for the box builders), and the reason is stored in the attribute
+'skip_reason' of the builder (None when the page was recognized).
+
+USAGE:
+ > builder = builders.TextBuilder()
+ > text = libtesseract.image_to_string(
+ >     image, builder=builder, triage=triage.Triage(min_confidence=40)
+ > )
+ > if builder.skip_reason is not None:
+ >     print("Skipped: {}".format(builder.skip_reason))
+"""
+
+from PIL import Image
+
+from . import builders
+from . import scaling
+from . import transport
+
+__all__ = [
+    'LOW_CONFIDENCE',
+    'NO_TEXT',
+    'NO_TEXT_BLOCK',
+    'Triage',
+]
+
+
+NO_TEXT_BLOCK = "no text block"
+NO_TEXT = "no text"
+LOW_CONFIDENCE = "low confidence"
+
+
+class Triage(object):
+    """
+    Settings of the first pass.
+
+    Attributes:
+        layout --- if True, run the layout analysis (libtesseract only)
+        min_confidence --- minimum mean confidence (0-100) of the words
+            found at low resolution (None: no minimum)
+        scale --- scale of the copy of the page recognized at low
+            resolution
+    """
+
+    def __init__(self, layout=True, min_confidence=None, scale=0.5):
+        if not 0 < scale <= 1:
+            raise ValueError(
+                "Invalid triage scale: {} (expected: 0 < scale <= 1)".format(
+                    scale
+                )
+            )
+        self.layout = layout
+        self.min_confidence = min_confidence
+        self.scale = scale
+
+    def get_image(self, image):
+        """
+        Returns the copy of `image` recognized at low resolution. Images
+        given without decoding (transport.ImageView) are recognized at
+        full resolution.
+        """
+        if self.scale == 1 or not isinstance(image, Image.Image):
+            return image
+        size = (max(1, int(image.size[0] * self.scale)),
+                max(1, int(image.size[1] * self.scale)))
+        dpi = scaling.get_dpi(image)
+        image = image.resize(size, Image.BILINEAR)
+        if dpi != transport.DPI_DEFAULT:
+            dpi = int(round(dpi * self.scale))
+        image.info['dpi'] = (dpi, dpi)
+        return image
+
+    @staticmethod
+    def check_blocks(blocks):
+        """
+        Returns the reason to skip a page whose layout analysis gave
+        `blocks` (list of builders.Block), or None.
+        """
+        from .libtesseract import tesseract_raw
+
+        for block in blocks:
+            if block.block_type in tesseract_raw.TEXT_BLOCK_TYPES:
+                return None
+        return NO_TEXT_BLOCK
+
+    def check_words(self, word_boxes):
+        """
+        Returns the reason to skip a page whose low resolution recognition
+        gave `word_boxes` (list of builders.Box), or None.
+        """
+        word_boxes = [box for box in word_boxes if box.content.strip()]
+        if not word_boxes:
+            return NO_TEXT
+        if (self.min_confidence is not None and
+                builders._mean_confidence(word_boxes) <
+                self.min_confidence):
+            return LOW_CONFIDENCE
+        return None
+
+    def __repr__(self):
+        return "Triage(layout={}, min_confidence={}, scale={})".format(
+            self.layout, self.min_confidence, self.scale
+        )
@@ -7,3 +7,23 @@ def digits_only(string):
     if match:
         return int(match.group('digits'))
     return 0
+
+
+def format_variable(value):
+    """
+    Return the string representation Tesseract expects for the value of a
+    variable (booleans as "1" / "0").
+    """
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def to_pil(image):
+    """
+    Return `image` as a Pillow image. Raw pixels (transport.ImageView,
+    preprocessing.Raster) give a Pillow image sharing their memory.
+    """
+    if hasattr(image, "to_pil"):
+        return image.to_pil()
+    return image
@@ -30,6 +30,14 @@ class TestBox(unittest.TestCase):
                          "bbox 15 22 23 42; x_wconf 0")
         self.assertEqual(tag.firstChild.data, "word1")
 
+    def test_get_hocr(self):
+        impl = xml.dom.minidom.getDOMImplementation()
+        doc = impl.createDocument(None, "root", None)
+        for box in (self.box1, self.box2, self.box_unicode,
+                    builders.Box("<a&b>", ((1, 2), (3, 4)), 12.7),
+                    builders.Box("", ((1, 2), (3, 4)))):
+            self.assertEqual(box.get_hocr(), box.get_xml_tag(doc).toxml())
+
     def test_str_method(self):
         self.assertEqual(str(self.box1), "word1 15 22 23 42")
 
@@ -107,6 +115,13 @@ class TestLineBox(unittest.TestCase):
         self.assertEqual(tag.firstChild.firstChild.data, "word1")
         self.assertEqual(tag.lastChild.firstChild.data, "word4")
 
+    def test_get_hocr(self):
+        impl = xml.dom.minidom.getDOMImplementation()
+        doc = impl.createDocument(None, "root", None)
+        for line in (self.line1, self.line2, self.line_unicode,
+                     builders.LineBox([], ((1, 2), (3, 4)))):
+            self.assertEqual(line.get_hocr(), line.get_xml_tag(doc).toxml())
+
     def test_line_str(self):
         expected = "[\n"
         for box in self.line1.word_boxes:
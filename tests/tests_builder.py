@@ -1,4 +1,5 @@
 import unittest
+import xml.dom.minidom
 
 from io import StringIO
 from itertools import product
@@ -6,10 +7,26 @@ from random import randint
 from unittest.mock import patch
 
 from pyocr import builders
+from pyocr.libtesseract import tesseract_raw
 
 from .tests_base import BaseTest
 
 
+def _minidom_write_file(file_descriptor, boxes):
+    """
+    Reference implementation of write_file() for the hOCR builders
+    """
+    impl = xml.dom.minidom.getDOMImplementation()
+    newdoc = impl.createDocument(None, "root", None)
+
+    file_descriptor.write(builders._XHTML_HEADER)
+    file_descriptor.write("<body>\n")
+    for box in boxes:
+        xml_str = box.get_xml_tag(newdoc).toxml()
+        file_descriptor.write("<p>" + xml_str + "</p>\n")
+    file_descriptor.write("</body>\n</html>\n")
+
+
 class TestTextBuilder(unittest.TestCase):
     @patch("pyocr.tesseract.get_version")
     def setUp(self, get_version):
@@ -162,6 +179,31 @@ class TestWordBoxBuilder(BaseTest):
             ), output)
             self.assertIn(str(box.confidence), output)
 
+    def test_write_file_same_as_minidom(self):
+        boxes = self.builder.read_file(self._get_file_handle("words"))
+        boxes += [
+            builders.Box("<a&b>", ((10, 11), (12, 13)), 95.5),
+            builders.Box("", ((11, 12), (13, 14))),
+        ]
+        # more boxes than what is written at once
+        boxes *= 20
+        output = StringIO()
+        self.builder.write_file(output, boxes)
+        expected = StringIO()
+        _minidom_write_file(expected, boxes)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_write_file_read_file(self):
+        boxes = self.builder.read_file(self._get_file_handle("words"))
+        output = StringIO()
+        self.builder.write_file(output, boxes)
+        output.seek(0)
+        self.assertListEqual(
+            [(box.content, box.position)
+             for box in self.builder.read_file(output)],
+            [(box.content, box.position) for box in boxes]
+        )
+
     def test_start_line(self):
         box = builders.Box("word", ((1, 2), (3, 4)))
         before = list(self.builder.word_boxes)
@@ -236,6 +278,52 @@ class TestLineBoxBuilder(BaseTest):
             for line in lines:
                 self.assertIsInstance(line, builders.LineBox)
 
+    @patch("pyocr.tesseract.get_version")
+    def test_char_boxes(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.assertFalse(self.builder.needs_symbols)
+        builder = builders.LineBoxBuilder(char_boxes=True)
+        self.assertTrue(builder.needs_symbols)
+        builder.start_line(((0, 0), (20, 10)))
+        builder.add_word("ab", ((0, 0), (20, 10)), 90)
+        builder.add_symbol("a", ((0, 0), (10, 10)), 91)
+        builder.add_symbol("b", ((10, 0), (20, 10)), 89)
+        builder.end_line()
+        [line] = builder.get_output()
+        [word] = line.word_boxes
+        self.assertListEqual(
+            [(char.content, char.position, char.confidence)
+             for char in word.char_boxes],
+            [("a", ((0, 0), (10, 10)), 91), ("b", ((10, 0), (20, 10)), 89)]
+        )
+        self.builder.start_line(((0, 0), (20, 10)))
+        self.builder.add_word("ab", ((0, 0), (20, 10)), 90)
+        self.assertIsNone(self.builder.lines[0].word_boxes[0].char_boxes)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_choices(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.assertEqual(self.builder.max_choices, 0)
+        builder = builders.LineBoxBuilder(choices=2)
+        self.assertEqual(builder.max_choices, 2)
+        self.assertFalse(builder.needs_symbols)
+        choices = builders.SymbolChoices()
+        choices.append(0, "a", 91)
+        choices.append(0, "o", 40.5)
+        choices.append(1, "b", 89)
+        builder.start_line(((0, 0), (20, 10)))
+        builder.add_word("ab", ((0, 0), (20, 10)), 90)
+        builder.add_choices(choices)
+        builder.end_line()
+        [line] = builder.get_output()
+        word = line.word_boxes[0]
+        self.assertIs(word.choices, choices)
+        self.assertEqual(len(word.choices), 3)
+        self.assertListEqual(word.choices.get(0), [("a", 91), ("o", 40.5)])
+        self.assertListEqual(word.choices.get(1), [("b", 89)])
+        self.assertListEqual(word.choices.get(2), [])
+        self.assertListEqual(list(word.choices.symbols), [0, 0, 1])
+
     def test_empty_read_file(self):
         empty = StringIO()
         self.assertListEqual(self.builder.read_file(empty), [])
@@ -263,6 +351,18 @@ class TestLineBoxBuilder(BaseTest):
                 ), output)
                 self.assertIn(str(box.confidence), output)
 
+    def test_write_file_same_as_minidom(self):
+        lines = []
+        for input_fh in (self._get_file_handle("tesseract.lines"),
+                         self._get_file_handle("cuneiform.lines")):
+            lines += self.builder.read_file(input_fh)
+        lines.append(builders.LineBox([], ((1, 2), (3, 4))))
+        output = StringIO()
+        self.builder.write_file(output, lines)
+        expected = StringIO()
+        _minidom_write_file(expected, lines)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
     def test_start_line(self):
         position = ((1, 2), (3, 4))
         self.builder.start_line(position)
@@ -311,6 +411,157 @@ class TestLineBoxBuilder(BaseTest):
         self.assertEqual(str(self.builder), "Line boxes")
 
 
+class TestPageBuilder(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.builder = builders.PageBuilder()
+        self.line_builder = builders.LineBoxBuilder()
+
+    def _make_blocks(self):
+        blocks = []
+        for (block_idx, block_type) in enumerate((
+                tesseract_raw.PolyBlockType.HEADING_TEXT,
+                tesseract_raw.PolyBlockType.FLOWING_TEXT,
+                tesseract_raw.PolyBlockType.FLOWING_IMAGE)):
+            paragraphs = []
+            if block_type in tesseract_raw.TEXT_BLOCK_TYPES:
+                for p in range(2):
+                    lines = []
+                    for line_idx in range(2):
+                        top = 100 * block_idx + 40 * p + 20 * line_idx
+                        boxes = [
+                            builders.Box("word%d" % b,
+                                         ((10 * b, top), (10 * b + 8,
+                                                          top + 10)),
+                                         randint(0, 100))
+                            for b in range(3)
+                        ]
+                        lines.append(builders.LineBox(
+                            boxes, ((0, top), (28, top + 10))
+                        ))
+                    paragraphs.append(builders.Paragraph(lines, (
+                        lines[0].position[0], lines[-1].position[1]
+                    )))
+            blocks.append(builders.Block(
+                block_type, paragraphs,
+                ((0, 100 * block_idx), (28, 100 * block_idx + 90))
+            ))
+        return blocks
+
+    def test_init(self):
+        self.assertListEqual(self.builder.tesseract_flags, ["--psm", "3"])
+        self.assertListEqual(self.builder.tesseract_configs, ["hocr"])
+        self.assertListEqual(self.builder.cuneiform_args, ["-f", "hocr"])
+        self.assertTrue(self.builder.needs_layout)
+        self.assertFalse(self.line_builder.needs_layout)
+        self.assertListEqual(self.builder.blocks, [])
+
+    def test_read_file(self):
+        blocks = self.builder.read_file(
+            self._get_file_handle("tesseract.lines")
+        )
+        lines = self.line_builder.read_file(
+            self._get_file_handle("tesseract.lines")
+        )
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].block_type,
+                         tesseract_raw.PolyBlockType.FLOWING_TEXT)
+        self.assertEqual(blocks[0].position, ((98, 66), (918, 661)))
+        self.assertEqual(len(blocks[0].paragraphs), 1)
+        self.assertListEqual(blocks[0].line_boxes, lines)
+        self.assertListEqual(
+            [box.content for box in blocks[0].word_boxes],
+            [box.content for line in lines for box in line.word_boxes]
+        )
+        self.assertEqual(blocks[0].word_boxes[1].content, "(quick)")
+
+    def test_read_file_cuneiform(self):
+        blocks = self.builder.read_file(
+            self._get_file_handle("cuneiform.lines")
+        )
+        lines = self.line_builder.read_file(
+            self._get_file_handle("cuneiform.lines")
+        )
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(len(blocks[0].paragraphs), 1)
+        self.assertListEqual(blocks[0].line_boxes, lines)
+
+    def test_empty_read_file(self):
+        self.assertListEqual(self.builder.read_file(StringIO()), [])
+
+    def test_write_file_read_file(self):
+        blocks = self._make_blocks()
+        output = StringIO()
+        self.builder.write_file(output, blocks)
+        output.seek(0)
+        read_blocks = self.builder.read_file(output)
+        # the image block has no word: it is kept anyway
+        self.assertEqual(len(read_blocks), len(blocks))
+        for (block, expected) in zip(read_blocks, blocks):
+            self.assertEqual(block.block_type, expected.block_type)
+            self.assertEqual(block.position, expected.position)
+            self.assertListEqual(
+                [paragraph.position for paragraph in block.paragraphs],
+                [paragraph.position for paragraph in expected.paragraphs]
+            )
+            self.assertListEqual(block.line_boxes, expected.line_boxes)
+            self.assertListEqual(
+                [box.confidence for box in block.word_boxes],
+                [box.confidence for box in expected.word_boxes]
+            )
+
+    def test_get_output(self):
+        blocks = self._make_blocks()[:2]
+        for block in blocks:
+            self.builder.start_block(block.position, block.block_type)
+            for paragraph in block.paragraphs:
+                self.builder.start_paragraph(paragraph.position)
+                for line in paragraph.line_boxes:
+                    self.builder.start_line(line.position)
+                    for word in line.word_boxes:
+                        self.builder.add_word(word.content, word.position,
+                                              word.confidence)
+                    self.builder.end_line()
+        # empty line at the end
+        self.builder.start_line(((0, 0), (1, 1)))
+        output = self.builder.get_output()
+        self.assertEqual(len(output), 2)
+        for (block, expected) in zip(output, blocks):
+            self.assertEqual(block.block_type, expected.block_type)
+            self.assertEqual(block.content, expected.content)
+            self.assertListEqual(block.line_boxes, expected.line_boxes)
+
+    def test_no_layout(self):
+        # lines given without blocks and paragraphs
+        position = ((1, 2), (3, 4))
+        self.builder.start_line(position)
+        self.builder.add_word("word", position, 50)
+        output = self.builder.get_output()
+        self.assertEqual(len(output), 1)
+        self.assertEqual(output[0].block_type,
+                         tesseract_raw.PolyBlockType.FLOWING_TEXT)
+        self.assertEqual(output[0].content, "word")
+
+    def test_confidence(self):
+        line = builders.LineBox([
+            builders.Box("a", ((0, 0), (1, 1)), 40),
+            builders.Box("b", ((2, 0), (3, 1)), 60),
+        ], ((0, 0), (3, 1)))
+        empty_line = builders.LineBox([], ((0, 2), (3, 3)))
+        paragraph = builders.Paragraph([line, empty_line], ((0, 0), (3, 3)))
+        block = builders.Block(tesseract_raw.PolyBlockType.FLOWING_TEXT,
+                               [paragraph], ((0, 0), (3, 3)))
+        self.assertEqual(line.confidence, 50)
+        self.assertEqual(empty_line.confidence, 0)
+        self.assertEqual(paragraph.confidence, 50)
+        self.assertEqual(block.confidence, 50)
+
+    def test_str_method(self):
+        self.assertEqual(str(self.builder), "Page")
+
+
 class TestDigitBuilder(unittest.TestCase):
     @patch("pyocr.tesseract.get_version")
     def setUp(self, get_version):
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import concurrency
+from pyocr import cuneiform
+from pyocr import tesseract
+
+from .tests_base import BaseTest
+
+
+class TestGovernor(BaseTest):
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            concurrency.Governor(0)
+        governor = concurrency.Governor(1)
+        with self.assertRaises(ValueError):
+            governor.limit = -1
+
+    def test_limit(self):
+        governor = concurrency.Governor(2)
+        running = []
+        max_running = []
+
+        async def job():
+            async with governor:
+                running.append(1)
+                max_running.append(len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        async def main():
+            await asyncio.gather(*[job() for _ in range(6)])
+
+        asyncio.run(main())
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual(governor.running, 0)
+
+    def test_no_limit(self):
+        governor = concurrency.Governor(None)
+
+        async def main():
+            for _ in range(10):
+                await governor.acquire()
+
+        asyncio.run(main())
+        self.assertEqual(governor.running, 10)
+
+    def test_fifo(self):
+        governor = concurrency.Governor(1)
+        order = []
+
+        async def job(idx):
+            async with governor:
+                order.append(idx)
+                await asyncio.sleep(0)
+
+        async def main():
+            await asyncio.gather(*[job(idx) for idx in range(5)])
+
+        asyncio.run(main())
+        self.assertListEqual(order, list(range(5)))
+
+    def test_raise_limit(self):
+        governor = concurrency.Governor(1)
+
+        async def main():
+            await governor.acquire()
+            waiter = asyncio.ensure_future(governor.acquire())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+            governor.limit = 2
+            await asyncio.wait_for(waiter, 1)
+
+        asyncio.run(main())
+        self.assertEqual(governor.running, 2)
+
+    def test_cancel(self):
+        governor = concurrency.Governor(1)
+
+        async def main():
+            await governor.acquire()
+            waiter = asyncio.ensure_future(governor.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            governor.release()
+            # the slot of the cancelled waiter is not lost
+            await asyncio.wait_for(governor.acquire(), 1)
+
+        asyncio.run(main())
+        self.assertEqual(governor.running, 1)
+
+    def test_threads(self):
+        governor = concurrency.Governor(1)
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        async def job():
+            async with governor:
+                with lock:
+                    running.append(1)
+                    max_running.append(len(running))
+                await asyncio.sleep(0.01)
+                with lock:
+                    running.pop()
+
+        def thread_main():
+            asyncio.run(job())
+
+        threads = [threading.Thread(target=thread_main) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(max_running), 1)
+        self.assertEqual(governor.running, 0)
+
+    def test_max_processes(self):
+        limit = concurrency.get_max_processes()
+        try:
+            concurrency.set_max_processes(3)
+            self.assertEqual(concurrency.get_max_processes(), 3)
+            self.assertEqual(concurrency.governor.limit, 3)
+        finally:
+            concurrency.set_max_processes(limit)
+
+    def _check_waits(self, coroutine_function, subprocess_function):
+        with patch(subprocess_function) as spawn:
+            async def main():
+                async with concurrency.governor:
+                    task = asyncio.ensure_future(coroutine_function())
+                    await asyncio.sleep(0.01)
+                    self.assertFalse(spawn.called)
+                    task.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await task
+            asyncio.run(main())
+        self.assertEqual(concurrency.governor.running, 0)
+
+    @patch("pyocr.concurrency.governor", concurrency.Governor(1))
+    def test_tesseract(self):
+        self._check_waits(
+            lambda: tesseract.run_tesseract("input.bmp", "output"),
+            "asyncio.create_subprocess_shell"
+        )
+
+    @patch("pyocr.tesseract.get_version")
+    @patch("pyocr.concurrency.governor", concurrency.Governor(1))
+    def test_cuneiform(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        image = Image.new(mode="RGB", size=(10, 10))
+        builder = builders.TextBuilder()
+        self._check_waits(
+            lambda: cuneiform.image_to_string(image, builder=builder),
+            "asyncio.create_subprocess_exec"
+        )
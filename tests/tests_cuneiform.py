@@ -1,7 +1,9 @@
+import asyncio
 import subprocess
 
-from io import StringIO
-from unittest.mock import patch, MagicMock
+import os
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
 
 from PIL import Image
 
@@ -71,6 +73,7 @@ class TestCuneiform(BaseTest):
                 builders.TextBuilder,
                 builders.WordBoxBuilder,
                 builders.LineBoxBuilder,
+                builders.PageBuilder,
             ]
         )
 
@@ -85,97 +88,102 @@ class TestCuneiformTxt(BaseTest):
         get_version.return_value = (4, 0, 0)
         self.builder = builders.TextBuilder()
         self.image = Image.new(mode="RGB", size=(1, 1))
-        self.text_file = StringIO(self._get_file_content("text"))
-        self.stdout = MagicMock()
-        self.stdout.stdout.read.return_value = b"Cuneiform for Linux 1.1.0\n"
-        self.stdout.wait.return_value = 0
+        self.output = self._get_file_content("text").encode("utf-8")
+        self.proc = MagicMock()
+        self.proc.communicate = AsyncMock(
+            return_value=(b"Cuneiform for Linux 1.1.0\n", None)
+        )
+        self.proc.returncode = 0
         self.tmp_filename = "/tmp/cuneiform_n0qfk87otxt"
         self.enter = MagicMock()
         self.enter.__enter__.return_value = MagicMock()
         self.enter.__enter__.return_value.configure_mock(
-            name=self.tmp_filename
+            name=self.tmp_filename, pass_fds=()
         )
+        self.enter.__enter__.return_value.read.return_value = self.output
 
     @patch("pyocr.tesseract.get_version")
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_image_to_string_defaults_to_text_buidler(self, popen, copen,
-                                                      temp_file, get_version):
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_image_to_string_defaults_to_text_buidler(self, popen, output_file,
+                                                      get_version):
         get_version.return_value = (4, 0, 0)
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(self.image)
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(self.image))
         self.assertEqual(output, self._get_file_content("text").strip())
         popen.assert_called_once_with(
-            ["cuneiform", "-f", "text", "-o", self.tmp_filename, "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-f", "text", "-o", self.tmp_filename, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
 
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_lang(self, popen, copen, temp_file):
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(self.image, lang="fra",
-                                           builder=self.builder)
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_lang(self, popen, output_file):
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, lang="fra", builder=self.builder
+        ))
         self.assertEqual(output, self._get_file_content("text").strip())
         popen.assert_called_once_with(
-            ["cuneiform", "-l", "fra", "-f", "text", "-o", self.tmp_filename,
-             "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-l", "fra", "-f", "text", "-o", self.tmp_filename,
+            "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
 
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_text(self, popen, copen, temp_file):
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(self.image,
-                                           builder=self.builder)
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_text(self, popen, output_file):
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, builder=self.builder
+        ))
         self.assertEqual(output, self._get_file_content("text").strip())
         popen.assert_called_once_with(
-            ["cuneiform", "-f", "text", "-o", self.tmp_filename, "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-f", "text", "-o", self.tmp_filename, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
 
-    @patch("subprocess.Popen")
+    @patch("asyncio.create_subprocess_exec")
     def test_text_error(self, popen):
         message = ("Cuneiform for Linux 1.1.0\n"
                    "Magick: Improper image header (example.png) reported by "
                    "coders/png.c:2932 (ReadPNGImage)\n")
-        self.stdout.stdout.read.return_value = message.encode()
-        self.stdout.wait.return_value = 1
-        popen.return_value = self.stdout
+        self.proc.communicate.return_value = (message.encode(), None)
+        self.proc.returncode = 1
+        popen.return_value = self.proc
         with self.assertRaises(cuneiform.CuneiformError) as ce:
-            cuneiform.image_to_string(self.image, builder=self.builder)
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder
+            ))
         self.assertEqual(ce.exception.status, 1)
         self.assertEqual(ce.exception.message, message)
 
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_text_non_rgb_image(self, popen, copen, temp_file):
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_text_non_rgb_image(self, popen, output_file):
         """This tests that image_to_string works with non RGB mode images and
         that image is converted in function."""
         image = self.image.convert("L")
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(image, builder=self.builder)
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(
+            image, builder=self.builder
+        ))
         self.assertEqual(output, self._get_file_content("text").strip())
         popen.assert_called_once_with(
-            ["cuneiform", "-f", "text", "-o", self.tmp_filename, "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-f", "text", "-o", self.tmp_filename, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
 
 
@@ -189,12 +197,15 @@ class TestCuneiformDigits(BaseTest):
 
     def test_digits_not_implemented(self):
         with self.assertRaises(NotImplementedError):
-            cuneiform.image_to_string(self.image, builder=self.builder)
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder
+            ))
 
     def test_digits_box_not_implemented(self):
         with self.assertRaises(NotImplementedError):
-            cuneiform.image_to_string(self.image,
-                                      builder=self.builder)
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder
+            ))
 
 
 class TestCuneiformWordBox(BaseTest):
@@ -206,46 +217,49 @@ class TestCuneiformWordBox(BaseTest):
         get_version.return_value = (4, 0, 0)
         self.builder = builders.WordBoxBuilder()
         self.image = Image.new(mode="RGB", size=(1, 1))
-        self.text_file = StringIO(self._get_file_content("cuneiform.words"))
-        self.stdout = MagicMock()
-        self.stdout.stdout.read.return_value = b"Cuneiform for Linux 1.1.0\n"
-        self.stdout.wait.return_value = 0
+        self.output = self._get_file_content("cuneiform.words").encode("utf-8")
+        self.proc = MagicMock()
+        self.proc.communicate = AsyncMock(
+            return_value=(b"Cuneiform for Linux 1.1.0\n", None)
+        )
+        self.proc.returncode = 0
         self.tmp_filename = "/tmp/cuneiform_n0qfk87otxt"
         self.enter = MagicMock()
         self.enter.__enter__.return_value = MagicMock()
         self.enter.__enter__.return_value.configure_mock(
-            name=self.tmp_filename
+            name=self.tmp_filename, pass_fds=()
         )
-
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_word(self, popen, copen, temp_file):
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(self.image,
-                                           builder=self.builder)
+        self.enter.__enter__.return_value.read.return_value = self.output
+
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_word(self, popen, output_file):
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, builder=self.builder
+        ))
         popen.assert_called_once_with(
-            ["cuneiform", "-f", "hocr", "-o", self.tmp_filename, "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-f", "hocr", "-o", self.tmp_filename, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
         for box in output:
             self.assertIsInstance(box, builders.Box)
 
-    @patch("subprocess.Popen")
+    @patch("asyncio.create_subprocess_exec")
     def test_word_error(self, popen):
-        stdout = MagicMock()
         message = ("Cuneiform for Linux 1.1.0\n"
                    "Magick: Improper image header (example.png) reported by "
                    "coders/png.c:2932 (ReadPNGImage)\n")
-        stdout.stdout.read.return_value = message.encode()
-        stdout.wait.return_value = 1
-        popen.return_value = stdout
+        self.proc.communicate.return_value = (message.encode(), None)
+        self.proc.returncode = 1
+        popen.return_value = self.proc
         with self.assertRaises(cuneiform.CuneiformError) as ce:
-            cuneiform.image_to_string(self.image,
-                                      builder=self.builder)
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder
+            ))
         self.assertEqual(ce.exception.status, 1)
         self.assertEqual(ce.exception.message, message)
 
@@ -259,44 +273,69 @@ class TestCuneiformLineBox(BaseTest):
         get_version.return_value = (4, 0, 0)
         self.builder = builders.LineBoxBuilder()
         self.image = Image.new(mode="RGB", size=(1, 1))
-        self.text_file = StringIO(self._get_file_content("cuneiform.lines"))
-        self.stdout = MagicMock()
-        self.stdout.stdout.read.return_value = b"Cuneiform for Linux 1.1.0\n"
-        self.stdout.wait.return_value = 0
+        self.output = self._get_file_content("cuneiform.lines").encode("utf-8")
+        self.proc = MagicMock()
+        self.proc.communicate = AsyncMock(
+            return_value=(b"Cuneiform for Linux 1.1.0\n", None)
+        )
+        self.proc.returncode = 0
         self.tmp_filename = "/tmp/cuneiform_n0qfk87otxt"
         self.enter = MagicMock()
         self.enter.__enter__.return_value = MagicMock()
         self.enter.__enter__.return_value.configure_mock(
-            name=self.tmp_filename
+            name=self.tmp_filename, pass_fds=()
         )
-
-    @patch("pyocr.cuneiform.temp_file")
-    @patch("codecs.open")
-    @patch("subprocess.Popen")
-    def test_line(self, popen, copen, temp_file):
-        popen.return_value = self.stdout
-        copen.return_value = self.text_file
-        temp_file.return_value = self.enter
-        output = cuneiform.image_to_string(self.image,
-                                           builder=self.builder)
+        self.enter.__enter__.return_value.read.return_value = self.output
+
+    @patch("pyocr.cuneiform.output_file")
+    @patch("asyncio.create_subprocess_exec")
+    def test_line(self, popen, output_file):
+        popen.return_value = self.proc
+        output_file.return_value = self.enter
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, builder=self.builder
+        ))
         popen.assert_called_once_with(
-            ["cuneiform", "-f", "hocr", "-o", self.tmp_filename, "-"],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
+            "cuneiform", "-f", "hocr", "-o", self.tmp_filename, "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, pass_fds=()
         )
         for box in output:
             self.assertIsInstance(box, builders.LineBox)
 
-    @patch("subprocess.Popen")
+    @patch("asyncio.create_subprocess_exec")
     def test_line_error(self, popen):
         message = ("Cuneiform for Linux 1.1.0\n"
                    "Magick: Improper image header (example.png) reported by "
                    "coders/png.c:2932 (ReadPNGImage)\n")
-        self.stdout.stdout.read.return_value = message.encode()
-        self.stdout.wait.return_value = 1
-        popen.return_value = self.stdout
+        self.proc.communicate.return_value = (message.encode(), None)
+        self.proc.returncode = 1
+        popen.return_value = self.proc
         with self.assertRaises(cuneiform.CuneiformError) as ce:
-            cuneiform.image_to_string(self.image,
-                                      builder=self.builder)
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder
+            ))
         self.assertEqual(ce.exception.status, 1)
         self.assertEqual(ce.exception.message, message)
+
+
+class TestCuneiformOutputFile(BaseTest):
+
+    def _check(self):
+        with cuneiform.output_file(".txt") as output:
+            with open(output.name, "w") as file_desc:
+                file_desc.write("content")
+            self.assertEqual(output.read(), b"content")
+            return output.name
+
+    @unittest.skipUnless(cuneiform.g_memfd_supported, "memfd not supported")
+    def test_memory(self):
+        name = self._check()
+        self.assertTrue(name.startswith("/proc/self/fd/"))
+
+    @patch("pyocr.cuneiform.g_memfd_supported", False)
+    def test_file(self):
+        name = self._check()
+        self.assertTrue(name.endswith(".txt"))
+        self.assertFalse(os.path.exists(name))
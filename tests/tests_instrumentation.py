@@ -0,0 +1,135 @@
+import asyncio
+import os
+
+from io import StringIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import instrumentation
+from pyocr import tesseract
+from pyocr.libtesseract import tesseract_raw
+
+from .tests_base import BaseTest
+
+
+class TestSpan(BaseTest):
+
+    def setUp(self):
+        self.stages = []
+
+    def _observer(self, stage, duration):
+        self.assertGreaterEqual(duration, 0)
+        self.stages.append(stage)
+
+    def test_disabled(self):
+        span = instrumentation.span("tesseract.spawn")
+        self.assertIs(span, instrumentation.span("libtesseract.init"))
+        with span:
+            pass
+        self.assertListEqual(self.stages, [])
+
+    def test_observe(self):
+        with instrumentation.observe(self._observer):
+            with instrumentation.span("tesseract.spawn"):
+                with instrumentation.span("tesseract.temp_dir"):
+                    pass
+        with instrumentation.span("tesseract.process"):
+            pass
+        self.assertListEqual(self.stages,
+                             ["tesseract.temp_dir", "tesseract.spawn"])
+
+    def test_exception(self):
+        with instrumentation.observe(self._observer):
+            with self.assertRaises(KeyError):
+                with instrumentation.span("tesseract.process"):
+                    raise KeyError("test")
+        self.assertListEqual(self.stages, ["tesseract.process"])
+
+    def test_failing_observer(self):
+        def failing_observer(stage, duration):
+            raise Exception("test")
+
+        instrumentation.add_observer(failing_observer)
+        instrumentation.add_observer(self._observer)
+        try:
+            with self.assertLogs(instrumentation.logger, "ERROR"):
+                with instrumentation.span("libtesseract.recognize"):
+                    pass
+        finally:
+            instrumentation.remove_observer(failing_observer)
+            instrumentation.remove_observer(self._observer)
+        self.assertListEqual(self.stages, ["libtesseract.recognize"])
+
+    def test_remove_unknown(self):
+        with self.assertRaises(ValueError):
+            instrumentation.remove_observer(self._observer)
+
+
+class TestStages(BaseTest):
+
+    def setUp(self):
+        self.stages = []
+
+    def _observer(self, stage, duration):
+        self.assertIn(stage, instrumentation.STAGES)
+        self.stages.append(stage)
+
+    @patch("pyocr.tesseract.get_version")
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_tesseract(self, run_tesseract, get_version):
+        get_version.return_value = (4, 0, 0)
+        text = self._get_file_content("text")
+
+        async def fake_run_tesseract(input_filename, output_filename_base,
+                                     cwd=None, lang=None, flags=None,
+                                     configs=None, env=None, timeout=None):
+            output = os.path.join(cwd, output_filename_base + ".txt")
+            with open(output, "w", encoding="utf-8") as file_desc:
+                file_desc.write(text)
+            return (0, "")
+
+        run_tesseract.side_effect = fake_run_tesseract
+        image = Image.new(mode="L", size=(10, 10))
+        builder = builders.TextBuilder()
+        with instrumentation.observe(self._observer):
+            asyncio.run(tesseract.image_to_string(image, builder=builder))
+        self.assertListEqual(self.stages, [
+            "tesseract.temp_dir",
+            "tesseract.encode_image",
+            "builder.read_file",
+            "tesseract.read_output",
+            "tesseract.image_to_string",
+        ])
+
+    @patch("pyocr.tesseract.get_version")
+    def test_builders(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        cases = [
+            (builders.TextBuilder(), "text"),
+            (builders.WordBoxBuilder(), "words"),
+            (builders.LineBoxBuilder(), "tesseract.lines"),
+            (tesseract.CharBoxBuilder(), "boxes"),
+        ]
+        with instrumentation.observe(self._observer):
+            for (builder, filename) in cases:
+                builder.read_file(StringIO(self._get_file_content(filename)))
+        self.assertListEqual(self.stages, ["builder.read_file"] * 4)
+
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_tesseract_raw(self, libtess):
+        libtess.TessVersion.return_value = b"4.1.1"
+        libtess.TessBaseAPICreate.return_value = 42
+        image = Image.new(mode="RGB", size=(1, 1))
+        with instrumentation.observe(self._observer):
+            handle = tesseract_raw.init(lang="eng")
+            tesseract_raw.set_image(handle, image)
+            tesseract_raw.set_image_buffer(handle, bytearray(3), 1, 1, 3, 3)
+            tesseract_raw.recognize(handle)
+        self.assertListEqual(self.stages, [
+            "libtesseract.init",
+            "libtesseract.set_image",
+            "libtesseract.set_image",
+            "libtesseract.recognize",
+        ])
@@ -3,12 +3,15 @@ import os
 
 from ctypes import POINTER, cast, c_char_p, c_int
 from random import randint
+from tempfile import TemporaryDirectory
 from unittest.mock import patch, call
 
 from PIL import Image
 
 from pyocr import builders
 from pyocr import libtesseract
+from pyocr import tesseract
+from pyocr import transport
 from pyocr.error import TesseractError
 from pyocr.libtesseract import tesseract_raw
 
@@ -71,6 +74,8 @@ class TestLibTesseract(BaseTest):
                 builders.DigitBuilder,
                 builders.LineBoxBuilder,
                 builders.DigitLineBoxBuilder,
+                builders.PageBuilder,
+                tesseract.CharBoxBuilder,
             ]
         )
 
@@ -143,6 +148,32 @@ class TestLibTesseractRaw(BaseTest):
         self.iterator = randint(0, 2**32-1)
         self.image = Image.new("RGB", size=(1, 1))
 
+    @patch("pyocr.libtesseract.tesseract_raw._bind_functions")
+    @patch("ctypes.cdll.LoadLibrary")
+    @patch("pyocr.libtesseract.tesseract_raw.g_load_attempted", False)
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract", None)
+    def test_lazy_load(self, load_library, bind_functions):
+        lib = load_library.return_value
+        lib.TessVersion.return_value = b"4.1.1"
+        self.assertEqual(tesseract_raw.get_version(), "4.1.1")
+        self.assertTrue(tesseract_raw.is_available())
+        load_library.assert_called_once_with(tesseract_raw.libnames[0])
+        bind_functions.assert_called_once_with(lib)
+
+    @patch("pyocr.libtesseract.tesseract_raw.lib_load_errors", [])
+    @patch("ctypes.cdll.LoadLibrary")
+    @patch("pyocr.libtesseract.tesseract_raw.g_load_attempted", False)
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract", None)
+    def test_lazy_load_missing(self, load_library):
+        load_library.side_effect = OSError("not found")
+        self.assertFalse(tesseract_raw.is_available())
+        self.assertFalse(tesseract_raw.is_available())
+        # loading is attempted only once
+        self.assertEqual(load_library.call_count,
+                         len(tesseract_raw.libnames))
+        self.assertEqual(len(tesseract_raw.lib_load_errors),
+                         len(tesseract_raw.libnames))
+
     @patch("locale.setlocale")
     @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
     def test_init_tesseract4(self, libtess, setlocale):
@@ -214,6 +245,51 @@ class TestLibTesseractRaw(BaseTest):
             libtess.reset_mock()
             setlocale.reset_mock()
 
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_init_variables(self, libtess):
+        libtess.TessVersion.return_value = b"4.1.1"
+        libtess.TessBaseAPICreate.return_value = self.handle
+        api = tesseract_raw.init(
+            "eng", oem=tesseract_raw.OcrEngineMode.LSTM_ONLY,
+            variables={"load_system_dawg": False, "user_words_suffix": "w"}
+        )
+        self.assertEqual(api, self.handle)
+        self.assertFalse(libtess.TessBaseAPIInit3.called)
+        self.assertFalse(libtess.TessBaseAPISetVariable.called)
+        args = libtess.TessBaseAPIInit4.call_args[0]
+        self.assertEqual(len(args), 10)
+        self.assertEqual(args[0].value, self.handle)
+        self.assertEqual(args[2].value, b"eng")
+        self.assertEqual(args[3].value, tesseract_raw.OcrEngineMode.LSTM_ONLY)
+        self.assertEqual(args[8].value, 3)
+        self.assertListEqual(list(args[6]), [
+            b"tessedit_zero_rejection", b"load_system_dawg",
+            b"user_words_suffix",
+        ])
+        self.assertListEqual(list(args[7]), [b"F", b"0", b"w"])
+
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_init_variables_no_init4(self, libtess):
+        libtess.TessVersion.return_value = b"3.5.0"
+        libtess.TessBaseAPICreate.return_value = self.handle
+        del libtess.TessBaseAPIInit4
+        libtess.TessBaseAPISetVariable.side_effect = (True, False)
+        with self.assertLogs(tesseract_raw.logger, "WARNING"):
+            tesseract_raw.init(
+                "eng", oem=tesseract_raw.OcrEngineMode.TESSERACT_ONLY,
+                variables={"load_system_dawg": 0}
+            )
+        args = libtess.TessBaseAPIInit1.call_args[0]
+        self.assertEqual(len(args), 6)
+        self.assertEqual(args[2].value, b"eng")
+        self.assertEqual(args[3].value,
+                         tesseract_raw.OcrEngineMode.TESSERACT_ONLY)
+        self.assertListEqual(
+            [call_args[0][1:]
+             for call_args in libtess.TessBaseAPISetVariable.call_args_list],
+            [(b"tessedit_zero_rejection", b"F"), (b"load_system_dawg", b"0")]
+        )
+
     @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
     def test_init_error(self, libtess):
         libtess.TessBaseAPICreate.return_value = self.handle
@@ -288,6 +364,23 @@ class TestLibTesseractRaw(BaseTest):
         self.assertEqual(args[0].value, self.handle)
         self.assertEqual(args[1].value, 3)
 
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_init_for_layout(self, libtess):
+        libtess.TessBaseAPICreate.return_value = self.handle
+        self.assertEqual(tesseract_raw.init_for_layout(), self.handle)
+        args = libtess.TessBaseAPIInitForAnalysePage.call_args[0]
+        self.assertEqual(args[0].value, self.handle)
+        self.assertFalse(libtess.TessBaseAPIInit3.called)
+
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_set_rectangle(self, libtess):
+        tesseract_raw.set_rectangle(self.handle, 10, 20, 30, 40)
+        args = libtess.TessBaseAPISetRectangle.call_args[0]
+        self.assertEqual(len(args), 5)
+        self.assertEqual(args[0].value, self.handle)
+        self.assertListEqual([arg.value for arg in args[1:]],
+                             [10, 20, 30, 40])
+
     @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
     def test_init_for_analyse_page(self, libtess):
         tesseract_raw.init_for_analyse_page(self.handle)
@@ -312,6 +405,36 @@ class TestLibTesseractRaw(BaseTest):
         self.assertEqual(args[4].value, 3)
         self.assertEqual(args[5].value, self.image.width * 3)
 
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_set_image_buffer(self, libtess):
+        buf = bytearray(self.image.tobytes("raw", "RGB"))
+        tesseract_raw.set_image_buffer(self.handle, buf, 1, 1, 3, 3, 300)
+        self.assertEqual(libtess.TessBaseAPISetImage.call_count, 1)
+        args = libtess.TessBaseAPISetImage.call_args[0]
+        self.assertEqual(len(args), 6)
+        self.assertEqual(args[0].value, self.handle)
+        self.assertEqual(args[2].value, 1)
+        self.assertEqual(args[3].value, 1)
+        self.assertEqual(args[4].value, 3)
+        self.assertEqual(args[5].value, 3)
+        libtess.TessBaseAPISetSourceResolution.assert_called_once()
+        self.assertEqual(
+            libtess.TessBaseAPISetSourceResolution.call_args[0][1], 300
+        )
+
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_set_image_buffer_readonly(self, libtess):
+        buf = self.image.tobytes("raw", "RGB")
+        tesseract_raw.set_image_buffer(self.handle, buf, 1, 1, 3, 3)
+        args = libtess.TessBaseAPISetImage.call_args[0]
+        self.assertEqual(args[1], buf)
+
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_set_image_buffer_too_small(self, libtess):
+        with self.assertRaises(ValueError):
+            tesseract_raw.set_image_buffer(self.handle, b"\0\0", 1, 1, 3, 3)
+        self.assertFalse(libtess.TessBaseAPISetImage.called)
+
     @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
     def test_recognize(self, libtess):
         libtess.TessBaseAPIRecognize.return_value = 0
@@ -573,6 +696,44 @@ class TestLibTesseractRaw(BaseTest):
         self.assertEqual(args[0].value, self.iterator)
         self.assertEqual(args[1], level)
 
+    @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
+    def test_choice_iterator(self, libtess):
+        choice_iterator = randint(0, 2**32-1)
+        libtess.TessResultIteratorGetChoiceIterator.return_value = \
+            choice_iterator
+        self.assertEqual(
+            tesseract_raw.result_iterator_get_choice_iterator(self.iterator),
+            choice_iterator
+        )
+        args = libtess.TessResultIteratorGetChoiceIterator.call_args[0]
+        self.assertEqual(args[0].value, self.iterator)
+
+        libtess.TessChoiceIteratorGetUTF8Text.return_value = "é".encode()
+        self.assertEqual(
+            tesseract_raw.choice_iterator_get_utf8_text(choice_iterator), "é"
+        )
+        # the text belongs to the iterator
+        self.assertFalse(libtess.TessDeleteText.called)
+        libtess.TessChoiceIteratorGetUTF8Text.return_value = None
+        self.assertIsNone(
+            tesseract_raw.choice_iterator_get_utf8_text(choice_iterator)
+        )
+
+        libtess.TessChoiceIteratorConfidence.return_value = 87.5
+        self.assertEqual(
+            tesseract_raw.choice_iterator_get_confidence(choice_iterator),
+            87.5
+        )
+        libtess.TessChoiceIteratorNext.return_value = False
+        self.assertFalse(tesseract_raw.choice_iterator_next(choice_iterator))
+        args = libtess.TessChoiceIteratorNext.call_args[0]
+        self.assertEqual(args[0].value, choice_iterator)
+
+        tesseract_raw.choice_iterator_delete(choice_iterator)
+        args = libtess.TessChoiceIteratorDelete.call_args[0]
+        self.assertEqual(len(args), 1)
+        self.assertEqual(args[0].value, choice_iterator)
+
     @patch("pyocr.libtesseract.tesseract_raw.g_libtesseract")
     def test_detect_os(self, libtess):
         libtess.TessBaseAPIDetectOrientationScript.return_value = True
@@ -765,7 +926,8 @@ class TestLibTesseractText(BaseTest):
             "word1 word2 word3"
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -828,7 +990,8 @@ class TestLibTesseractText(BaseTest):
             "word1 word2 word3"
         )
 
-        raw.init.assert_called_once_with(lang="eng")
+        raw.init.assert_called_once_with(lang="eng", oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -882,7 +1045,8 @@ class TestLibTesseractText(BaseTest):
         self.assertEqual(te.exception.status, "no lang")
         self.assertEqual(te.exception.message, "language fra is not available")
 
-        raw.init.assert_called_once_with(lang="fra")
+        raw.init.assert_called_once_with(lang="fra", oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.cleanup.assert_called_once_with(self.handle)
 
@@ -906,7 +1070,8 @@ class TestLibTesseractText(BaseTest):
             "word1 word2 word3"
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -949,6 +1114,29 @@ class TestLibTesseractText(BaseTest):
             self.iterator, raw.PageIteratorLevel.WORD)
         raw.cleanup.assert_called_once_with(self.handle)
 
+    @patch("pyocr.libtesseract.tesseract_raw")
+    def test_text_shared_image(self, raw):
+        raw.init.return_value = self.handle
+        raw.get_iterator.return_value = self.iterator
+        raw.result_iterator_get_page_iterator.return_value = self.iterator
+        raw.get_available_languages.return_value = ["eng", "fra", "jpn", "osd"]
+        raw.page_iterator_next.side_effect = (False,)
+        raw.page_iterator_bounding_box.return_value = (True, (0, 0, 0, 0))
+        raw.result_iterator_get_utf8_text.side_effect = ("word1",)
+        raw.page_iterator_is_at_beginning_of.side_effect = (True,)
+        raw.page_iterator_is_at_final_element.side_effect = (True,)
+
+        with transport.share_image(self.image) as block:
+            with transport.open_image(block.descriptor) as view:
+                self.assertEqual(
+                    libtesseract.image_to_string(view, builder=self.builder),
+                    "word1"
+                )
+                raw.set_image_buffer.assert_called_once_with(
+                    self.handle, view.buf, 1, 1, 3, 3, transport.DPI_DEFAULT
+                )
+        self.assertFalse(raw.set_image.called)
+
     @patch("pyocr.libtesseract.tesseract_raw")
     def test_text_error(self, raw):
         raw.init.return_value = self.handle
@@ -968,7 +1156,8 @@ class TestLibTesseractText(BaseTest):
         self.assertEqual(te.exception.status, "no script")
         self.assertEqual(te.exception.message, "no script detected")
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1007,7 +1196,8 @@ class TestLibTesseractDigits(BaseTest):
             "1 2 42"
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1084,7 +1274,8 @@ class TestLibTesseractWordBox(BaseTest):
             ]
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1146,7 +1337,8 @@ class TestLibTesseractWordBox(BaseTest):
         self.assertEqual(te.exception.status, "no script")
         self.assertEqual(te.exception.message, "no script detected")
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1192,7 +1384,8 @@ class TestLibTesseractLineBox(BaseTest):
             ]
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1254,7 +1447,8 @@ class TestLibTesseractLineBox(BaseTest):
         self.assertEqual(te.exception.status, "no script")
         self.assertEqual(te.exception.message, "no script detected")
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1299,7 +1493,8 @@ class TestLibTesseractDigitsLineBox(BaseTest):
             ]
         )
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1360,7 +1555,8 @@ class TestLibTesseractDigitsLineBox(BaseTest):
         self.assertEqual(te.exception.status, "no script")
         self.assertEqual(te.exception.message, "no script detected")
 
-        raw.init.assert_called_once_with(lang=None)
+        raw.init.assert_called_once_with(lang=None, oem=None,
+                                         variables=None, datapath=None)
         raw.get_available_languages.assert_called_once_with(self.handle)
         raw.set_page_seg_mode.assert_called_once_with(
             self.handle, self.builder.tesseract_layout)
@@ -1426,3 +1622,76 @@ class TestLibTesseractPDF(BaseTest):
         self.assertFalse(raw.add_renderer_image.called)
         self.assertFalse(raw.end_document.called)
         raw.cleanup.assert_called_once_with(self.handle)
+
+
+class TestLibTesseractImageFile(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.image = Image.new(mode="RGB", size=(3, 2), color=(1, 2, 3))
+        self.builder = builders.TextBuilder()
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("pyocr.libtesseract.image_to_string")
+    def test_image_file_mapped(self, image_to_string):
+        path = os.path.join(self.tmpdir.name, "page.ppm")
+        self.image.save(path)
+        seen = []
+
+        def fake_image_to_string(image, lang=None, builder=None, oem=None,
+                                 variables=None, preset=None, triage=None,
+                                 rescale=None):
+            self.assertIsInstance(image, transport.ImageView)
+            seen.append(bytes(image.buf))
+            return "word"
+
+        image_to_string.side_effect = fake_image_to_string
+        self.assertEqual(
+            libtesseract.image_file_to_string(path, lang="fra",
+                                              builder=self.builder),
+            "word"
+        )
+        self.assertListEqual(seen, [self.image.tobytes()])
+        self.assertEqual(image_to_string.call_args[1],
+                         {"lang": "fra", "builder": self.builder,
+                          "oem": None, "variables": None, "preset": None,
+                          "triage": None, "rescale": None})
+
+    @patch("pyocr.libtesseract.image_to_string")
+    def test_image_file_decoded(self, image_to_string):
+        path = os.path.join(self.tmpdir.name, "page.png")
+        self.image.save(path)
+        seen = []
+
+        def fake_image_to_string(image, lang=None, builder=None, oem=None,
+                                 variables=None, preset=None, triage=None,
+                                 rescale=None):
+            self.assertNotIsInstance(image, transport.ImageView)
+            seen.append(image.tobytes())
+            return "word"
+
+        image_to_string.side_effect = fake_image_to_string
+        self.assertEqual(libtesseract.image_file_to_string(path), "word")
+        self.assertListEqual(seen, [self.image.tobytes()])
+
+    @patch("pyocr.libtesseract.tesseract_raw")
+    def test_detect_orientation_file(self, raw):
+        path = os.path.join(self.tmpdir.name, "page.pgm")
+        self.image.convert("L").save(path)
+        raw.init.return_value = 42
+        raw.detect_os.return_value = {
+            "orientation": raw.Orientation.PAGE_UP,
+            "confidence": 87,
+        }
+        self.assertEqual(
+            libtesseract.detect_orientation_file(path),
+            {"angle": 0, "confidence": 87}
+        )
+        raw.set_image_buffer.assert_called_once()
+        self.assertEqual(raw.set_image_buffer.call_args[0][2:],
+                         (3, 2, 1, 3, transport.DPI_DEFAULT))
+        self.assertFalse(raw.set_image.called)
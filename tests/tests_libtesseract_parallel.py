@@ -0,0 +1,278 @@
+import threading
+
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import libtesseract
+from pyocr import stub
+from pyocr import tesseract
+from pyocr.libtesseract import parallel
+from pyocr.libtesseract import tesseract_raw
+
+from .tests_base import BaseTest
+
+
+class TestParallel(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.page = stub.StubPage.generate(nb_lines=10, nb_words=4)
+        self.stub = stub.StubLibTesseract(self.page, lines_per_block=3)
+        self.stub.start()
+        self.image = Image.new(mode="RGB", size=self.page.size)
+
+    def tearDown(self):
+        self.stub.stop()
+
+    @patch("pyocr.tesseract.get_version")
+    def test_word_boxes(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = parallel.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(), max_workers=3
+        )
+        self.assertListEqual(output, self.page.words)
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_line_boxes(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = parallel.image_to_string(
+            self.image, lang="fra", builder=builders.LineBoxBuilder()
+        )
+        self.assertListEqual(output, self.page.lines)
+        expected = libtesseract.image_to_string(
+            self.image, lang="fra", builder=builders.LineBoxBuilder()
+        )
+        self.assertListEqual(output, expected)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_page(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = parallel.image_to_string(
+            self.image, builder=builders.PageBuilder()
+        )
+        self.assertListEqual([len(block.line_boxes) for block in output],
+                             [3, 3, 3, 1])
+        self.assertListEqual(
+            [line for block in output for line in block.line_boxes],
+            self.page.lines
+        )
+
+    def test_char_boxes(self):
+        output = parallel.image_to_string(
+            self.image, builder=tesseract.CharBoxBuilder(), max_workers=2
+        )
+        self.assertListEqual(output, self.page.get_box_file_char_boxes())
+
+    @patch("pyocr.tesseract.get_version")
+    def test_choices(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = parallel.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(choices=3)
+        )
+        expected = libtesseract.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(choices=3)
+        )
+        self.assertListEqual([word.choices for word in output],
+                             [word.choices for word in expected])
+
+    @patch("pyocr.tesseract.get_version")
+    def test_text(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = parallel.image_to_string(self.image,
+                                          builder=builders.TextBuilder())
+        self.assertEqual(output, self.page.get_text().strip())
+
+    @patch("pyocr.tesseract.get_version")
+    def test_single_block(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.stub.stop()
+        with stub.StubLibTesseract(self.page):
+            with patch("pyocr.libtesseract.tesseract_raw.set_rectangle") \
+                    as set_rectangle:
+                output = parallel.image_to_string(
+                    self.image, builder=builders.WordBoxBuilder()
+                )
+        self.assertListEqual(output, self.page.words)
+        self.assertFalse(set_rectangle.called)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_image_blocks(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.stub.stop()
+        block_types = [
+            tesseract_raw.PolyBlockType.HEADING_TEXT,
+            tesseract_raw.PolyBlockType.FLOWING_IMAGE,
+            tesseract_raw.PolyBlockType.FLOWING_TEXT,
+            tesseract_raw.PolyBlockType.FLOWING_TEXT,
+        ]
+        with stub.StubLibTesseract(self.page, lines_per_block=3,
+                                   block_types=block_types):
+            output = parallel.image_to_string(
+                self.image, builder=builders.LineBoxBuilder()
+            )
+        # the lines of the image block are not recognized
+        self.assertListEqual(output,
+                             self.page.lines[:3] + self.page.lines[6:])
+
+    @patch("pyocr.tesseract.get_version")
+    def test_unknown_lang(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        with self.assertRaises(libtesseract.TesseractError):
+            parallel.image_to_string(self.image, lang="jpn",
+                                     builder=builders.TextBuilder())
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_handle_pool(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        # the blocks take long enough to be recognized on 2 handles
+        self.stub.latency = 0.05
+        with parallel.HandlePool() as handles:
+            for _ in range(3):
+                output = parallel.image_to_string(
+                    self.image, builder=builders.WordBoxBuilder(),
+                    max_workers=2, handles=handles
+                )
+                self.assertListEqual(output, self.page.words)
+            # handles are kept between calls (+1 for the layout analysis)
+            self.assertEqual(self.stub.nb_handles, 3)
+            output = parallel.image_to_string(
+                self.image, builder=builders.WordBoxBuilder(),
+                max_workers=2, handles=handles, preset="fast"
+            )
+            self.assertEqual(self.stub.nb_handles, 5)
+        self.assertEqual(self.stub.nb_handles, 0)
+        with self.assertRaises(ValueError):
+            with handles.handle():
+                pass
+
+    @patch("pyocr.tesseract.get_version")
+    def test_image_converted_once(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        with patch.object(tesseract_raw, "set_image",
+                          wraps=tesseract_raw.set_image) as set_image:
+            with patch.object(
+                    tesseract_raw, "set_image_buffer",
+                    wraps=tesseract_raw.set_image_buffer) as set_buffer:
+                output = parallel.image_to_string(
+                    self.image, builder=builders.WordBoxBuilder(),
+                    max_workers=2
+                )
+        self.assertListEqual(output, self.page.words)
+        self.assertFalse(set_image.called)
+        # the layout analysis, then each block, from the same pixels
+        self.assertEqual(set_buffer.call_count, 1 + 4)
+        self.assertEqual(
+            len({id(call[0][1]) for call in set_buffer.call_args_list}), 1
+        )
+
+    @patch("pyocr.tesseract.get_version")
+    def test_shared_pool(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        # two pages, told apart by their resolution
+        images = []
+        for dpi in (200, 300):
+            image = Image.new(mode="RGB", size=self.page.size)
+            image.info['dpi'] = (dpi, dpi)
+            images.append(image)
+        current = threading.local()
+        recognized = []
+        # the two calls recognize their blocks in lockstep, so the handles
+        # go from one call to the other between the blocks
+        barrier = threading.Barrier(2, timeout=10)
+        recognize_block = parallel._recognize_block
+        stub_recognize = self.stub.TessBaseAPIRecognize
+
+        def _recognize_block(handles, image, *args):
+            current.dpi = image.dpi
+            try:
+                return recognize_block(handles, image, *args)
+            finally:
+                barrier.wait()
+
+        def recognize(handle, monitor):
+            recognized.append((current.dpi, self.stub._handle(handle).dpi))
+            return stub_recognize(handle, monitor)
+
+        outputs = []
+
+        def run(handles, image):
+            for _ in range(3):
+                outputs.append(parallel.image_to_string(
+                    image, builder=builders.WordBoxBuilder(),
+                    max_workers=1, handles=handles
+                ))
+
+        self.stub.TessBaseAPIRecognize = recognize
+        with patch("pyocr.libtesseract.parallel._recognize_block",
+                   _recognize_block):
+            with parallel.HandlePool() as handles:
+                threads = [
+                    threading.Thread(target=run, args=(handles, image))
+                    for image in images
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(len(outputs), 6)
+        for output in outputs:
+            self.assertListEqual(output, self.page.words)
+        # each block is recognized on the page of its own call
+        self.assertEqual(len(recognized), 6 * 4)
+        for (expected, dpi) in recognized:
+            self.assertEqual(dpi, expected)
+
+
+class TestHandlePool(BaseTest):
+
+    @patch("pyocr.libtesseract.tesseract_raw.cleanup")
+    @patch("pyocr.libtesseract.tesseract_raw.init")
+    def test_reuse(self, init, cleanup):
+        init.side_effect = [1, 2]
+        pool = parallel.HandlePool()
+        with pool.handle("fra") as handle:
+            self.assertEqual(handle, 1)
+        with pool.handle("fra") as handle:
+            self.assertEqual(handle, 1)
+        with pool.handle("eng") as handle:
+            self.assertEqual(handle, 2)
+        self.assertEqual(init.call_count, 2)
+        init.assert_called_with(lang="eng", oem=None, variables=None,
+                                datapath=None)
+        self.assertFalse(cleanup.called)
+        pool.close()
+        self.assertEqual(cleanup.call_count, 2)
+
+    @patch("pyocr.libtesseract.tesseract_raw.cleanup")
+    @patch("pyocr.libtesseract.tesseract_raw.init_for_layout")
+    @patch("pyocr.libtesseract.tesseract_raw.init")
+    def test_layout_handle(self, init, init_for_layout, cleanup):
+        init.return_value = 1
+        init_for_layout.return_value = 2
+        with parallel.HandlePool() as pool:
+            with pool.layout_handle() as handle:
+                self.assertEqual(handle, 2)
+            with pool.handle() as handle:
+                self.assertEqual(handle, 1)
+            with pool.layout_handle() as handle:
+                self.assertEqual(handle, 2)
+            self.assertEqual(init_for_layout.call_count, 1)
+        self.assertEqual(cleanup.call_count, 2)
+
+    @patch("pyocr.libtesseract.tesseract_raw.cleanup")
+    @patch("pyocr.libtesseract.tesseract_raw.init")
+    def test_error(self, init, cleanup):
+        init.side_effect = [1, 2]
+        pool = parallel.HandlePool()
+        with self.assertRaises(RuntimeError):
+            with pool.handle() as handle:
+                raise RuntimeError()
+        cleanup.assert_called_once_with(1)
+        with pool.handle() as handle:
+            self.assertEqual(handle, 2)
+        pool.close()
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+
+from random import randint
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import transport
+from pyocr.error import TesseractError
+from pyocr.libtesseract import pool
+
+from .tests_base import BaseTest
+
+
+class TestProcessPoolJob(BaseTest):
+
+    def setUp(self):
+        patcher = patch("pyocr.tesseract.get_version")
+        patcher.start().return_value = (4, 0, 0)
+        self.addCleanup(patcher.stop)
+        self.handle = randint(0, 2**32-1)
+        self.image = Image.new(mode="RGB", size=(3, 2), color=(1, 2, 3))
+        self.image.info['dpi'] = (300, 300)
+        self.engine_config = {"oem": None, "variables": None,
+                              "datapath": None}
+
+    @patch("pyocr.libtesseract._image_to_string")
+    @patch("pyocr.libtesseract.pool.tesseract_raw")
+    def test_run_job(self, raw, image_to_string):
+        raw.init.return_value = self.handle
+        seen = []
+
+        def fake_image_to_string(handle, image, lang, builder):
+            seen.append((handle, bytes(image.buf), image.dpi, lang))
+            builder.start_line(((0, 0), (1, 1)))
+            builder.add_word("word", ((0, 0), (1, 1)), 90)
+
+        image_to_string.side_effect = fake_image_to_string
+
+        handles = {}
+        for _ in range(2):
+            with transport.share_image(self.image) as block:
+                job = (block.descriptor, "fra", builders.TextBuilder(),
+                       self.engine_config)
+                output = pool._run_job(handles, job)
+            self.assertEqual(output, "word")
+
+        # the handle is kept between jobs
+        raw.init.assert_called_once_with(lang="fra", oem=None,
+                                         variables=None, datapath=None)
+        self.assertEqual(handles, {("fra", None, None, ()): self.handle})
+        self.assertListEqual(seen, [
+            (self.handle, self.image.tobytes(), 300, "fra"),
+        ] * 2)
+
+    @patch("pyocr.libtesseract._image_to_string")
+    @patch("pyocr.libtesseract.pool.tesseract_raw")
+    def test_run_job_digits(self, raw, image_to_string):
+        raw.init.return_value = self.handle
+        with transport.share_image(self.image.convert("L")) as block:
+            job = (block.descriptor, None, builders.DigitBuilder(),
+                   self.engine_config)
+            pool._run_job({}, job)
+        # the handle is reused for other builders: whitelist is reset
+        raw.set_is_numeric.assert_called_once_with(self.handle, False)
+
+    @patch("pyocr.libtesseract._image_to_string")
+    @patch("pyocr.libtesseract.pool.tesseract_raw")
+    def test_run_job_configs(self, raw, image_to_string):
+        raw.init.side_effect = lambda **kwargs: randint(0, 2**32-1)
+        configs = [
+            (None, None, None),
+            (1, None, None),
+            (1, {"load_system_dawg": False, "tessedit_do_invert": 0}, None),
+            # same configuration as the previous one
+            (1, {"tessedit_do_invert": "0", "load_system_dawg": False}, None),
+            (1, {"load_system_dawg": False, "tessedit_do_invert": 0},
+             "/usr/share/tessdata_fast"),
+        ]
+        handles = {}
+        with transport.share_image(self.image) as block:
+            for (oem, variables, datapath) in configs:
+                engine_config = {
+                    "oem": oem, "variables": variables, "datapath": datapath
+                }
+                job = (block.descriptor, "eng", builders.TextBuilder(),
+                       engine_config)
+                pool._run_job(handles, job)
+        self.assertEqual(len(handles), 4)
+        self.assertEqual(raw.init.call_count, 4)
+        raw.init.assert_called_with(
+            lang="eng", oem=1,
+            variables={"load_system_dawg": False, "tessedit_do_invert": 0},
+            datapath="/usr/share/tessdata_fast"
+        )
+
+
+def _fake_run_job(handles, job):
+    (descriptor, lang, builder, engine_config) = job
+    if lang == "crash":
+        os._exit(1)
+    if lang == "crash_once":
+        marker = os.path.join(os.environ['PYOCR_TEST_MARKER'], "crashed")
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            os._exit(1)
+    if lang == "error":
+        raise TesseractError("no lang", "language error is not available")
+    return "{}x{}".format(*descriptor.size)
+
+
+class TestProcessPool(BaseTest):
+
+    def setUp(self):
+        self.image = Image.new(mode="RGB", size=(3, 2))
+        self.tmpdir = TemporaryDirectory()
+
+        # workers are forked: they inherit the patches
+        patchers = [
+            patch("pyocr.tesseract.get_version", return_value=(4, 0, 0)),
+            patch("pyocr.libtesseract.pool._run_job", _fake_run_job),
+            patch.dict(os.environ, {"PYOCR_TEST_MARKER": self.tmpdir.name}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pool = pool.ProcessPool(
+            processes=2, mp_context=multiprocessing.get_context("fork")
+        )
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_image_to_string(self):
+        self.assertEqual(self.pool.image_to_string(self.image), "3x2")
+
+    def test_error(self):
+        with self.assertRaises(TesseractError) as te:
+            self.pool.image_to_string(self.image, lang="error")
+        self.assertEqual(te.exception.status, "no lang")
+        self.assertEqual(self.pool.image_to_string(self.image), "3x2")
+
+    def test_crash_retry(self):
+        self.assertEqual(
+            self.pool.image_to_string(self.image, lang="crash_once"), "3x2"
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmpdir.name, "crashed"))
+        )
+
+    def test_crash_twice(self):
+        with self.assertRaises(TesseractError) as te:
+            self.pool.image_to_string(self.image, lang="crash")
+        self.assertEqual(te.exception.status, "crashed")
+        # crashed workers have been replaced
+        for _ in range(4):
+            self.assertEqual(self.pool.image_to_string(self.image), "3x2")
+
+    def test_closed(self):
+        self.pool.close()
+        with self.assertRaises(ValueError):
+            self.pool.image_to_string(self.image)
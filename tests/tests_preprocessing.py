@@ -0,0 +1,217 @@
+import asyncio
+import math
+import os
+import unittest
+
+from unittest.mock import patch
+
+from PIL import Image
+from PIL import ImageDraw
+
+from pyocr import builders
+from pyocr import libtesseract
+from pyocr import stub
+from pyocr import tesseract
+from pyocr import transport
+
+from .tests_base import BaseTest
+
+try:
+    import numpy
+    from pyocr import preprocessing
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def _text_image(size=(200, 100), background=(230, 220, 210)):
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+    for top in range(10, size[1] - 10, 20):
+        draw.rectangle((10, top, size[0] - 10, top + 6), fill=(10, 20, 30))
+    return image
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestRaster(BaseTest):
+
+    def test_from_pil(self):
+        image = _text_image()
+        image.info['dpi'] = (300, 300)
+        raster = preprocessing.Raster.from_pil(image)
+        self.assertEqual(raster.mode, "RGB")
+        self.assertEqual(raster.size, (200, 100))
+        self.assertEqual(raster.pixels.shape, (100, 200, 3))
+        self.assertEqual(raster.dpi, 300)
+        self.assertEqual(raster.bytes_per_line, 600)
+        self.assertEqual(raster.buf.nbytes, 600 * 100)
+        self.assertEqual(raster.to_pil().tobytes(), image.tobytes())
+
+        raster = preprocessing.Raster.from_pil(Image.new("1", (20, 10)))
+        self.assertEqual(raster.mode, "L")
+        self.assertEqual(raster.bytes_per_pixel, 1)
+        self.assertEqual(raster.dpi, transport.DPI_DEFAULT)
+        raster = preprocessing.Raster.from_pil(image.convert("RGBA"))
+        self.assertEqual(raster.mode, "RGB")
+        # stored as 0 by some files: unknown
+        image.info['dpi'] = (0, 0)
+        raster = preprocessing.Raster.from_pil(image)
+        self.assertEqual(raster.dpi, transport.DPI_DEFAULT)
+
+    def test_invalid(self):
+        for pixels in (numpy.zeros((5, 5), numpy.float32),
+                       numpy.zeros((5, 5, 4), numpy.uint8),
+                       numpy.zeros(5, numpy.uint8)):
+            with self.assertRaises(ValueError):
+                preprocessing.Raster(pixels)
+
+    def test_to_pil_shared(self):
+        raster = preprocessing.Raster(numpy.zeros((10, 20), numpy.uint8),
+                                      dpi=150)
+        image = raster.to_pil()
+        raster.pixels[2, 3] = 42
+        self.assertEqual(image.getpixel((3, 2)), 42)
+        self.assertEqual(image.info['dpi'], (150, 150))
+        # RGB: copied by Pillow
+        raster = preprocessing.Raster(numpy.zeros((10, 20, 3), numpy.uint8))
+        image = raster.to_pil()
+        raster.pixels[2, 3] = 42
+        self.assertEqual(image.getpixel((3, 2)), (0, 0, 0))
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestStages(BaseTest):
+
+    def setUp(self):
+        self.image = _text_image()
+        self.raster = preprocessing.Raster.from_pil(self.image)
+
+    def test_grayscale(self):
+        gray = preprocessing.Grayscale()(self.raster)
+        self.assertEqual(gray.mode, "L")
+        expected = numpy.array(self.image.convert("L"), numpy.int16)
+        self.assertLessEqual(
+            numpy.abs(gray.pixels.astype(numpy.int16) - expected).max(), 1
+        )
+        self.assertIs(preprocessing.Grayscale()(gray), gray)
+
+    def test_otsu_threshold(self):
+        pixels = numpy.array([10] * 60 + [200] * 40 + [90, 120], numpy.uint8)
+        threshold = preprocessing.otsu_threshold(pixels)
+        self.assertGreaterEqual(threshold, 90)
+        self.assertLess(threshold, 120)
+
+    def test_otsu(self):
+        gray = preprocessing.Grayscale()(self.raster)
+        pixels = gray.pixels
+        output = preprocessing.Otsu()(gray)
+        # in place
+        self.assertIs(output, gray)
+        self.assertIs(output.pixels, pixels)
+        self.assertListEqual(numpy.unique(pixels).tolist(), [0, 255])
+        self.assertEqual(pixels[0, 0], 255)
+        self.assertEqual(pixels[12, 50], 0)
+
+    def test_sauvola(self):
+        # background getting darker from left to right: no global threshold
+        # separates the text from the background
+        (height, width) = (100, 200)
+        background = numpy.linspace(250, 60, width).astype(numpy.uint8)
+        pixels = numpy.repeat(background[None, :], height, axis=0)
+        for top in range(10, height - 10, 20):
+            pixels[top:top + 6, 10:width - 10] //= 3
+        raster = preprocessing.Raster(pixels)
+        output = preprocessing.Sauvola(window=15)(raster)
+        self.assertIs(output.pixels, pixels)
+        self.assertListEqual(numpy.unique(pixels).tolist(), [0, 255])
+        # text is black, background white, on both sides of the page
+        for column in (20, width - 20):
+            self.assertEqual(pixels[12, column], 0)
+            self.assertEqual(pixels[3, column], 255)
+        with self.assertRaises(ValueError):
+            preprocessing.Sauvola(window=1)
+
+    def test_normalize_dpi(self):
+        self.raster.dpi = 600
+        output = preprocessing.NormalizeDpi(300)(self.raster)
+        self.assertEqual(output.size, (100, 50))
+        self.assertEqual(output.dpi, 300)
+        self.assertEqual(output.mode, "RGB")
+        self.raster.dpi = 290
+        self.assertIs(preprocessing.NormalizeDpi(300)(self.raster),
+                      self.raster)
+        # unknown resolution
+        self.raster.dpi = transport.DPI_DEFAULT
+        self.assertIs(preprocessing.NormalizeDpi(300)(self.raster),
+                      self.raster)
+        self.raster.dpi = 0
+        self.assertIs(preprocessing.NormalizeDpi(300)(self.raster),
+                      self.raster)
+
+    def test_pipeline(self):
+        self.image.info['dpi'] = (150, 150)
+        pipeline = preprocessing.Pipeline([
+            preprocessing.Grayscale(),
+            preprocessing.NormalizeDpi(300),
+            preprocessing.Otsu(),
+        ])
+        raster = pipeline(self.image)
+        self.assertEqual(raster.size, (400, 200))
+        self.assertEqual(raster.mode, "L")
+        self.assertEqual(raster.dpi, 300)
+        self.assertListEqual(numpy.unique(raster.pixels).tolist(), [0, 255])
+        self.assertIs(preprocessing.Pipeline([])(raster), raster)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestStubPreprocessing(BaseTest):
+
+    def setUp(self):
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.raster = preprocessing.Pipeline([preprocessing.Grayscale()])(
+            _text_image()
+        )
+
+    def test_deskew(self):
+        self.page.deskew_angle = math.radians(3)
+        with stub.StubLibTesseract(self.page):
+            self.assertAlmostEqual(
+                libtesseract.get_deskew_angle(self.raster),
+                math.radians(3), places=5
+            )
+            pixels = self.raster.pixels.copy()
+            output = preprocessing.Deskew()(self.raster)
+        self.assertEqual(output.size, self.raster.size)
+        self.assertFalse(numpy.array_equal(output.pixels, pixels))
+        # uncovered corners are white
+        self.assertEqual(output.pixels[0, -1], 255)
+
+        self.page.deskew_angle = math.radians(0.05)
+        with stub.StubLibTesseract(self.page):
+            self.assertIs(preprocessing.Deskew()(self.raster), self.raster)
+
+    def test_deskew_empty_page(self):
+        with stub.StubLibTesseract(stub.StubPage([], deskew_angle=0.5)):
+            self.assertEqual(libtesseract.get_deskew_angle(self.raster), 0.0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_libtesseract(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.raster.dpi = 300
+        with stub.StubLibTesseract(self.page) as libtess:
+            with patch.object(libtess, "TessBaseAPISetImage",
+                              wraps=libtess.TessBaseAPISetImage) as set_image:
+                output = libtesseract.image_to_string(
+                    self.raster, builder=builders.LineBoxBuilder()
+                )
+        self.assertListEqual(output, self.page.lines)
+        args = [libtess._value(arg) for arg in set_image.call_args[0][2:]]
+        self.assertListEqual(args, [200, 100, 1, 200])
+
+    @unittest.skipIf(os.name == "nt",
+                     "fake executables require a POSIX system")
+    @patch("pyocr.tesseract.get_version")
+    def test_tesseract(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        with stub.StubTesseract(self.page):
+            output = asyncio.run(tesseract.image_to_string(self.raster))
+        self.assertEqual(output, self.page.get_text().strip())
@@ -0,0 +1,44 @@
+from pyocr import presets
+
+from .tests_base import BaseTest
+
+
+class TestPresets(BaseTest):
+
+    def test_get_preset(self):
+        self.assertIsNone(presets.get_preset(None))
+        for name in ("fast", "balanced", "accurate"):
+            self.assertEqual(presets.get_preset(name).name, name)
+        with self.assertRaises(ValueError):
+            presets.get_preset("fastest")
+
+    def test_fast(self):
+        preset = presets.get_preset("fast")
+        (oem, variables) = preset.get_engine_config((4, 1, 1))
+        self.assertEqual(oem, 1)
+        self.assertFalse(variables["load_system_dawg"])
+        self.assertFalse(variables["tessedit_do_invert"])
+        self.assertEqual(preset.thread_limit, 1)
+
+    def test_tesseract3(self):
+        # no LSTM engine in Tesseract 3
+        preset = presets.get_preset("fast")
+        (oem, variables) = preset.get_engine_config((3, 5, 0))
+        self.assertIsNone(oem)
+
+    def test_tesseract5_variables(self):
+        preset = presets.get_preset("accurate")
+        self.assertDictEqual(preset.get_engine_config((4, 1, 1))[1], {})
+        self.assertDictEqual(preset.get_engine_config((5, 3, 0))[1],
+                             {"thresholding_method": 1})
+
+    def test_override(self):
+        preset = presets.get_preset("fast")
+        (oem, variables) = preset.get_engine_config(
+            (4, 1, 1), oem=0, variables={"tessedit_do_invert": True}
+        )
+        self.assertEqual(oem, 0)
+        self.assertTrue(variables["tessedit_do_invert"])
+        self.assertFalse(variables["load_freq_dawg"])
+        # the preset is not modified
+        self.assertFalse(preset.variables["tessedit_do_invert"])
@@ -0,0 +1,115 @@
+import os
+
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import scaling
+from pyocr import tesseract
+from pyocr import transport
+from pyocr.libtesseract import tesseract_raw
+
+from .tests_base import BaseTest
+
+
+def _line(top, height):
+    return builders.LineBox([], ((0, top), (100, top + height)))
+
+
+class TestRescale(BaseTest):
+
+    def setUp(self):
+        self.image = Image.new(mode="RGB", size=(200, 100))
+
+    def test_invalid(self):
+        for kwargs in ({"dpi": 0}, {"line_height": -1}, {"max_scale": 0.5}):
+            with self.assertRaises(ValueError):
+                scaling.Rescale(**kwargs)
+
+    def test_get_dpi(self):
+        self.assertEqual(scaling.get_dpi(self.image), transport.DPI_DEFAULT)
+        self.image.info['dpi'] = (299.9992, 299.9992)
+        self.assertEqual(scaling.get_dpi(self.image), 300)
+        # stored as 0 by some files: unknown
+        self.image.info['dpi'] = (0, 0)
+        self.assertEqual(scaling.get_dpi(self.image), transport.DPI_DEFAULT)
+
+    def test_scale_dpi(self):
+        rescale = scaling.Rescale(dpi=300)
+        # unknown resolution
+        self.assertEqual(rescale.get_scale(self.image), 1.0)
+        self.image.info['dpi'] = (600, 600)
+        self.assertEqual(rescale.get_scale(self.image), 0.5)
+        self.image.info['dpi'] = (150, 150)
+        self.assertEqual(rescale.get_scale(self.image), 2.0)
+        self.image.info['dpi'] = (290, 290)
+        self.assertEqual(rescale.get_scale(self.image), 1.0)
+        self.image.info['dpi'] = (2400, 2400)
+        self.assertEqual(rescale.get_scale(self.image), 0.25)
+        self.image.info['dpi'] = (0, 0)
+        self.assertEqual(rescale.get_scale(self.image), 1.0)
+        self.assertEqual(rescale.resize(self.image, 2).info['dpi'],
+                         (transport.DPI_DEFAULT,) * 2)
+
+    def test_scale_line_height(self):
+        rescale = scaling.Rescale(line_height=40)
+        block = builders.Block(
+            tesseract_raw.PolyBlockType.FLOWING_TEXT,
+            [builders.Paragraph([_line(0, 18), _line(20, 20), _line(45, 21)],
+                                ((0, 0), (100, 66)))],
+            ((0, 0), (100, 66))
+        )
+        self.assertEqual(rescale.get_scale(self.image, [block]), 2.0)
+        # no text
+        self.assertEqual(rescale.get_scale(self.image, []), 1.0)
+        # no layout analysis: rescaled to the resolution
+        self.image.info['dpi'] = (600, 600)
+        self.assertEqual(rescale.get_scale(self.image), 0.5)
+
+    def test_resize(self):
+        self.image.info['dpi'] = (600, 600)
+        resized = scaling.Rescale.resize(self.image, 0.5)
+        self.assertEqual(resized.size, (100, 50))
+        self.assertEqual(resized.info['dpi'], (300, 300))
+        self.assertEqual(self.image.size, (200, 100))
+
+    def test_resize_view(self):
+        with transport.share_image(self.image.convert("L")) as block:
+            with transport.open_image(block.descriptor) as view:
+                resized = scaling.Rescale.resize(view, 2)
+        self.assertEqual(resized.size, (400, 200))
+        self.assertEqual(resized.mode, "L")
+        self.assertEqual(resized.info['dpi'], (transport.DPI_DEFAULT,) * 2)
+
+    def test_map_output(self):
+        word = builders.Box("word", ((10, 20), (30, 41)),
+                            char_boxes=[builders.Box("w", ((10, 20),
+                                                           (15, 41)))])
+        line = builders.LineBox([word], ((10, 20), (30, 41)))
+        paragraph = builders.Paragraph([line], ((10, 20), (30, 41)))
+        block = builders.Block(tesseract_raw.PolyBlockType.FLOWING_TEXT,
+                               [paragraph], ((0, 0), (50, 50)))
+        output = [block]
+        self.assertIs(scaling.map_output(output, (200, 100), (100, 50)),
+                      output)
+        self.assertEqual(block.position, ((0, 0), (100, 100)))
+        self.assertEqual(paragraph.position, ((20, 40), (60, 82)))
+        self.assertEqual(line.position, ((20, 40), (60, 82)))
+        self.assertEqual(word.position, ((20, 40), (60, 82)))
+        self.assertEqual(word.char_boxes[0].position, ((20, 40), (30, 82)))
+        self.assertEqual(scaling.map_output("text", (200, 100), (100, 50)),
+                         "text")
+
+
+class TestSaveImage(BaseTest):
+
+    def test_dpi(self):
+        image = Image.new(mode="L", size=(20, 10))
+        image.info['dpi'] = (300, 300)
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "input.bmp")
+            tesseract._save_image(image, path)
+            with Image.open(path) as saved:
+                self.assertEqual(saved.mode, "RGB")
+                self.assertEqual(scaling.get_dpi(saved), 300)
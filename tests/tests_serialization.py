@@ -0,0 +1,136 @@
+import unittest
+
+from io import BytesIO
+from unittest.mock import patch
+
+from pyocr import builders
+from pyocr import serialization
+
+from .tests_base import BaseTest
+
+
+class TestSerializationWordBoxes(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.builder = builders.WordBoxBuilder()
+
+    def _assert_boxes_equal(self, boxes, expected):
+        self.assertEqual(len(boxes), len(expected))
+        for (box, box_expected) in zip(boxes, expected):
+            self.assertIsInstance(box, builders.Box)
+            self.assertEqual(box.content, box_expected.content)
+            self.assertEqual(box.position, box_expected.position)
+            self.assertEqual(box.confidence, box_expected.confidence)
+
+    def test_round_trip(self):
+        for filename in ("words", "words_bbox", "cuneiform.words"):
+            boxes = self.builder.read_file(self._get_file_handle(filename))
+            self.assertNotEqual(boxes, [])
+            data = serialization.dumps(boxes)
+            self.assertIsInstance(data, bytes)
+            self._assert_boxes_equal(serialization.loads(data), boxes)
+
+    def test_smaller_than_hocr(self):
+        hocr = self._get_file_content("words")
+        boxes = self.builder.read_file(self._get_file_handle("words"))
+        self.assertLess(len(serialization.dumps(boxes)), len(hocr))
+
+    def test_columns(self):
+        boxes = [
+            builders.Box("word1", ((10, 11), (12, 13)), 95),
+            builders.Box("\xe9t\xe9", ((11, 12), (13, 14))),
+            builders.Box("", ((12, 13), (14, 15))),
+            builders.Box("🖨", ((13, 14), (15, 16)), 87),
+        ]
+        data = bytearray(serialization.dumps(boxes))
+        columns = serialization.loads_columns(data)
+        self.assertIsInstance(columns, serialization.BoxColumns)
+        self.assertEqual(len(columns), 4)
+        self.assertListEqual(list(columns.left), [10, 11, 12, 13])
+        self.assertListEqual(list(columns.bottom), [13, 14, 15, 16])
+        self.assertListEqual(list(columns.confidence), [95, 0, 0, 87])
+        self.assertEqual(columns.get_content(1), "\xe9t\xe9")
+        self.assertEqual(columns.get_content(2), "")
+        self.assertEqual(columns[-1].content, "🖨")
+        self._assert_boxes_equal(columns.to_boxes(), boxes)
+        with self.assertRaises(IndexError):
+            columns[4]
+
+        # columns share the memory of the encoded data
+        data[8 + 4] = 42
+        self.assertEqual(columns.left[0], 42)
+
+    def test_float_confidence(self):
+        boxes = [builders.Box("word", ((1, 2), (3, 4)), 91.6)]
+        output = serialization.loads(serialization.dumps(boxes))
+        self.assertEqual(output[0].confidence, 91)
+
+    def test_empty(self):
+        self.assertListEqual(
+            serialization.loads(serialization.dumps([])), []
+        )
+
+    def test_file(self):
+        boxes = self.builder.read_file(self._get_file_handle("words"))
+        output = BytesIO()
+        serialization.dump(boxes, output)
+        output.seek(0)
+        self._assert_boxes_equal(serialization.load(output), boxes)
+
+
+class TestSerializationLineBoxes(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.builder = builders.LineBoxBuilder()
+
+    def test_round_trip(self):
+        for filename in ("tesseract.lines", "cuneiform.lines",
+                         "digits.lines"):
+            lines = self.builder.read_file(self._get_file_handle(filename))
+            self.assertNotEqual(lines, [])
+            output = serialization.loads(serialization.dumps(lines))
+            self.assertEqual(len(output), len(lines))
+            for (line, line_expected) in zip(output, lines):
+                self.assertIsInstance(line, builders.LineBox)
+                self.assertEqual(line.position, line_expected.position)
+                self.assertEqual(line.content, line_expected.content)
+                self.assertListEqual(
+                    [(box.position, box.confidence)
+                     for box in line.word_boxes],
+                    [(box.position, box.confidence)
+                     for box in line_expected.word_boxes],
+                )
+
+    def test_columns(self):
+        lines = self.builder.read_file(
+            self._get_file_handle("tesseract.lines")
+        )
+        columns = serialization.loads_columns(serialization.dumps(lines))
+        self.assertIsInstance(columns, serialization.LineBoxColumns)
+        self.assertEqual(len(columns), len(lines))
+        self.assertEqual(len(columns.words),
+                         sum(len(line.word_boxes) for line in lines))
+        self.assertEqual(columns.get_position(0), lines[0].position)
+        self.assertEqual(columns[0].content, lines[0].content)
+
+
+class TestSerializationErrors(unittest.TestCase):
+
+    def test_bad_magic(self):
+        with self.assertRaises(ValueError):
+            serialization.loads(b"XXXX\x01\x00\x00\x00\x00\x00\x00\x00")
+
+    def test_bad_version(self):
+        with self.assertRaises(ValueError):
+            serialization.loads(b"POCR\x02\x00\x00\x00\x00\x00\x00\x00")
+
+    def test_truncated(self):
+        data = serialization.dumps([builders.Box("word", ((1, 2), (3, 4)))])
+        with self.assertRaises(ValueError):
+            serialization.loads(data[:-2])
+        with self.assertRaises(ValueError):
+            serialization.loads(data[:4])
@@ -0,0 +1,238 @@
+import asyncio
+import os
+import time
+import unittest
+
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import concurrency
+from pyocr import libtesseract
+from pyocr import stream
+from pyocr import stub
+
+from .tests_base import BaseTest
+
+
+class FakeTool(object):
+    """
+    OCR tool whose pages are the durations of their recognition.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.cancelled = []
+        self.builders = []
+
+    async def image_to_string(self, page, lang=None, builder=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.builders.append(builder)
+        try:
+            await asyncio.sleep(page)
+            return "page {} ({})".format(page, lang)
+        except asyncio.CancelledError:
+            self.cancelled.append(page)
+            raise
+        finally:
+            self.running -= 1
+
+    async def image_file_to_string(self, path, lang=None, builder=None):
+        return "file " + path
+
+
+class FailingTool(FakeTool):
+
+    async def image_to_string(self, page, lang=None, builder=None):
+        if page is None:
+            await asyncio.sleep(0)
+            raise ValueError("invalid page")
+        return await super(FailingTool, self).image_to_string(
+            page, lang=lang, builder=builder
+        )
+
+
+async def _collect(results):
+    return [item async for item in results]
+
+
+class TestStream(BaseTest):
+
+    def setUp(self):
+        self.tool = FakeTool()
+
+    def test_completion_order(self):
+        results = asyncio.run(_collect(stream.ocr_stream(
+            [0.06, 0.01, 0.03], tool=self.tool, lang="fra", max_in_flight=3
+        )))
+        self.assertListEqual(results, [
+            (1, "page 0.01 (fra)"),
+            (2, "page 0.03 (fra)"),
+            (0, "page 0.06 (fra)"),
+        ])
+
+    def test_max_in_flight(self):
+        pulled = []
+
+        def pages():
+            for page in range(6):
+                pulled.append(page)
+                yield 0.01
+
+        async def run():
+            results = []
+            async for (page_index, result) in stream.ocr_stream(
+                    pages(), tool=self.tool, max_in_flight=2):
+                # pages are taken only when there is a free slot
+                self.assertLessEqual(len(pulled), len(results) + 4)
+                results.append(page_index)
+            return results
+
+        results = asyncio.run(run())
+        self.assertListEqual(sorted(results), list(range(6)))
+        self.assertEqual(self.tool.max_running, 2)
+
+    def test_async_pages(self):
+        async def pages():
+            for page in (0.02, 0.01, "page.png"):
+                await asyncio.sleep(0)
+                yield page
+
+        results = asyncio.run(_collect(stream.ocr_stream(
+            pages(), tool=self.tool, max_in_flight=2
+        )))
+        self.assertListEqual(sorted(results), [
+            (0, "page 0.02 (None)"),
+            (1, "page 0.01 (None)"),
+            (2, "file page.png"),
+        ])
+
+    @patch("pyocr.tesseract.get_version")
+    def test_builder_factory(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        asyncio.run(_collect(stream.ocr_stream(
+            [0, 0], tool=self.tool, builder_factory=builders.TextBuilder
+        )))
+        self.assertEqual(len(self.tool.builders), 2)
+        self.assertIsNot(self.tool.builders[0], self.tool.builders[1])
+        with self.assertRaises(ValueError):
+            stream.ocr_stream([0], tool=self.tool,
+                              builder=builders.TextBuilder())
+        with self.assertRaises(ValueError):
+            stream.ocr_stream([0], tool=self.tool, max_in_flight=0)
+
+    def test_default_max_in_flight(self):
+        limit = concurrency.get_max_processes()
+        concurrency.set_max_processes(3)
+        try:
+            results = stream.ocr_stream([0], tool=self.tool)
+        finally:
+            concurrency.set_max_processes(limit)
+        self.assertEqual(results.max_in_flight, 3)
+
+    def test_exception(self):
+        tool = FailingTool()
+        with self.assertRaises(ValueError):
+            asyncio.run(_collect(stream.ocr_stream(
+                [5, None, 5], tool=tool, max_in_flight=3
+            )))
+        # the other pages are cancelled
+        self.assertListEqual(tool.cancelled, [5, 5])
+
+        results = asyncio.run(_collect(stream.ocr_stream(
+            [0.01, None], tool=FailingTool(), max_in_flight=2,
+            return_exceptions=True
+        )))
+        self.assertEqual(results[0][0], 1)
+        self.assertIsInstance(results[0][1], ValueError)
+        self.assertEqual(results[1], (0, "page 0.01 (None)"))
+
+    def test_break(self):
+        async def run():
+            async with stream.ocr_stream([5, 0.01, 5], tool=self.tool,
+                                         max_in_flight=3) as results:
+                async for (page_index, result) in results:
+                    break
+            return (page_index, self.tool.running)
+
+        self.assertEqual(asyncio.run(run()), (1, 0))
+        self.assertListEqual(self.tool.cancelled, [5, 5])
+
+    def test_cancel(self):
+        async def run():
+            task = asyncio.ensure_future(_collect(stream.ocr_stream(
+                [5, 5], tool=self.tool, max_in_flight=2
+            )))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertListEqual(self.tool.cancelled, [5, 5])
+        self.assertEqual(self.tool.running, 0)
+
+
+@unittest.skipIf(os.name == "nt", "fake executables require a POSIX system")
+class TestStubStream(BaseTest):
+
+    def setUp(self):
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.image = Image.new(mode="RGB", size=(20, 10))
+
+    def test_tesseract(self):
+        with stub.StubTesseract(self.page):
+            results = asyncio.run(_collect(stream.ocr_stream(
+                [self.image] * 3, max_in_flight=2
+            )))
+        self.assertListEqual(sorted(page_index for (page_index, _) in results),
+                             [0, 1, 2])
+        for (_, result) in results:
+            self.assertEqual(result, self.page.get_text().strip())
+
+    def test_tesseract_cancel(self):
+        processes = []
+        create_subprocess_shell = asyncio.create_subprocess_shell
+
+        async def spawn(*args, **kwargs):
+            proc = await create_subprocess_shell(*args, **kwargs)
+            processes.append(proc)
+            return proc
+
+        async def run():
+            task = asyncio.ensure_future(_collect(stream.ocr_stream(
+                [self.image] * 2, max_in_flight=2
+            )))
+            while not processes:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        with stub.StubTesseract(self.page, latency=30):
+            with patch("asyncio.create_subprocess_shell", spawn):
+                asyncio.run(run())
+        self.assertLess(time.monotonic() - start, 10)
+        # the processes have been killed and waited for
+        self.assertTrue(processes)
+        for proc in processes:
+            self.assertIsNotNone(proc.returncode)
+        self.assertEqual(concurrency.governor.running, 0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_libtesseract(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        with stub.StubLibTesseract(self.page):
+            results = asyncio.run(_collect(stream.ocr_stream(
+                [self.image] * 2, tool=libtesseract,
+                builder_factory=builders.LineBoxBuilder
+            )))
+        self.assertListEqual(sorted(page_index for (page_index, _) in results),
+                             [0, 1])
+        for (_, result) in results:
+            self.assertListEqual(result, self.page.lines)
@@ -0,0 +1,651 @@
+import asyncio
+import os
+import time
+import unittest
+
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from PIL import Image
+
+from pyocr import builders
+from pyocr import concurrency
+from pyocr import cuneiform
+from pyocr import libtesseract
+from pyocr import scaling
+from pyocr import stub
+from pyocr import tesseract
+from pyocr import triage
+from pyocr.libtesseract import tesseract_raw
+
+from .tests_base import BaseTest
+
+
+def _scaled(boxes, ratio):
+    return [
+        ((int(round(box.position[0][0] * ratio)),
+          int(round(box.position[0][1] * ratio))),
+         (int(round(box.position[1][0] * ratio)),
+          int(round(box.position[1][1] * ratio))))
+        for box in boxes
+    ]
+
+
+class TestStubPage(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.word_builder = builders.WordBoxBuilder()
+        self.line_builder = builders.LineBoxBuilder()
+
+    def test_generate(self):
+        self.assertEqual(len(self.page.lines), 3)
+        self.assertEqual(len(self.page.words), 12)
+        other = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.assertListEqual(self.page.words, other.words)
+
+    def test_text(self):
+        self.assertEqual(
+            self.page.get_text(),
+            "\n".join([line.content for line in self.page.lines]) + "\n"
+        )
+
+    def test_hocr(self):
+        lines = self.line_builder.read_file(StringIO(self.page.get_hocr()))
+        self.assertListEqual(lines, self.page.lines)
+        words = self.word_builder.read_file(StringIO(self.page.get_hocr()))
+        self.assertListEqual(words, self.page.words)
+
+    def test_box(self):
+        boxes = tesseract.CharBoxBuilder.read_file(
+            StringIO(self.page.get_box())
+        )
+        self.assertEqual(
+            "".join([box.content for box in boxes]),
+            "".join([word.content for word in self.page.words])
+        )
+
+    def test_tsv(self):
+        rows = self.page.get_tsv().splitlines()
+        self.assertEqual(len(rows), 1 + 1 + 3 + 12)
+        self.assertEqual(rows[-1].split("\t")[-1],
+                         self.page.words[-1].content)
+
+
+@unittest.skipIf(os.name == "nt", "fake executables require a POSIX system")
+class TestStubTesseract(BaseTest):
+
+    def setUp(self):
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.page.orientation = (90, 12.5)
+        self.stub = stub.StubTesseract(self.page)
+        self.stub.start()
+        self.image = Image.new(mode="RGB", size=(20, 10))
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_restore(self):
+        self.stub.stop()
+        self.assertEqual(tesseract.TESSERACT_CMD, "tesseract")
+        self.assertFalse(os.path.exists(self.stub.path))
+
+    def test_info(self):
+        self.assertTrue(tesseract.is_available())
+        self.assertEqual(tesseract.get_version(), (4, 1, 1))
+        self.assertListEqual(tesseract.get_available_languages(),
+                             ["eng", "fra", "osd"])
+
+    def test_text(self):
+        output = asyncio.run(tesseract.image_to_string(self.image))
+        self.assertEqual(output, self.page.get_text().strip())
+
+    def test_word_boxes(self):
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=builders.WordBoxBuilder()
+        ))
+        self.assertListEqual(output, self.page.words)
+
+    def test_line_boxes(self):
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, lang="fra", builder=builders.LineBoxBuilder()
+        ))
+        self.assertListEqual(output, self.page.lines)
+
+    def test_engine_config(self):
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, oem=1, variables={"load_system_dawg": False}
+        ))
+        self.assertEqual(output, self.page.get_text().strip())
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, preset="fast"
+        ))
+        self.assertEqual(output, self.page.get_text().strip())
+
+    @patch("pyocr.tesseract.get_version")
+    def test_page(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=builders.PageBuilder()
+        ))
+        self.assertEqual(len(output), 1)
+        self.assertListEqual(output[0].line_boxes, self.page.lines)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_triage(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        builder = builders.TextBuilder()
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=builder,
+            triage=triage.Triage(min_confidence=50)
+        ))
+        self.assertEqual(output, self.page.get_text().strip())
+        self.assertIsNone(builder.skip_reason)
+
+        builder = builders.WordBoxBuilder()
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=builder,
+            triage=triage.Triage(min_confidence=100)
+        ))
+        self.assertListEqual(output, [])
+        self.assertEqual(builder.skip_reason, triage.LOW_CONFIDENCE)
+
+        self.stub.stop()
+        with stub.StubTesseract(stub.StubPage([])):
+            builder = builders.TextBuilder()
+            output = asyncio.run(tesseract.image_to_string(
+                self.image, builder=builder, triage=triage.Triage()
+            ))
+        self.assertEqual(output, "")
+        self.assertEqual(builder.skip_reason, triage.NO_TEXT)
+
+    def test_char_boxes(self):
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=tesseract.CharBoxBuilder()
+        ))
+        self.assertListEqual(output, self.page.get_box_file_char_boxes())
+
+    @patch("pyocr.tesseract.get_version")
+    def test_char_boxes_libtesseract(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        image = Image.new(mode="RGB", size=self.page.size)
+        output = asyncio.run(tesseract.image_to_string(
+            image, builder=tesseract.CharBoxBuilder()
+        ))
+        with stub.StubLibTesseract(self.page):
+            expected = libtesseract.image_to_string(
+                image, builder=tesseract.CharBoxBuilder()
+            )
+        # same coordinates (box files: origin at the bottom left)
+        self.assertListEqual(
+            [(box.content, box.position) for box in output],
+            [(box.content, box.position) for box in expected]
+        )
+        ((left, bottom), (right, top)) = output[0].position
+        self.assertGreater(top, bottom)
+
+    def test_rescale(self):
+        self.image.info['dpi'] = (600, 600)
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(),
+            rescale=scaling.Rescale(dpi=300)
+        ))
+        # recognized at 300 dpi, positions on the 600 dpi image
+        self.assertListEqual([box.content for box in output],
+                             [box.content for box in self.page.words])
+        self.assertListEqual([box.position for box in output],
+                             _scaled(self.page.words, 2))
+        output = asyncio.run(tesseract.image_to_string(
+            self.image, rescale=scaling.Rescale(dpi=300)
+        ))
+        self.assertEqual(output, self.page.get_text().strip())
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "page.png")
+            self.image.save(path, dpi=(600, 600))
+            output = asyncio.run(tesseract.image_file_to_string(
+                path, builder=builders.WordBoxBuilder(),
+                rescale=scaling.Rescale(dpi=300)
+            ))
+        self.assertListEqual([box.position for box in output],
+                             _scaled(self.page.words, 2))
+
+    def test_rescale_multi_page(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "pages.tiff")
+            self.image.save(path, save_all=True, append_images=[self.image],
+                            dpi=(600, 600))
+            with patch("pyocr.tesseract.image_to_string") as image_to_string:
+                output = asyncio.run(tesseract.image_file_to_string(
+                    path, builder=builders.WordBoxBuilder(),
+                    rescale=scaling.Rescale(dpi=300)
+                ))
+        # given as-is to Tesseract: all its pages are recognized
+        self.assertFalse(image_to_string.called)
+        self.assertListEqual([box.position for box in output],
+                             [box.position for box in self.page.words])
+
+    def test_orientation(self):
+        self.assertDictEqual(
+            tesseract.detect_orientation(self.image),
+            {"angle": 90, "confidence": 12.5}
+        )
+
+    def test_timeout(self):
+        self.stub.stop()
+        with TemporaryDirectory() as tmpdir:
+            with stub.StubTesseract(self.page, latency=30):
+                start = time.monotonic()
+                with patch("tempfile.tempdir", tmpdir):
+                    with self.assertRaises(
+                            tesseract.TesseractTimeoutError) as context:
+                        asyncio.run(tesseract.image_to_string(
+                            self.image, timeout=0.2
+                        ))
+                self.assertLess(time.monotonic() - start, 10)
+            self.assertEqual(context.exception.timeout, 0.2)
+            self.assertIsInstance(context.exception, tesseract.TesseractError)
+            # the temporary directory has been removed
+            self.assertListEqual(os.listdir(tmpdir), [])
+        self.assertEqual(concurrency.governor.running, 0)
+
+        # enough time
+        with stub.StubTesseract(self.page):
+            output = asyncio.run(tesseract.image_to_string(
+                self.image, timeout=30
+            ))
+        self.assertEqual(output, self.page.get_text().strip())
+
+    def test_kill(self):
+        # a Tesseract ignoring SIGTERM is killed
+        self.stub.stop()
+        with TemporaryDirectory() as tmpdir:
+            cmd = os.path.join(tmpdir, "tesseract")
+            with open(cmd, "w") as fd:
+                fd.write("#!/bin/sh\ntrap '' TERM\nsleep 30\n")
+            os.chmod(cmd, 0o700)
+            start = time.monotonic()
+            with patch("pyocr.tesseract.TESSERACT_CMD", cmd), \
+                    patch("pyocr.tesseract.TERMINATE_TIMEOUT", 0.2), \
+                    patch("pyocr.tesseract._signal",
+                          wraps=tesseract._signal) as send_signal:
+                with self.assertRaises(tesseract.TesseractTimeoutError):
+                    asyncio.run(tesseract.run_tesseract(
+                        "input.bmp", "output", cwd=tmpdir, timeout=0.2
+                    ))
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertListEqual(
+            [call[1]["kill"] for call in send_signal.call_args_list],
+            [False, True]
+        )
+
+
+@unittest.skipIf(os.name == "nt", "fake executables require a POSIX system")
+class TestStubCuneiform(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.stub = stub.StubCuneiform(self.page)
+        self.stub.start()
+        self.image = Image.new(mode="RGB", size=(20, 10))
+        self.builder = builders.LineBoxBuilder()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_info(self):
+        self.assertTrue(cuneiform.is_available())
+        self.assertEqual(cuneiform.get_version(), (1, 1, 0))
+        self.assertListEqual(cuneiform.get_available_languages(),
+                             ["eng", "fra", "osd"])
+
+    def test_line_boxes(self):
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, lang="fra", builder=self.builder
+        ))
+        self.assertListEqual(output, self.page.lines)
+
+    @patch("pyocr.cuneiform.g_memfd_supported", False)
+    def test_line_boxes_file(self):
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, builder=self.builder
+        ))
+        self.assertListEqual(output, self.page.lines)
+
+    def test_presets(self):
+        output = asyncio.run(cuneiform.image_to_string(
+            self.image, builder=self.builder, preset="fast"
+        ))
+        self.assertListEqual(output, self.page.lines)
+        with self.assertRaises(ValueError):
+            asyncio.run(cuneiform.image_to_string(
+                self.image, builder=self.builder, preset="fastest"
+            ))
+
+    def test_large_image(self):
+        # bigger than the pipe buffers: stdin and stdout must be handled
+        # concurrently
+        image = Image.new(mode="RGB", size=(2000, 2000))
+        output = asyncio.run(cuneiform.image_to_string(
+            image, builder=self.builder
+        ))
+        self.assertListEqual(output, self.page.lines)
+
+
+class TestStubLibTesseract(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.page = stub.StubPage.generate(nb_lines=3, nb_words=4)
+        self.page.orientation = (180, 8.0)
+        self.stub = stub.StubLibTesseract(self.page)
+        self.stub.start()
+        self.image = Image.new(mode="RGB", size=(20, 10))
+        self.text_builder = builders.TextBuilder()
+        self.word_builder = builders.WordBoxBuilder()
+        self.line_builder = builders.LineBoxBuilder()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_restore(self):
+        self.stub.stop()
+        self.assertIsNot(tesseract_raw.g_libtesseract, self.stub)
+
+    def test_info(self):
+        self.assertTrue(libtesseract.is_available())
+        self.assertEqual(libtesseract.get_version(), (4, 1, 1))
+        self.assertListEqual(libtesseract.get_available_languages(),
+                             ["eng", "fra", "osd"])
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    def test_text(self):
+        output = libtesseract.image_to_string(self.image,
+                                              builder=self.text_builder)
+        self.assertEqual(output, self.page.get_text().strip())
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    def test_word_boxes(self):
+        output = libtesseract.image_to_string(self.image,
+                                              builder=self.word_builder)
+        self.assertListEqual(output, self.page.words)
+        for (box, expected) in zip(output, self.page.words):
+            self.assertEqual(box.confidence, expected.confidence)
+
+    def test_line_boxes(self):
+        output = libtesseract.image_to_string(self.image, lang="fra",
+                                              builder=self.line_builder)
+        self.assertListEqual(output, self.page.lines)
+
+    def test_char_boxes(self):
+        image = Image.new(mode="RGB", size=self.page.size)
+        output = libtesseract.image_to_string(
+            image, builder=tesseract.CharBoxBuilder()
+        )
+        expected = self.page.get_box_file_char_boxes()
+        self.assertListEqual(output, expected)
+        self.assertListEqual([box.content for box in output],
+                             [box.content for box in expected])
+        self.assertEqual(output[0].confidence, self.page.words[0].confidence)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_word_char_boxes(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = libtesseract.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(char_boxes=True)
+        )
+        self.assertListEqual(output, self.page.words)
+        self.assertListEqual(
+            [char for word in output for char in word.char_boxes],
+            self.page.get_char_boxes()
+        )
+        self.assertEqual(
+            "".join(char.content for char in output[0].char_boxes),
+            output[0].content
+        )
+        output = libtesseract.image_to_string(self.image,
+                                              builder=self.word_builder)
+        self.assertIsNone(output[0].char_boxes)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_choices(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        output = libtesseract.image_to_string(
+            self.image, builder=builders.LineBoxBuilder(choices=2)
+        )
+        self.assertListEqual(output, self.page.lines)
+        word = output[0].word_boxes[0]
+        self.assertIsNone(word.char_boxes)
+        self.assertEqual(len(word.choices), 2 * len(word.content))
+        for (idx, char) in enumerate(word.content):
+            alternatives = word.choices.get(idx)
+            self.assertEqual(alternatives[0], (char, word.confidence))
+            self.assertEqual(alternatives[1][1], word.confidence / 2)
+        # the choice iterators are deleted
+        self.assertFalse([
+            iterator for iterator in self.stub._iterators.values()
+            if isinstance(iterator, stub._StubChoiceIterator)
+        ])
+
+        output = libtesseract.image_to_string(
+            self.image, builder=builders.WordBoxBuilder(choices=1,
+                                                        char_boxes=True)
+        )
+        self.assertListEqual(list(output[0].choices.texts),
+                             list(output[0].content))
+        self.assertEqual(len(output[0].char_boxes), len(output[0].content))
+
+    @patch("pyocr.tesseract.get_version")
+    def test_triage(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        builder = builders.LineBoxBuilder()
+        output = libtesseract.image_to_string(
+            self.image, builder=builder,
+            triage=triage.Triage(min_confidence=50)
+        )
+        self.assertListEqual(output, self.page.lines)
+        self.assertIsNone(builder.skip_reason)
+
+        builder = builders.TextBuilder()
+        output = libtesseract.image_to_string(
+            self.image, builder=builder,
+            triage=triage.Triage(min_confidence=100)
+        )
+        self.assertEqual(output, "")
+        self.assertEqual(builder.skip_reason, triage.LOW_CONFIDENCE)
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_rescale(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.image.info['dpi'] = (600, 600)
+        with patch.object(self.stub, "TessBaseAPISetImage",
+                          wraps=self.stub.TessBaseAPISetImage) as set_image:
+            output = libtesseract.image_to_string(
+                self.image, builder=builders.LineBoxBuilder(),
+                rescale=scaling.Rescale(dpi=300)
+            )
+        self.assertListEqual(
+            [self.stub._value(arg) for arg in set_image.call_args[0][2:4]],
+            [10, 5]
+        )
+        self.assertListEqual([line.position for line in output],
+                             _scaled(self.page.lines, 2))
+        self.assertListEqual(
+            [word.position for line in output for word in line.word_boxes],
+            _scaled(self.page.words, 2)
+        )
+
+    @patch("pyocr.tesseract.get_version")
+    def test_rescale_line_height(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        heights = sorted(line.position[1][1] - line.position[0][1]
+                         for line in self.page.lines)
+        rescale = scaling.Rescale(line_height=heights[1] * 2)
+        with patch.object(self.stub, "TessBaseAPISetImage",
+                          wraps=self.stub.TessBaseAPISetImage) as set_image:
+            output = libtesseract.image_to_string(
+                self.image, builder=builders.WordBoxBuilder(),
+                rescale=rescale
+            )
+        # resolution unknown: rescaled according to the layout analysis
+        self.assertListEqual(
+            [self.stub._value(arg) for arg in set_image.call_args[0][2:4]],
+            [40, 20]
+        )
+        self.assertListEqual([box.position for box in output],
+                             _scaled(self.page.words, 0.5))
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    @patch("pyocr.tesseract.get_version")
+    def test_triage_layout(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.stub.stop()
+        image_blocks = [tesseract_raw.PolyBlockType.FLOWING_IMAGE] * 3
+        for (page, block_types) in (
+                (stub.StubPage([]), None),
+                (self.page, image_blocks)):
+            with stub.StubLibTesseract(page, lines_per_block=1,
+                                       block_types=block_types):
+                with patch("pyocr.libtesseract.tesseract_raw.init") as init:
+                    builder = builders.TextBuilder()
+                    output = libtesseract.image_to_string(
+                        self.image, builder=builder,
+                        triage=triage.Triage()
+                    )
+            self.assertEqual(output, "")
+            self.assertEqual(builder.skip_reason, triage.NO_TEXT_BLOCK)
+            # the models are not loaded
+            self.assertFalse(init.called)
+
+    def test_engine_config(self):
+        handle = tesseract_raw.init(
+            lang="fra", oem=tesseract_raw.OcrEngineMode.LSTM_ONLY,
+            variables={"load_system_dawg": False}
+        )
+        try:
+            stub_handle = self.stub._handles[handle]
+            self.assertEqual(stub_handle.lang, "fra")
+            self.assertEqual(stub_handle.oem,
+                             tesseract_raw.OcrEngineMode.LSTM_ONLY)
+            self.assertEqual(stub_handle.variables[b"load_system_dawg"],
+                             b"0")
+        finally:
+            tesseract_raw.cleanup(handle)
+        output = libtesseract.image_to_string(
+            self.image, builder=self.text_builder, oem=1,
+            variables={"load_system_dawg": False}
+        )
+        self.assertEqual(output, self.page.get_text().strip())
+
+    @patch("pyocr.tesseract.get_version")
+    def test_presets(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        for preset in ("fast", "balanced", "accurate"):
+            output = libtesseract.image_to_string(
+                self.image, builder=builders.TextBuilder(), preset=preset
+            )
+            self.assertEqual(output, self.page.get_text().strip())
+        with self.assertRaises(ValueError):
+            libtesseract.image_to_string(self.image, preset="fastest")
+
+    @patch("pyocr.tesseract.get_version")
+    def test_version_cache(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        with patch("pyocr.libtesseract.get_version",
+                   wraps=libtesseract.get_version) as version:
+            for _ in range(2):
+                libtesseract.image_to_string(self.image, preset="fast")
+            self.assertEqual(version.call_count, 1)
+            # another library
+            with stub.StubLibTesseract(self.page, version="5.3.0"):
+                libtesseract.image_to_string(self.image, preset="fast")
+            self.assertEqual(version.call_count, 2)
+            libtesseract._clear_version_cache()
+            libtesseract.image_to_string(self.image, preset="fast")
+            self.assertEqual(version.call_count, 3)
+
+    def test_page(self):
+        self.stub.stop()
+        page = stub.StubPage.generate(nb_lines=5, nb_words=4)
+        with stub.StubLibTesseract(page, lines_per_block=2):
+            with patch("pyocr.tesseract.get_version") as get_version:
+                get_version.return_value = (4, 0, 0)
+                builder = builders.PageBuilder()
+            blocks = libtesseract.image_to_string(self.image,
+                                                  builder=builder)
+        self.assertListEqual(
+            [len(block.line_boxes) for block in blocks], [2, 2, 1]
+        )
+        self.assertListEqual(
+            [line for block in blocks for line in block.line_boxes],
+            page.lines
+        )
+        self.assertEqual(blocks[1].position, (
+            page.lines[2].position[0], page.lines[3].position[1]
+        ))
+        self.assertEqual(blocks[2].confidence, page.lines[4].confidence)
+
+    def test_analyse_layout(self):
+        blocks = libtesseract.analyse_layout(self.image)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].position, ((0, 0), self.page.size))
+        self.assertEqual(blocks[0].block_type,
+                         tesseract_raw.PolyBlockType.FLOWING_TEXT)
+        self.assertEqual(len(blocks[0].paragraphs), 1)
+        lines = blocks[0].line_boxes
+        self.assertListEqual([line.position for line in lines],
+                             [line.position for line in self.page.lines])
+        self.assertListEqual([line.word_boxes for line in lines],
+                             [[], [], []])
+        self.assertEqual(self.stub.nb_handles, 0)
+
+    def test_analyse_layout_blocks(self):
+        self.stub.stop()
+        page = stub.StubPage.generate(nb_lines=5, nb_words=4)
+        block_types = [
+            tesseract_raw.PolyBlockType.FLOWING_TEXT,
+            tesseract_raw.PolyBlockType.FLOWING_IMAGE,
+            tesseract_raw.PolyBlockType.TABLE,
+        ]
+        with stub.StubLibTesseract(page, lines_per_block=2,
+                                   block_types=block_types):
+            blocks = libtesseract.analyse_layout(self.image)
+        self.assertListEqual([block.block_type for block in blocks],
+                             block_types)
+        self.assertEqual(blocks[0].position, (
+            page.lines[0].position[0], page.lines[1].position[1]
+        ))
+        # no lines in the image block
+        self.assertListEqual(
+            [len(block.line_boxes) for block in blocks], [2, 0, 1]
+        )
+        self.assertEqual(blocks[2].line_boxes[0].position,
+                         page.lines[4].position)
+
+    def test_unknown_lang(self):
+        with self.assertRaises(libtesseract.TesseractError):
+            libtesseract.image_to_string(self.image, lang="jpn",
+                                         builder=self.text_builder)
+
+    def test_orientation(self):
+        self.assertDictEqual(
+            libtesseract.detect_orientation(self.image),
+            {"angle": 180, "confidence": 8.0}
+        )
+
+    def test_get_utf8_text(self):
+        handle = tesseract_raw.init(lang="eng")
+        try:
+            tesseract_raw.set_image(handle, self.image)
+            tesseract_raw.recognize(handle)
+            self.assertEqual(tesseract_raw.get_utf8_text(handle),
+                             self.page.get_text())
+        finally:
+            tesseract_raw.cleanup(handle)
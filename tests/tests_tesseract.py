@@ -1,3 +1,4 @@
+import asyncio
 import errno
 import os
 import subprocess
@@ -6,6 +7,8 @@ from io import StringIO
 from tempfile import TemporaryDirectory
 from unittest.mock import patch, MagicMock
 
+import pyocr
+
 from PIL import Image
 
 from pyocr import builders
@@ -185,6 +188,7 @@ class TestTesseract(BaseTest):
                 tesseract.CharBoxBuilder,
                 builders.DigitBuilder,
                 builders.DigitLineBoxBuilder,
+                builders.PageBuilder,
             ]
         )
 
@@ -565,6 +569,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -585,6 +590,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang="fra",
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -605,6 +611,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -627,6 +634,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -647,6 +655,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -665,6 +674,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -683,6 +693,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -707,6 +718,7 @@ class TestTesseractTxt(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
 
@@ -739,6 +751,7 @@ class TestTesseractCharBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -759,6 +772,7 @@ class TestTesseractCharBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -783,6 +797,7 @@ class TestTesseractCharBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
 
@@ -876,6 +891,7 @@ class TestTesseractDigits(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
 
@@ -908,6 +924,7 @@ class TestTesseractWordBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -929,6 +946,7 @@ class TestTesseractWordBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -954,6 +972,7 @@ class TestTesseractWordBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
 
@@ -988,6 +1007,7 @@ class TestTesseractLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -1011,6 +1031,7 @@ class TestTesseractLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -1036,6 +1057,7 @@ class TestTesseractLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
 
@@ -1068,6 +1090,7 @@ class TestTesseractDigitsLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -1089,6 +1112,7 @@ class TestTesseractDigitsLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
 
     @patch("tempfile.TemporaryDirectory")
@@ -1114,4 +1138,184 @@ class TestTesseractDigitsLineBox(BaseTest):
             "input.bmp", "output", cwd=tmpdir, lang=None,
             flags=self.builder.tesseract_flags,
             configs=self.builder.tesseract_configs,
+            env=None,
         )
+
+
+class TestTesseractImageFile(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.image = Image.new(mode="RGB", size=(1, 1))
+        self.builder = builders.TextBuilder()
+        self.tmpdir = TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "page.png")
+        self.image.save(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_image_file_to_string(self, run_tesseract):
+        text = self._get_file_content("text")
+
+        async def fake_run_tesseract(input_filename, output_filename_base,
+                                     cwd=None, lang=None, flags=None,
+                                     configs=None, env=None, timeout=None):
+            # the file is given as-is to Tesseract
+            self.assertEqual(input_filename, "input.png")
+            input_path = os.path.join(cwd, input_filename)
+            with open(input_path, "rb") as fd, open(self.path, "rb") as fd2:
+                self.assertEqual(fd.read(), fd2.read())
+            output = os.path.join(cwd, output_filename_base + ".txt")
+            with open(output, "w", encoding="utf-8") as file_desc:
+                file_desc.write(text)
+            return (0, "")
+
+        run_tesseract.side_effect = fake_run_tesseract
+        result = asyncio.run(tesseract.image_file_to_string(
+            self.path, lang="fra", builder=self.builder
+        ))
+        self.assertEqual(result, text.strip())
+        self.assertEqual(run_tesseract.call_count, 1)
+        self.assertEqual(run_tesseract.call_args[1]["lang"], "fra")
+        self.assertEqual(run_tesseract.call_args[1]["flags"],
+                         self.builder.tesseract_flags)
+        # the original file is untouched
+        self.assertTrue(os.path.exists(self.path))
+
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_image_file_to_string_error(self, run_tesseract):
+        run_tesseract.return_value = (1, "Error")
+        with self.assertRaises(tesseract.TesseractError) as te:
+            asyncio.run(tesseract.image_file_to_string(
+                self.path, builder=self.builder
+            ))
+        self.assertEqual(te.exception.status, 1)
+
+    def test_image_file_to_string_no_file(self):
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(tesseract.image_file_to_string(
+                os.path.join(self.tmpdir.name, "nope.png"),
+                builder=self.builder
+            ))
+
+    @patch("pyocr.tesseract.get_version")
+    @patch("subprocess.Popen")
+    def test_detect_orientation_file(self, popen, get_version):
+        get_version.return_value = (4, 0, 0)
+        stdout = MagicMock()
+        stdout.stdout.read.return_value = (
+            b"Page number: 0\n"
+            b"Orientation in degrees: 90\n"
+            b"Rotate: 270\n"
+            b"Orientation confidence: 9.30\n"
+        )
+        popen.return_value = stdout
+        result = tesseract.detect_orientation_file(self.path)
+        self.assertEqual(result["angle"], 90)
+        self.assertEqual(result["confidence"], 9.30)
+        self.assertEqual(popen.call_args[0][0],
+                         ["tesseract", "input.png", "stdout", "--psm", "0"])
+
+
+class TestTesseractEngineConfig(BaseTest):
+
+    @patch("pyocr.tesseract.get_version")
+    def setUp(self, get_version):
+        get_version.return_value = (4, 0, 0)
+        self.image = Image.new(mode="RGB", size=(1, 1))
+        self.builder = builders.TextBuilder()
+        tesseract._clear_version_cache()
+
+    def test_engine_flags(self):
+        self.assertListEqual(tesseract.engine_flags(), [])
+        self.assertListEqual(
+            tesseract.engine_flags(oem=1, variables={
+                "load_system_dawg": False,
+                "tessedit_char_whitelist": "0 1",
+            }),
+            ["--oem", "1", "-c", "load_system_dawg=0",
+             "-c", "'tessedit_char_whitelist=0 1'"]
+        )
+
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_image_to_string(self, run_tesseract):
+        text = self._get_file_content("text")
+
+        async def fake_run_tesseract(input_filename, output_filename_base,
+                                     cwd=None, lang=None, flags=None,
+                                     configs=None, env=None, timeout=None):
+            output = os.path.join(cwd, output_filename_base + ".txt")
+            with open(output, "w", encoding="utf-8") as file_desc:
+                file_desc.write(text)
+            return (0, "")
+
+        run_tesseract.side_effect = fake_run_tesseract
+        result = asyncio.run(tesseract.image_to_string(
+            self.image, builder=self.builder, oem=0,
+            variables={"tessedit_do_invert": 0}
+        ))
+        self.assertEqual(result, text.strip())
+        self.assertListEqual(
+            run_tesseract.call_args[1]["flags"],
+            self.builder.tesseract_flags + [
+                "--oem", "0", "-c", "tessedit_do_invert=0"
+            ]
+        )
+        self.assertListEqual(run_tesseract.call_args[1]["configs"],
+                             self.builder.tesseract_configs)
+
+    @patch("pyocr.tesseract.get_version")
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_preset(self, run_tesseract, get_version):
+        get_version.return_value = (4, 1, 1)
+        run_tesseract.return_value = (1, "error")
+        with self.assertRaises(tesseract.TesseractError):
+            asyncio.run(tesseract.image_to_string(
+                self.image, builder=self.builder, preset="fast",
+                variables={"tessedit_do_invert": True}
+            ))
+        flags = run_tesseract.call_args[1]["flags"]
+        self.assertListEqual(flags[:len(self.builder.tesseract_flags)],
+                             self.builder.tesseract_flags)
+        self.assertListEqual(
+            flags[len(self.builder.tesseract_flags):],
+            ["--oem", "1",
+             "-c", "load_system_dawg=0",
+             "-c", "load_freq_dawg=0",
+             "-c", "tessedit_do_invert=1"]
+        )
+        self.assertEqual(run_tesseract.call_args[1]["env"]["OMP_THREAD_LIMIT"],
+                         "1")
+
+    @patch("pyocr.tesseract.get_version")
+    @patch("pyocr.tesseract.run_tesseract")
+    def test_version_cache(self, run_tesseract, get_version):
+        get_version.return_value = (4, 1, 1)
+        run_tesseract.return_value = (1, "error")
+
+        def run():
+            with self.assertRaises(tesseract.TesseractError):
+                asyncio.run(tesseract.image_to_string(
+                    self.image, builder=self.builder, preset="fast"
+                ))
+
+        run()
+        run()
+        self.assertEqual(get_version.call_count, 1)
+        # cleared with the cache of the available tools
+        pyocr.get_available_tools(refresh=True)
+        run()
+        self.assertEqual(get_version.call_count, 2)
+        # and when the command changes
+        with patch("pyocr.tesseract.TESSERACT_CMD", "tesseract5"):
+            run()
+        self.assertEqual(get_version.call_count, 3)
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(tesseract.image_to_string(
+                self.image, builder=self.builder, preset="fastest"
+            ))
@@ -0,0 +1,224 @@
+import os
+import struct
+
+from tempfile import TemporaryDirectory
+
+from PIL import Image
+
+from pyocr import transport
+
+from .tests_base import BaseTest
+
+
+class TestTransport(BaseTest):
+
+    def setUp(self):
+        self.image = Image.new(mode="RGB", size=(5, 3), color=(1, 2, 3))
+        self.image.putpixel((4, 2), (200, 100, 50))
+        self.image.info['dpi'] = (300, 300)
+
+    def _check_view(self, view, image):
+        self.assertEqual(view.size, image.size)
+        self.assertEqual(view.mode, image.mode)
+        self.assertEqual(view.bytes_per_line,
+                         image.width * transport.MODES[image.mode])
+        self.assertEqual(bytes(view.buf), image.tobytes())
+        pil_image = view.to_pil()
+        try:
+            self.assertEqual(pil_image.tobytes(), image.tobytes())
+            self.assertEqual(pil_image.info['dpi'], (300, 300))
+        finally:
+            pil_image.close()
+
+    def test_shared_memory(self):
+        with transport.share_image(self.image) as block:
+            descriptor = block.descriptor
+            self.assertEqual(descriptor.backend,
+                             transport.BACKEND_SHARED_MEMORY)
+            self.assertEqual(descriptor.size, (5, 3))
+            self.assertEqual(descriptor.dpi, 300)
+            self.assertEqual(descriptor.nbytes, 5 * 3 * 3)
+            with transport.open_image(descriptor) as view:
+                self._check_view(view, self.image)
+                # same memory in both sides
+                view.buf[0] = 42
+                with transport.open_image(descriptor) as view2:
+                    self.assertEqual(view2.buf[0], 42)
+
+    def test_file(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "page.raw")
+            with transport.share_image(self.image, path=path) as block:
+                descriptor = block.descriptor
+                self.assertEqual(descriptor.backend, transport.BACKEND_FILE)
+                self.assertEqual(descriptor.name, path)
+                with transport.open_image(descriptor) as view:
+                    self._check_view(view, self.image)
+                    # copy-on-write: the file is not modified
+                    view.buf[0] = 42
+                with open(path, "rb") as file_desc:
+                    self.assertEqual(file_desc.read(), self.image.tobytes())
+            self.assertFalse(os.path.exists(path))
+
+    def test_file_offset(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "pages.raw")
+            with open(path, "wb") as file_desc:
+                file_desc.write(b"header")
+                file_desc.write(self.image.tobytes())
+            descriptor = transport.SharedImage(
+                transport.BACKEND_FILE, path, self.image.size, "RGB",
+                dpi=300, offset=len(b"header")
+            )
+            with transport.open_image(descriptor) as view:
+                self._check_view(view, self.image)
+
+    def test_modes(self):
+        for (mode, expected_mode) in (("L", "L"), ("1", "L"),
+                                      ("RGBA", "RGBA"), ("P", "RGB"),
+                                      ("CMYK", "RGB")):
+            image = self.image.convert(mode)
+            with transport.share_image(image) as block:
+                self.assertEqual(block.descriptor.mode, expected_mode)
+                with transport.open_image(block.descriptor) as view:
+                    self.assertEqual(bytes(view.buf),
+                                     image.convert(expected_mode).tobytes())
+
+    def test_default_dpi(self):
+        image = Image.new(mode="L", size=(2, 2))
+        with transport.share_image(image) as block:
+            self.assertEqual(block.descriptor.dpi, transport.DPI_DEFAULT)
+
+    def test_truncated(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "page.raw")
+            with open(path, "wb") as file_desc:
+                file_desc.write(b"\0" * 10)
+            descriptor = transport.SharedImage(
+                transport.BACKEND_FILE, path, (5, 3), "RGB"
+            )
+            with self.assertRaises(ValueError):
+                transport.open_image(descriptor)
+
+    def test_unknown_backend(self):
+        descriptor = transport.SharedImage("nope", "x", (5, 3), "RGB")
+        with self.assertRaises(ValueError):
+            transport.open_image(descriptor)
+
+
+class TestDescribeImageFile(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.image = Image.new(mode="RGB", size=(50, 40), color=(1, 2, 3))
+        for x in range(50):
+            self.image.putpixel((x, x % 40), (x, 255 - x, 7))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _save(self, image, filename, **kwargs):
+        path = os.path.join(self.tmpdir.name, filename)
+        image.save(path, **kwargs)
+        return path
+
+    def _check(self, path, image, dpi=transport.DPI_DEFAULT):
+        descriptor = transport.describe_image_file(path)
+        self.assertIsNotNone(descriptor)
+        self.assertEqual(descriptor.backend, transport.BACKEND_FILE)
+        self.assertEqual(descriptor.size, image.size)
+        self.assertEqual(descriptor.mode, image.mode)
+        self.assertEqual(descriptor.dpi, dpi)
+        with transport.open_image(descriptor) as view:
+            self.assertEqual(bytes(view.buf), image.tobytes())
+
+    def test_pnm(self):
+        self._check(self._save(self.image, "page.ppm"), self.image)
+        gray = self.image.convert("L")
+        self._check(self._save(gray, "page.pgm"), gray)
+
+    def test_pnm_comment(self):
+        path = os.path.join(self.tmpdir.name, "page.pgm")
+        gray = self.image.convert("L")
+        with open(path, "wb") as file_desc:
+            file_desc.write(b"P5\n# a comment\n50 40\n255\n")
+            file_desc.write(gray.tobytes())
+        self._check(path, gray)
+
+    def test_pnm_16bits(self):
+        path = os.path.join(self.tmpdir.name, "page.pgm")
+        with open(path, "wb") as file_desc:
+            file_desc.write(b"P5 1 1 65535\n\0\0")
+        self.assertIsNone(transport.describe_image_file(path))
+
+    def test_tiff(self):
+        for image in (self.image, self.image.convert("L"),
+                      self.image.convert("RGBA")):
+            path = self._save(image, "page.tiff", dpi=(300, 300))
+            self._check(path, image, dpi=300)
+
+    def _write_tiff(self, image, endian, rows_per_strip):
+        """
+        Write an uncompressed gray TIFF file with several strips
+        """
+        path = os.path.join(self.tmpdir.name, "page.tiff")
+        data = image.tobytes()
+        line = image.width
+        strips = [data[i:i + (rows_per_strip * line)]
+                  for i in range(0, len(data), rows_per_strip * line)]
+        nb_entries = 7
+        arrays_offset = 8 + 2 + (12 * nb_entries) + 4
+        data_offset = arrays_offset + (8 * len(strips))
+        offsets = []
+        for strip in strips:
+            offsets.append(data_offset)
+            data_offset += len(strip)
+        entries = [
+            (256, 3, 1, image.width),
+            (257, 3, 1, image.height),
+            (258, 3, 1, 8),
+            (259, 3, 1, 1),
+            (262, 3, 1, 1),
+            (273, 4, len(strips), arrays_offset),
+            (279, 4, len(strips), arrays_offset + (4 * len(strips))),
+        ]
+        with open(path, "wb") as file_desc:
+            file_desc.write(b"II*\0" if endian == "<" else b"MM\0*")
+            file_desc.write(struct.pack(endian + "I", 8))
+            file_desc.write(struct.pack(endian + "H", nb_entries))
+            for (tag, tag_type, count, value) in entries:
+                file_desc.write(struct.pack(endian + "HHI", tag, tag_type,
+                                            count))
+                if tag_type == 3:
+                    file_desc.write(struct.pack(endian + "HH", value, 0))
+                else:
+                    file_desc.write(struct.pack(endian + "I", value))
+            file_desc.write(struct.pack(endian + "I", 0))
+            file_desc.write(struct.pack(endian + "I" * len(strips),
+                                        *offsets))
+            file_desc.write(struct.pack(endian + "I" * len(strips),
+                                        *[len(strip) for strip in strips]))
+            for strip in strips:
+                file_desc.write(strip)
+        return path
+
+    def test_tiff_multiple_strips(self):
+        image = self.image.convert("L")
+        for endian in ("<", ">"):
+            path = self._write_tiff(image, endian, rows_per_strip=7)
+            self._check(path, image)
+
+    def test_tiff_compressed(self):
+        path = self._save(self.image, "page.tiff", compression="tiff_lzw")
+        self.assertIsNone(transport.describe_image_file(path))
+
+    def test_tiff_truncated(self):
+        path = os.path.join(self.tmpdir.name, "page.tiff")
+        with open(path, "wb") as file_desc:
+            file_desc.write(b"II*\0\x08\0\0\0\x10")
+        self.assertIsNone(transport.describe_image_file(path))
+
+    def test_other_format(self):
+        for filename in ("page.png", "page.bmp"):
+            path = self._save(self.image, filename)
+            self.assertIsNone(transport.describe_image_file(path))
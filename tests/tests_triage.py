@@ -0,0 +1,52 @@
+from PIL import Image
+
+from pyocr import builders
+from pyocr import triage
+from pyocr.libtesseract import tesseract_raw
+
+from .tests_base import BaseTest
+
+
+class TestTriage(BaseTest):
+
+    def test_scale(self):
+        for scale in (0, -0.5, 1.5):
+            with self.assertRaises(ValueError):
+                triage.Triage(scale=scale)
+
+    def test_get_image(self):
+        image = Image.new(mode="RGB", size=(2480, 3508))
+        self.assertEqual(triage.Triage().get_image(image).size, (1240, 1754))
+        self.assertEqual(triage.Triage(scale=0.25).get_image(image).size,
+                         (620, 877))
+        self.assertIs(triage.Triage(scale=1).get_image(image), image)
+
+    def test_check_blocks(self):
+        check = triage.Triage().check_blocks
+        self.assertEqual(check([]), triage.NO_TEXT_BLOCK)
+        image_block = builders.Block(
+            tesseract_raw.PolyBlockType.FLOWING_IMAGE, [], ((0, 0), (5, 5))
+        )
+        text_block = builders.Block(
+            tesseract_raw.PolyBlockType.HEADING_TEXT, [], ((0, 5), (5, 9))
+        )
+        self.assertEqual(check([image_block]), triage.NO_TEXT_BLOCK)
+        self.assertIsNone(check([image_block, text_block]))
+
+    def test_check_words(self):
+        words = [
+            builders.Box("word", ((0, 0), (5, 5)), 80),
+            builders.Box("word", ((5, 0), (9, 5)), 40),
+            builders.Box(" ", ((9, 0), (10, 5)), 0),
+        ]
+        self.assertIsNone(triage.Triage().check_words(words))
+        self.assertIsNone(
+            triage.Triage(min_confidence=60).check_words(words)
+        )
+        self.assertEqual(
+            triage.Triage(min_confidence=61).check_words(words),
+            triage.LOW_CONFIDENCE
+        )
+        self.assertEqual(triage.Triage().check_words(words[2:]),
+                         triage.NO_TEXT)
+        self.assertEqual(triage.Triage().check_words([]), triage.NO_TEXT)
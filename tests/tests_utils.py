@@ -1,11 +1,17 @@
+import asyncio
+import threading
 import unittest
 
 from unittest.mock import patch
 
 import pyocr
 
+from PIL import Image
+
+from pyocr import transport
 from pyocr.util import (
     digits_only,
+    to_pil,
 )
 
 
@@ -19,7 +25,7 @@ class TestPyOCR(unittest.TestCase):
         is_available.return_value = True
         libtess.TessVersion.return_value = b"4.0.0"
         self.assertListEqual(
-            pyocr.get_available_tools(),
+            pyocr.get_available_tools(refresh=True),
             [
                 pyocr.tesseract,
                 pyocr.libtesseract,
@@ -35,7 +41,7 @@ class TestPyOCR(unittest.TestCase):
         is_available.return_value = True
         libtess.TessVersion.return_value = b"3.5.0"
         self.assertListEqual(
-            pyocr.get_available_tools(),
+            pyocr.get_available_tools(refresh=True),
             [
                 pyocr.tesseract,
                 pyocr.libtesseract,
@@ -51,13 +57,95 @@ class TestPyOCR(unittest.TestCase):
         is_available.return_value = True
         libtess.TessVersion.return_value = b"3.0.0"
         self.assertListEqual(
-            pyocr.get_available_tools(),
+            pyocr.get_available_tools(refresh=True),
             [
                 pyocr.tesseract,
                 pyocr.cuneiform,
             ]
         )
 
+    @patch("pyocr.libtesseract.is_available")
+    @patch("pyocr.cuneiform.is_available")
+    @patch("pyocr.tesseract.is_available")
+    def test_available_tools_cached(self, tesseract_available,
+                                    cuneiform_available,
+                                    libtesseract_available):
+        tesseract_available.return_value = True
+        cuneiform_available.return_value = False
+        libtesseract_available.return_value = False
+        self.assertListEqual(pyocr.get_available_tools(refresh=True),
+                             [pyocr.tesseract])
+        cuneiform_available.return_value = True
+        self.assertListEqual(pyocr.get_available_tools(), [pyocr.tesseract])
+        self.assertEqual(tesseract_available.call_count, 1)
+        self.assertListEqual(pyocr.get_available_tools(refresh=True),
+                             [pyocr.tesseract, pyocr.cuneiform])
+
+    @patch("os.getpid")
+    @patch("pyocr.libtesseract.is_available")
+    @patch("pyocr.cuneiform.is_available")
+    @patch("pyocr.tesseract.is_available")
+    def test_available_tools_forked(self, tesseract_available,
+                                    cuneiform_available,
+                                    libtesseract_available, getpid):
+        tesseract_available.return_value = True
+        cuneiform_available.return_value = False
+        libtesseract_available.return_value = False
+        getpid.return_value = 42
+        pyocr.get_available_tools(refresh=True)
+        pyocr.get_available_tools()
+        self.assertEqual(tesseract_available.call_count, 1)
+        # the cache is not reused in a child process
+        getpid.return_value = 43
+        pyocr.get_available_tools()
+        self.assertEqual(tesseract_available.call_count, 2)
+
+    @patch("pyocr.libtesseract.is_available")
+    @patch("pyocr.cuneiform.is_available")
+    @patch("pyocr.tesseract.is_available")
+    def test_available_tools_parallel(self, tesseract_available,
+                                      cuneiform_available,
+                                      libtesseract_available):
+        # all the tools are looked for at the same time: each one waits for
+        # the others
+        barrier = threading.Barrier(3, timeout=5)
+
+        def available():
+            barrier.wait()
+            return True
+
+        tesseract_available.side_effect = available
+        cuneiform_available.side_effect = available
+        libtesseract_available.side_effect = available
+        self.assertListEqual(
+            pyocr.get_available_tools(refresh=True),
+            [pyocr.tesseract, pyocr.libtesseract, pyocr.cuneiform]
+        )
+
+    @patch("pyocr.libtesseract.is_available")
+    @patch("pyocr.cuneiform.is_available")
+    @patch("pyocr.tesseract.is_available")
+    def test_aget_available_tools(self, tesseract_available,
+                                  cuneiform_available,
+                                  libtesseract_available):
+        tesseract_available.return_value = False
+        cuneiform_available.return_value = True
+        libtesseract_available.return_value = True
+        self.assertListEqual(
+            asyncio.run(pyocr.aget_available_tools(refresh=True)),
+            [pyocr.libtesseract, pyocr.cuneiform]
+        )
+        self.assertListEqual(asyncio.run(pyocr.aget_available_tools()),
+                             [pyocr.libtesseract, pyocr.cuneiform])
+        self.assertEqual(cuneiform_available.call_count, 1)
+
+    def test_lazy_tools(self):
+        self.assertListEqual(
+            pyocr.TOOLS, [pyocr.tesseract, pyocr.libtesseract, pyocr.cuneiform]
+        )
+        with self.assertRaises(AttributeError):
+            pyocr.nope
+
     def test_digits_only(self):
         self.assertEqual(digits_only("azer"), 0)
         self.assertEqual(digits_only("10.0.1"), 10)
@@ -66,3 +154,13 @@ class TestPyOCR(unittest.TestCase):
         self.assertEqual(digits_only("v42"), 42)
         self.assertEqual(digits_only("v42x35"), 42)
         self.assertEqual(digits_only("v42x35qsdf"), 42)
+
+    def test_to_pil(self):
+        image = Image.new("RGB", (4, 3))
+        self.assertIs(to_pil(image), image)
+        with transport.share_image(image.convert("L")) as block:
+            with transport.open_image(block.descriptor) as view:
+                shared = to_pil(view)
+                self.assertEqual(shared.size, (4, 3))
+                self.assertEqual(shared.mode, "L")
+                del shared